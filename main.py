@@ -11,6 +11,7 @@ try:
     import hashlib
     import json as _json
     import asyncio
+    import time
     import mimetypes
     import httpx
     import uuid
@@ -163,7 +164,22 @@ async def _startup_preload():
 
 # ── Background Sync / Local Database ──────────────────────────────────────────
 
-from tools.supabase_client import supabase
+from tools.supabase_client import supabase, upsert_chunked, conflict_key, UPSERT_CHUNK_SIZE
+from tools.sync_pipeline import Stage, run_pipeline
+from tools.batch_writer import TableBatchWriter, estimate_bytes, WRITE_BATCH_ROWS
+from tools.blocking import run_blocking
+from tools.sync_lease import single_flight, hold_lease, lease_status
+from tools.sync_checkpoints import SyncCheckpoint, SYNC_CHECKPOINTS
+from tools.sync_scheduler import FreshnessScheduler
+from tools.sync_jobs import get_queue
+from tools.read_cache import subpage_cache
+from tools.subpage_store import SubpageStore, STORE_DB as SUBPAGES_DB
+from tools.webhooks import (WebhookCoalescer, WebhookError, verify_signature, parse_notifications, merge_touched,
+                            WEBHOOK_WORKERS)
+from tools import sync_telemetry
+from tools.row_hashes import RowHashIndex, SYNC_ROW_HASHES
+from tools.rate_limiter import swapcard_limiter
+from tools.sync_watermarks import WatermarkStore, event_fingerprint, SYNC_INCREMENTAL
 
 def _load_sync_settings():
     try:
@@ -182,103 +198,227 @@ def _get_persistent_url(new_url: str, existing_url: str) -> str:
         return existing_url
     return new_url
 
-async def _sync_all_data_task(force_refresh: bool = False):
-    """Performs a full sync of Swapcard events and saves to Supabase."""
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] [Sync] Starting events-only background sync...")
-    try:
-        # 0. Load settings from Supabase
-        settings = _load_sync_settings()
+SYNC_IMAGE_WORKERS = 20  # matches _bulk_download_parallel
+
+# Per-category freshness budgets for leads / subpages (tools/sync_scheduler.py);
+# the events sync registers every event it sees.
+freshness = FreshnessScheduler()
+SCHEDULER_MIN_SLEEP = 30  # minimum seconds between scheduler ticks
+SCHEDULED_LEADS_WORKERS = 4
+
+# SYNC_MODE=workers hands every sync to sync_worker.py processes through the job
+# table in tools/sync_jobs.py; the web process then only enqueues jobs and reads
+# their status. The default "inprocess" keeps syncing here (required on Vercel).
+SYNC_MODE = os.environ.get("SYNC_MODE", "inprocess")
+SYNC_WORKERS = SYNC_MODE == "workers"
+
+
+def _event_row(ev: dict, category: str, ex_ev: dict) -> dict:
+    """Normalizes one Swapcard event into a swapcard_events row."""
+    # Calculate registrations from groups (available in event metadata)
+    registrations = sum(group.get("peopleCount", 0) for group in ev.get("groups", []))
+
+    # Preservation logic
+    banner = _get_persistent_url((ev.get("banner") or {}).get("imageUrl"), ex_ev.get("banner_url"))
+    comm_logo = _get_persistent_url((ev.get("community") or {}).get("logoUrl"), ex_ev.get("community_logo_url"))
+    comm_banner = _get_persistent_url((ev.get("community") or {}).get("bannerImageUrl"), ex_ev.get("community_banner_url"))
+
+    # Prepare upsert data with metadata available from get_events
+    return {
+        "id": ev["id"],
+        "slug": ev.get("slug"),
+        "title": ev.get("title"),
+        "data": ev,
+        "category": category,
+        "updated_at": ev.get("updatedAt") or ev.get("createdAt"),
+        "registrations_count": registrations,
+        "exhibitors_count": ev.get("totalExhibitors", 0),
+        "speakers_count": ev.get("totalSpeakers", 0),
+        "sessions_count": ev.get("totalPlannings", 0),
+        "leads_count": 0, # Skip for now
+        "members_count": 0, # Skip for now
+        "begins_at": ev.get("beginsAt"),
+        "ends_at": ev.get("endsAt"),
+        "banner_url": banner,
+        "city": (ev.get("address") or {}).get("city"),
+        "country": (ev.get("address") or {}).get("country"),
+        "community_id": (ev.get("community") or {}).get("id"),
+        "community_name": (ev.get("community") or {}).get("name"),
+        "community_logo_url": comm_logo,
+        "community_banner_url": comm_banner,
+        "is_live": ev.get("isLive", False),
+        "is_public": ev.get("isPublic", True),
+        "description_html": ev.get("htmlDescription")
+    }
 
-        # 1. Fetch Swapcard events
-        print("[Sync] Fetching Swapcard events via GraphQL...")
-        result = get_events.get_events(settings=settings)
-        events_by_cat = result.get("events", {})
 
-        # 2. Fetch existing data to preserve Supabase URLs
-        print("[Sync] Fetching existing records for URL preservation...")
-        existing_res = supabase.table("swapcard_events").select("id, banner_url, community_logo_url, community_banner_url").execute()
-        existing_map = {r["id"]: r for r in (existing_res.data or [])}
+def _image_stage(client_holder: dict) -> Stage:
+    """Final pipeline stage: downloads each new image URL once into img_cache/."""
+    seen = set()
 
-        # 3. Upsert Events to Supabase
-        print("[Sync] Upserting events to Supabase...")
+    async def download(url, emit):
+        if url in seen or _cache_path(url).exists():
+            return
+        seen.add(url)
+        if "client" not in client_holder:
+            client_holder["client"] = httpx.AsyncClient(timeout=20, follow_redirects=True)
+        await _download_one(client_holder["client"], url)
+        await emit(url)
 
-        for category, events in events_by_cat.items():
-            for ev in events:
+    return Stage("images", download, workers=SYNC_IMAGE_WORKERS)
+
+
+async def _sync_all_data_task(force_refresh: bool = False, trigger: str = "background") -> dict:
+    """
+    Runs the events sync under the single-flight "events" lease: a trigger that
+    arrives while a sync is already running joins it instead of starting another.
+    """
+    return await single_flight("events", lambda: _run_events_sync(force_refresh), trigger=trigger,
+                               rerun=force_refresh)
+
+
+async def _run_events_sync(force_refresh: bool = False) -> dict:
+    """
+    Performs a full sync of Swapcard events and saves to Supabase. Returns the
+    upserted / skipped / resumed / failed counts (plus "error" if the run failed).
+
+    Runs as a pipeline (tools/sync_pipeline.py): event pages → normalization →
+    chunked Supabase writer → image downloader, so upserts and image downloads
+    start while later event pages are still being fetched. Each written event is
+    checkpointed, so a run that dies midway resumes where it stopped.
+    """
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] [Sync] Starting events-only background sync...")
+    counts = {"upserted": 0, "skipped": 0, "resumed": 0, "failed": 0, "requests": 0}
+    try:
+        # 0. Load settings from Supabase
+        settings = await run_blocking(_load_sync_settings, pool="sync")
+
+        # 1. Existing records (to preserve Supabase URLs) load alongside the first event pages
+        def load_existing():
+            res = supabase.table("swapcard_events").select("id, banner_url, community_logo_url, community_banner_url").execute()
+            return {r["id"]: r for r in (res.data or [])}
+        existing_task = asyncio.create_task(run_blocking(load_existing, pool="sync"))
+
+        # Incremental mode skips events whose updatedAt/category watermark is unchanged;
+        # force_refresh runs a full reconcile pass.
+        incremental = SYNC_INCREMENTAL and not force_refresh
+        watermarks = WatermarkStore()
+        checkpoint = await run_blocking(SyncCheckpoint, "events", pool="sync")
+        pending = {}  # eid -> (event, fingerprint) until its row is written
+        seen = set()
+        print(f"[Sync] Streaming events into Supabase ({'incremental' if incremental else 'full reconcile'})...")
+
+        # 2. Normalize each page of (category, event) into rows
+        async def normalize(page, emit):
+            existing_map = await existing_task
+            for category, ev in page:
                 eid = ev["id"]
+                seen.add(eid)
+                freshness.track(ev, category)
+                fingerprint = event_fingerprint(ev, category)
+                if incremental and eid in existing_map and not watermarks.is_changed("events", eid, fingerprint):
+                    counts["skipped"] += 1
+                    continue
+                if category != "Active" and checkpoint.is_done("write", eid, fingerprint):
+                    counts["resumed"] += 1  # written by the interrupted run we are resuming
+                    continue
+                if eid in pending:
+                    continue  # already queued from an earlier page
+                pending[eid] = (ev, fingerprint)
+                await emit(_event_row(ev, category, existing_map.get(eid, {})))
+
+        # 3. Write rows in chunked bulk upserts; written events feed the image stage
+        buffer = []
+
+        async def write_chunk(rows, emit):
+            result = await run_blocking(upsert_chunked, "swapcard_events", rows, pool="sync")
+            counts["requests"] += result["requests"]
+            counts["failed"] += len(result["failed"])
+            written = []
+            for eid in result["upserted"]:
+                ev, fingerprint = pending.pop(eid)
+                watermarks.mark("events", eid, fingerprint)
+                written.append((eid, fingerprint))
+                counts["upserted"] += 1
+                if (ev.get("banner") or {}).get("imageUrl"): await emit(ev["banner"]["imageUrl"])
+                if (ev.get("community") or {}).get("logoUrl"): await emit(ev["community"]["logoUrl"])
+            await run_blocking(lambda: [checkpoint.mark("write", eid, fp) for eid, fp in written], pool="sync")
+
+        async def write(row, emit):
+            buffer.append(row)
+            if len(buffer) >= UPSERT_CHUNK_SIZE:
+                rows = buffer[:]
+                buffer.clear()
+                await write_chunk(rows, emit)
+
+        async def flush(emit):
+            if buffer:
+                rows = buffer[:]
+                buffer.clear()
+                await write_chunk(rows, emit)
 
-                # Calculate registrations from groups (available in event metadata)
-                registrations = sum(group.get("peopleCount", 0) for group in ev.get("groups", []))
-
-                # Preservation logic
-                ex_ev = existing_map.get(eid, {})
-                banner = _get_persistent_url((ev.get("banner") or {}).get("imageUrl"), ex_ev.get("banner_url"))
-                comm_logo = _get_persistent_url((ev.get("community") or {}).get("logoUrl"), ex_ev.get("community_logo_url"))
-                comm_banner = _get_persistent_url((ev.get("community") or {}).get("bannerImageUrl"), ex_ev.get("community_banner_url"))
-
-                # Prepare upsert data with metadata available from get_events
-                upsert_data = {
-                    "id": eid,
-                    "slug": ev.get("slug"),
-                    "title": ev.get("title"),
-                    "data": ev,
-                    "category": category,
-                    "updated_at": ev.get("updatedAt") or ev.get("createdAt"),
-                    "registrations_count": registrations,
-                    "exhibitors_count": ev.get("totalExhibitors", 0),
-                    "speakers_count": ev.get("totalSpeakers", 0),
-                    "sessions_count": ev.get("totalPlannings", 0),
-                    "leads_count": 0, # Skip for now
-                    "members_count": 0, # Skip for now
-                    "begins_at": ev.get("beginsAt"),
-                    "ends_at": ev.get("endsAt"),
-                    "banner_url": banner,
-                    "city": (ev.get("address") or {}).get("city"),
-                    "country": (ev.get("address") or {}).get("country"),
-                    "community_id": (ev.get("community") or {}).get("id"),
-                    "community_name": (ev.get("community") or {}).get("name"),
-                    "community_logo_url": comm_logo,
-                    "community_banner_url": comm_banner,
-                    "is_live": ev.get("isLive", False),
-                    "is_public": ev.get("isPublic", True),
-                    "description_html": ev.get("htmlDescription")
-                }
-
-                supabase.table("swapcard_events").upsert(upsert_data).execute()
-        
         # 4. Skip Airtable for now (Requested: "Concentrate only on the swap card events")
-        # print("[Sync] Skipping Airtable sync (per user request)...")
-        
-        # 5. Preload images
-        print("[Sync] Preloading image assets...")
-        # Collect URLs for preloading
-        all_urls = []
-        for cat, evs in events_by_cat.items():
-            for ev in evs:
-                if ev.get("banner", {}).get("imageUrl"): all_urls.append(ev["banner"]["imageUrl"])
-                if ev.get("community", {}).get("logoUrl"): all_urls.append(ev["community"]["logoUrl"])
-        if all_urls:
-            await _bulk_download_parallel(list(set(all_urls)))
-        
+
+        # 5. Preload images as their events are written
+        img = {}
+        try:
+            await run_pipeline(get_events.iter_events(settings=settings), [
+                Stage("normalize", normalize),
+                Stage("write", write, workers=2, flush=flush),
+                _image_stage(img),
+            ], name="events")
+        finally:
+            if "client" in img:
+                await img["client"].aclose()
+            watermarks.save()
+
+        # Events no longer listed (filtered out, deleted) drop out of the freshness queue
+        freshness.retain(seen)
+
+        # The run reached the end: close the checkpoint even with failed rows. Those events
+        # keep their old watermark, so the next incremental run retries just them.
+        await run_blocking(checkpoint.complete, pool="sync")
+        print(f"[Sync] Upserted {counts['upserted']} events in {counts['requests']} requests, "
+              f"{counts['skipped']} unchanged, {counts['resumed']} already done before resume, "
+              f"{counts['failed']} failed.")
         print(f"[{datetime.now().strftime('%H:%M:%S')}] [Sync] Background sync completed successfully.")
     except Exception as e:
         print(f"[Sync] Full sync failed: {e}")
         import traceback
         traceback.print_exc()
+        counts["error"] = str(e)
+    return counts
 
 async def _background_sync_loop():
-    """Recurring task that syncs data on an interval."""
+    """
+    Recurring sync: the event list is refreshed every `sync_interval_minutes`,
+    and in between the freshness scheduler runs whatever leads / subpages work
+    has fallen out of its per-category budget.
+    """
     # Sync on startup
     await _sync_all_data_task()
+    last_events_sync = time.monotonic()
 
     while True:
-        settings = _load_sync_settings()
+        settings = await run_blocking(_load_sync_settings, pool="sync")
         interval = settings.get("sync_interval_minutes", 60)
         # Minimum 5 minutes to avoid abuse
-        sleep_mins = max(5, interval)
-        
-        # Wait for next interval
-        await asyncio.sleep(sleep_mins * 60)
-        await _sync_all_data_task()
+        interval_sec = max(5, interval) * 60
+
+        try:
+            await _scheduled_refresh_task(settings)
+        except Exception as e:
+            print(f"[Scheduler] Scheduled refresh failed: {e}")
+
+        # Sleep until the next refresh is due or the event list needs resyncing
+        until_events = interval_sec - (time.monotonic() - last_events_sync)
+        until_due = freshness.seconds_until_due()
+        wait = until_events if until_due is None else min(until_events, until_due)
+        await asyncio.sleep(max(SCHEDULER_MIN_SLEEP, wait))
+
+        if time.monotonic() - last_events_sync >= interval_sec:
+            await _sync_all_data_task()
+            last_events_sync = time.monotonic()
 
 # ── FastAPI lifespan: preload images on startup ──────────────────────────────
 from contextlib import asynccontextmanager
@@ -286,7 +426,9 @@ from contextlib import asynccontextmanager
 @asynccontextmanager
 async def lifespan(application):
     # Startup: preload all images and start sync loop (only if NOT on Vercel)
-    if not os.environ.get("VERCEL"):
+    if SYNC_WORKERS:
+        print("[Lifespan] SYNC_MODE=workers, syncs run in sync_worker.py processes.")
+    elif not os.environ.get("VERCEL"):
         print("[Lifespan] Not on Vercel, starting background sync loop...")
         asyncio.create_task(_background_sync_loop())
     else:
@@ -343,9 +485,11 @@ async def preload_images(body: PreloadRequest, background_tasks: BackgroundTasks
 @app.get("/api/img/status")
 async def image_cache_status():
     """Returns how many images are currently cached on disk."""
-    files = list(IMG_CACHE_DIR.glob("*"))
-    total_mb = sum(f.stat().st_size for f in files) / (1024 * 1024)
-    return {"cached_files": len(files), "disk_mb": float(f"{total_mb:.2f}")}
+    def scan():
+        files = list(IMG_CACHE_DIR.glob("*"))
+        return len(files), sum(f.stat().st_size for f in files) / (1024 * 1024)
+    count, total_mb = await run_blocking(scan)
+    return {"cached_files": count, "disk_mb": float(f"{total_mb:.2f}")}
 
 
 # ── User Database ─────────────────────────────────────────────────────────────
@@ -370,7 +514,7 @@ class LoginRequest(BaseModel):
 @app.post("/api/login")
 async def login(req: LoginRequest):
     pw_hash = hashlib.sha256(req.password.encode()).hexdigest()
-    users = _load_users()
+    users = await run_blocking(_load_users)
     user = next((u for u in users if u["username"].lower() == req.username.lower() and u["password_hash"] == pw_hash), None)
     if user:
         return JSONResponse(content={"status": "success", "user": _safe_user(user)})
@@ -379,7 +523,8 @@ async def login(req: LoginRequest):
 @app.get("/api/users")
 async def get_users():
     """Returns all users (without password hashes) for admin reference."""
-    return JSONResponse(content={"status": "success", "data": [_safe_user(u) for u in _load_users()]})
+    users = await run_blocking(_load_users)
+    return JSONResponse(content={"status": "success", "data": [_safe_user(u) for u in users]})
 
 class UpdateProfileRequest(BaseModel):
     user_id:          str
@@ -392,7 +537,7 @@ class UpdateProfileRequest(BaseModel):
 
 @app.put("/api/users/update")
 async def update_profile(req: UpdateProfileRequest):
-    users = _load_users()
+    users = await run_blocking(_load_users)
     # Find target user
     user = next((u for u in users if u["id"] == req.user_id), None)
     if not user:
@@ -429,7 +574,7 @@ async def update_profile(req: UpdateProfileRequest):
     # Persist
     if update_data:
         try:
-            supabase.table("users").update(update_data).eq("id", req.user_id).execute()
+            await run_blocking(lambda: supabase.table("users").update(update_data).eq("id", req.user_id).execute())
         except Exception as e:
             return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
             
@@ -487,7 +632,7 @@ from tools.mutations import create_event_person, create_event_exhibitor
 @app.post("/api/person/create")
 async def api_create_person(req: CreatePersonRequest):
     try:
-        res = create_event_person(req.eventId, req.firstName, req.lastName, req.email, req.jobTitle, req.organization)
+        res = await run_blocking(create_event_person, req.eventId, req.firstName, req.lastName, req.email, req.jobTitle, req.organization)
         return JSONResponse(content={"status": "success", "data": res})
     except Exception as e:
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
@@ -495,7 +640,7 @@ async def api_create_person(req: CreatePersonRequest):
 @app.post("/api/exhibitor/create")
 async def api_create_exhibitor(req: CreateExhibitorRequest):
     try:
-        res = create_event_exhibitor(req.eventId, req.name, req.description)
+        res = await run_blocking(create_event_exhibitor, req.eventId, req.name, req.description)
         return JSONResponse(content={"status": "success", "data": res})
     except Exception as e:
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
@@ -503,143 +648,660 @@ async def api_create_exhibitor(req: CreateExhibitorRequest):
 # Removed /api/airtable and /api/airtable/sync as Airtable sync is part of background task and data is fetched via Supabase.
 
 from tools import get_subpages
+from tools import member_rosters
 
 # Removed /api/subpages/stats
 
-def _sync_subpages_to_supabase(events_list: list, force_refresh: bool = False):
-    """Fetches subpage data for all events and syncs to normalized Supabase tables."""
-    # fetch_all_subpages_data also writes to local disk (data/subpages/<id>/*.json)
-    get_subpages.fetch_all_subpages_data(force_refresh=force_refresh)
-    
-    table_map = {
-        'people': 'event_people',
-        'plannings': 'event_planning',
-        'exhibitors': 'event_exhibitors',
-        'sponsors': 'event_sponsors'
+SUBPAGE_TABLES = {
+    'people': 'event_people',
+    'plannings': 'event_planning',
+    'exhibitors': 'event_exhibitors',
+    'sponsors': 'event_sponsors'
+}
+# Rows are per event (the same exhibitor or person is listed by several events). Upserting
+# on (event_id, id) needs the unique index from tools/migrate_subpage_row_keys.py, so it is
+# opt-in: set SUBPAGES_COMPOSITE_KEY=1 once that SQL has run (see SYNC_GUIDE.md).
+SUBPAGES_COMPOSITE_KEY = os.environ.get("SUBPAGES_COMPOSITE_KEY", "0") == "1"
+SUBPAGE_CONFLICT_KEY = "event_id,id" if SUBPAGES_COMPOSITE_KEY else "id"
+SUBPAGE_READ_BATCH = 100  # rows normalized per step while streaming an event's files
+SUBPAGE_READ_WORKERS = int(os.environ.get("SUBPAGE_READ_WORKERS", 4))  # events read in parallel
+
+
+def _subpage_row(eid: str, data_type: str, r: dict) -> dict:
+    """Normalizes one subpage record into its event_* table row (`r` itself is left untouched)."""
+    if data_type == 'exhibitors' and r.get('logoUrl'):
+        # Records can be shared with the read cache, so the cached logo goes on a copy
+        r = {**r, 'cachedLogoUrl': _local_url(r['logoUrl'])}
+    row = {
+        "id": r.get('id'),
+        "event_id": eid,
+        "data": r,
+        "updated_at": datetime.now(timezone.utc).isoformat()
     }
-    
-    for ev in events_list:
-        eid = ev.get("id")
-        if not eid:
-            continue
-            
-        for data_type, table_name in table_map.items():
-            records = get_subpages.get_event_subpage_data(eid, data_type)
-            if not records:
+
+    # Extract fields for normalization
+    if data_type == 'exhibitors':
+        booths = r.get('withEvent', {}).get('booths', [])
+        booth_name = booths[0].get('name') if booths else None
+
+        # Industry extraction
+        industry = None
+        for f in r.get('fields', []):
+            if f.get('definition', {}).get('name') == 'Company Industry':
+                industry = f.get('multipleSelectValue') or f.get('selectValue') or f.get('textValue')
+                break
+
+        leads = r.get('withEvent', {}).get('leads', {})
+
+        row.update({
+            "name": r.get('name'),
+            "type": r.get('type'),
+            "logo_url": r.get('logoUrl'),
+            "website_url": r.get('websiteUrl'),
+            "booth": booth_name,
+            "email": r.get('email'),
+            "city": (r.get('address') or {}).get('city'),
+            "country": (r.get('address') or {}).get('country'),
+            "industry": industry,
+            "leads_scans": (leads or {}).get('scans', {}).get('totalCount', 0),
+            "leads_views": (leads or {}).get('views', {}).get('totalCount', 0),
+            "total_members": r.get('totalMembers', 0),
+            "created_at": r.get('createdAt')
+        })
+    elif data_type == 'people':
+        row.update({
+            "first_name": r.get('firstName'),
+            "last_name": r.get('lastName'),
+            "organization": r.get('organization'),
+            "job_title": r.get('jobTitle'),
+            "email": r.get('email'),
+            "photo_url": r.get('photoUrl'),
+            "city": (r.get('address') or {}).get('city'),
+            "country": (r.get('address') or {}).get('country')
+        })
+    elif data_type == 'plannings':
+        row.update({
+            "title": r.get('title'),
+            "begins_at": r.get('beginsAt'),
+            "start_time": r.get('beginsAt'),
+            "end_time": r.get('endsAt'),
+            "location_name": (r.get('place') or {}).get('name'),
+            "type": r.get('type'),
+            "format": r.get('format')
+        })
+    elif data_type == 'sponsors':
+        row.update({
+            "name": r.get('name'),
+            "category": r.get('category'),
+            "type": r.get('type'),
+            "external_url": r.get('externalUrl'),
+            "logo_url": r.get('logoUrl')
+        })
+
+    return row
+
+
+def _iter_subpage_row_batches(eid: str):
+    """Yields (table, rows) batches for one event, streamed from its subpage files."""
+    for data_type, table_name in SUBPAGE_TABLES.items():
+        # Streamed record by record so 20k-attendee events stay within one batch of memory
+        batch = []
+        for r in get_subpages.iter_event_subpage_data(eid, data_type):
+            if not r.get('id'):
                 continue
-            
-            batch = []
-            for r in records:
-                rid = r.get('id')
-                if not rid:
-                    continue
-                
-                row = {
-                    "id": rid,
-                    "event_id": eid,
-                    "data": r,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }
-                
-                # Extract fields for normalization
-                if data_type == 'exhibitors':
-                    if r.get('logoUrl'):
-                        r['cachedLogoUrl'] = _local_url(r['logoUrl'])
-                    booths = r.get('withEvent', {}).get('booths', [])
-                    booth_name = booths[0].get('name') if booths else None
-                    
-                    # Industry extraction
-                    industry = None
-                    for f in r.get('fields', []):
-                        if f.get('definition', {}).get('name') == 'Company Industry':
-                            industry = f.get('multipleSelectValue') or f.get('selectValue') or f.get('textValue')
-                            break
-                    
-                    leads = r.get('withEvent', {}).get('leads', {})
-                    
-                    row.update({
-                        "name": r.get('name'),
-                        "type": r.get('type'),
-                        "logo_url": r.get('logoUrl'),
-                        "website_url": r.get('websiteUrl'),
-                        "booth": booth_name,
-                        "email": r.get('email'),
-                        "city": (r.get('address') or {}).get('city'),
-                        "country": (r.get('address') or {}).get('country'),
-                        "industry": industry,
-                        "leads_scans": (leads or {}).get('scans', {}).get('totalCount', 0),
-                        "leads_views": (leads or {}).get('views', {}).get('totalCount', 0),
-                        "total_members": r.get('totalMembers', 0),
-                        "created_at": r.get('createdAt')
-                    })
-                elif data_type == 'people':
-                    row.update({
-                        "first_name": r.get('firstName'),
-                        "last_name": r.get('lastName'),
-                        "organization": r.get('organization'),
-                        "job_title": r.get('jobTitle'),
-                        "email": r.get('email'),
-                        "photo_url": r.get('photoUrl'),
-                        "city": (r.get('address') or {}).get('city'),
-                        "country": (r.get('address') or {}).get('country')
-                    })
-                elif data_type == 'plannings':
-                    row.update({
-                        "title": r.get('title'),
-                        "begins_at": r.get('beginsAt'),
-                        "start_time": r.get('beginsAt'),
-                        "end_time": r.get('endsAt'),
-                        "location_name": (r.get('place') or {}).get('name'),
-                        "type": r.get('type'),
-                        "format": r.get('format')
-                    })
-                elif data_type == 'sponsors':
-                    row.update({
-                        "name": r.get('name'),
-                        "category": r.get('category'),
-                        "type": r.get('type'),
-                        "external_url": r.get('externalUrl'),
-                        "logo_url": r.get('logoUrl')
-                    })
-                
-                batch.append(row)
-                
-                if len(batch) >= 100:
-                    try:
-                        supabase.table(table_name).upsert(batch).execute()
-                    except Exception as e:
-                        print(f"[Sync] Failed batch for {table_name}: {e}")
-                    batch = []
-            
-            if batch:
-                try:
-                    supabase.table(table_name).upsert(batch).execute()
-                except Exception as e:
-                    print(f"[Sync] Failed final batch for {table_name}: {e}")
-                    
-    print(f"[Sync] Normalized subpage data pushed to Supabase for {len(events_list)} events.")
+            batch.append(_subpage_row(eid, data_type, r))
+            if len(batch) >= SUBPAGE_READ_BATCH:
+                yield table_name, batch
+                batch = []
+        if batch:
+            yield table_name, batch
+
+
+async def _sync_subpages_to_supabase(settings: dict | None = None, force_refresh: bool = False,
+                                     trigger: str = "api") -> dict:
+    """Runs the subpage sync under the single-flight "subpages" lease (see _sync_all_data_task)."""
+    return await single_flight("subpages", lambda: _run_subpages_sync(settings, force_refresh), trigger=trigger,
+                               rerun=force_refresh)
 
-@app.get("/api/subpages/{event_id}/{data_type}")
-async def get_event_data_api(event_id: str, data_type: str):
-    """Returns records for a specific event and type from Supabase (one row per event with JSONB data array)."""
-    table_map = {
-        'people': 'event_people',
-        'plannings': 'event_planning',
-        'exhibitors': 'event_exhibitors',
-        'sponsors': 'event_sponsors'
-    }
 
-    table_name = table_map.get(data_type)
+async def _run_subpages_sync(settings: dict | None = None, force_refresh: bool = False,
+                             events: list | None = None, refetch: bool = False,
+                             partition: str | None = None) -> dict:
+    """
+    Fetches subpage data for all events and syncs to normalized Supabase tables.
+
+    `events` ([(category, event)]) limits the run to those events. `refetch`
+    fetches them even when their files could be reused (the freshness scheduler
+    does); rows still go through the content-hash diff. `partition` names the
+    community a sync worker job covers, which gets its own resumable checkpoint.
+
+    Pipeline: event pages → subpage fetch (per batch of events, also writes
+    data/subpages/<id>/*.json and completes member rosters) → normalization →
+    Supabase batch writer → exhibitor/sponsor logo downloads.
+
+    Events are checkpointed per phase ("fetch" once their files are saved,
+    "write" once all their rows are upserted), so a run that dies midway
+    resumes without refetching or rewriting finished events.
+    """
+    watermarks = WatermarkStore()
+    # Scheduled runs cover a handful of events; only full and per-community runs are worth resuming
+    checkpoint_name = "subpages" if partition is None else "subpages." + partition.replace("/", "_").replace("=", "")
+    checkpoint = await run_blocking(SyncCheckpoint, checkpoint_name,
+                                    enabled=SYNC_CHECKPOINTS and (events is None or partition is not None),
+                                    pool="sync")
+    group_size = get_subpages.SUBPAGES_BATCH_EVENTS if get_subpages.SUBPAGES_BATCH_MODE else 1
+    counts = {"events": 0, "fetched": 0, "reused": 0, "resumed": 0, "rows": 0, "failed_rows": 0, "tables": {}}
+    fingerprints = {}  # eid -> fingerprint the checkpoints are recorded against
+
+    # 1. Plan each event; events to fetch are grouped into aliased batches
+    to_fetch = []  # [(event, fingerprint)]
+
+    async def plan(page, emit):
+        nonlocal to_fetch
+        for category, ev in page:
+            counts["events"] += 1
+            fetch, fingerprint = get_subpages.plan_event_subpages(ev, category, watermarks,
+                                                                  force_refresh or refetch)
+            fingerprints[ev["id"]] = fingerprint
+            # Active events are never skipped on a checkpoint: their lead counters
+            # move without changing the fingerprint
+            resumable = category != "Active"
+            if resumable and checkpoint.is_done("write", ev["id"], fingerprint):
+                counts["resumed"] += 1  # finished by the interrupted run we are resuming
+                continue
+            if fetch and resumable and checkpoint.is_done("fetch", ev["id"], fingerprint):
+                fetch = False  # files were saved by the interrupted run
+            if not fetch:
+                counts["reused"] += 1
+                await emit(("reuse", [(ev, fingerprint)]))
+                continue
+            to_fetch.append((ev, fingerprint))
+            if len(to_fetch) >= group_size:
+                group, to_fetch = to_fetch, []
+                await emit(("fetch", group))
+
+    async def plan_flush(emit):
+        if to_fetch:
+            await emit(("fetch", to_fetch))
+
+    # 2. Fetch and save each group, complete member rosters, pass event ids on
+    async def fetch(item, emit):
+        action, group = item
+        if action == "fetch":
+            entries = [(ev["id"], (ev.get("community") or {}).get("id")) for ev, _ in group]
+            try:
+                saved = await run_blocking(get_subpages.fetch_and_save_events, entries, pool="sync")
+            except Exception as e:
+                print(f"Error fetching subpages for events {[eid for eid, _ in entries]}: {e}")
+                return
+            eids = []
+            for eid, stats in saved:
+                if fingerprints.get(eid):
+                    watermarks.mark("subpages", eid, fingerprints[eid])
+                counts["fetched"] += 1
+                eids.append(eid)
+
+            def record_fetched():
+                # Stats land before the checkpoint, so a run killed in between refetches
+                # these events instead of resuming past them without stats
+                if saved:
+                    get_subpages.update_subpages_stats(dict(saved))
+                for eid in eids:
+                    checkpoint.mark("fetch", eid, fingerprints.get(eid))
+            await run_blocking(record_fetched, pool="sync")
+            # A full fetch also brings fresh lead counters
+            freshness.mark_synced("subpages", eids)
+            freshness.mark_synced("leads", eids)
+        else:
+            eids = [ev["id"] for ev, _ in group]
+
+        for eid in eids:
+            # Complete exhibitor rosters past the first 10 members before building event_exhibitors rows
+            if member_rosters.SUBPAGES_FULL_ROSTERS:
+                with sync_telemetry.event(eid):
+                    await run_blocking(member_rosters.refresh_member_rosters, eid, pool="sync")
+            await emit(eid)
+
+    # 3. Normalize one event's files into batches, several events in parallel. Only rows
+    # whose content hash changed move on; an event's "write" checkpoint is recorded once
+    # all its batches are written without failures.
+    hash_indexes = {t: RowHashIndex(t) for t in SUBPAGE_TABLES.values()} if SYNC_ROW_HASHES else {}
+    outstanding = {}  # eid -> batches emitted but not yet written
+    normalized = set()
+    failed_events = set()
+
+    async def maybe_checkpoint_write(eid):
+        if eid in normalized and not outstanding.get(eid) and eid not in failed_events:
+            normalized.discard(eid)
+            outstanding.pop(eid, None)
+            await run_blocking(checkpoint.mark, "write", eid, fingerprints.get(eid), pool="sync")
+
+    def next_changed_batch(batches):
+        item = next(batches, None)
+        if item is None:
+            return None
+        table_name, rows = item
+        index = hash_indexes.get(table_name)
+        if index is None:
+            changed, diff = rows, {"unchanged": 0, "inserted": 0, "updated": len(rows)}
+        elif force_refresh:
+            # Full reconcile rewrites everything but still refreshes the index
+            changed, diff = rows, index.diff(rows)[1]
+        else:
+            changed, diff = index.diff(rows)
+        logos = [r["logo_url"] for r in rows if r.get("logo_url")]
+        return table_name, changed, diff, estimate_bytes(changed), logos
+
+    async def normalize(eid, emit):
+        batches = _iter_subpage_row_batches(eid)
+        while True:
+            with sync_telemetry.event(eid):
+                item = await run_blocking(next_changed_batch, batches, pool="sync")
+            if item is None:
+                break
+            table_name, changed, diff, nbytes, logos = item
+            table_counts = counts["tables"].setdefault(table_name, {"unchanged": 0, "inserted": 0, "updated": 0,
+                                                                    "failed": 0})
+            for k in ("unchanged", "inserted", "updated"):
+                table_counts[k] += diff[k]
+            if changed or logos:
+                outstanding[eid] = outstanding.get(eid, 0) + bool(changed)
+                await emit((eid, table_name, changed, nbytes, logos))
+        normalized.add(eid)
+        await maybe_checkpoint_write(eid)
+
+    # 4. Accumulate changed rows per table across events and upsert them in size- and
+    # byte-bounded batches (tools/batch_writer.py); logos feed the image stage
+    def upsert_and_record(table_name, rows):
+        result = upsert_chunked(table_name, rows, WRITE_BATCH_ROWS, on_conflict=SUBPAGE_CONFLICT_KEY)
+        index = hash_indexes.get(table_name)
+        if index is not None and result["upserted"]:
+            failed = set(result["failed"])
+            index.record([r for r in rows if conflict_key(r, SUBPAGE_CONFLICT_KEY) not in failed])
+        return result
+
+    async def write_batch(table_name, rows):
+        return await run_blocking(upsert_and_record, table_name, rows, pool="sync")
+
+    async def batch_done(table_name, parts, result, error):
+        failed = set(result["failed"]) if result else set()
+        for eid, rows in parts:
+            outstanding[eid] -= 1
+            part_failed = len(rows) if error else sum(1 for r in rows
+                                                      if conflict_key(r, SUBPAGE_CONFLICT_KEY) in failed)
+            if part_failed:
+                failed_events.add(eid)
+            counts["tables"][table_name]["failed"] += part_failed
+            counts["failed_rows"] += part_failed
+            counts["rows"] += len(rows) - part_failed
+            await maybe_checkpoint_write(eid)
+
+    writer = TableBatchWriter(write_batch, on_done=batch_done,
+                              key=lambda row: conflict_key(row, SUBPAGE_CONFLICT_KEY))
+
+    async def write(item, emit):
+        eid, table_name, changed, nbytes, logos = item
+        if changed:
+            await writer.add(table_name, changed, tag=eid, nbytes=nbytes)
+        for url in logos:
+            await emit(url)
+
+    async def write_flush(emit):
+        await writer.close()
+
+    img = {}
+    try:
+        source = get_events.iter_events(settings=settings) if events is None else [events]
+        await run_pipeline(source, [
+            Stage("plan", plan, flush=plan_flush),
+            Stage("fetch", fetch, workers=5),
+            Stage("normalize", normalize, workers=SUBPAGE_READ_WORKERS),
+            Stage("write", write, workers=len(SUBPAGE_TABLES), flush=write_flush),
+            _image_stage(img),
+        ], name="subpages")
+    finally:
+        if "client" in img:
+            await img["client"].aclose()
+        watermarks.save()
+        for index in hash_indexes.values():
+            await run_blocking(index.save, pool="sync")
+        await run_blocking(freshness.save, pool="sync")
+
+    # The run reached the end: close the checkpoint even when rows failed, so one bad row
+    # does not make later runs skip finished events for hours. Failed rows never had
+    # their content hash recorded (and failed fetches no watermark), so the next run
+    # retries exactly those.
+    await run_blocking(checkpoint.complete, pool="sync")
+    print(f"[Sync] Normalized subpage data pushed to Supabase for {counts['events']} events "
+          f"({counts['fetched']} fetched, {counts['reused']} reused, {counts['resumed']} already done "
+          f"before resume, {counts['rows']} rows written, {counts['failed_rows']} failed).")
+    counts["batches"] = writer.summary()
+    for table_name, tc in counts["tables"].items():
+        bs = counts["batches"].get(table_name, {})
+        print(f"  - {table_name}: {tc['inserted']} inserted, {tc['updated']} updated, "
+              f"{tc['unchanged']} unchanged, {tc['failed']} failed "
+              f"in {bs.get('batches', 0)} batches (avg {bs.get('avg_batch_rows', 0)} rows)")
+    return counts
+
+def _write_event_rows(eid: str, data_type: str, index: RowHashIndex | None = None) -> tuple[int, int]:
+    """Upserts one event's changed rows of one data type; returns (written, failed)."""
+    rows = [_subpage_row(eid, data_type, r)
+            for r in get_subpages.iter_event_subpage_data(eid, data_type) if r.get('id')]
+    changed = index.diff(rows)[0] if index is not None else rows
+    if not changed:
+        return 0, 0
+    result = upsert_chunked(SUBPAGE_TABLES[data_type], changed, WRITE_BATCH_ROWS, on_conflict=SUBPAGE_CONFLICT_KEY)
+    if index is not None and result["upserted"]:
+        failed = set(result["failed"])
+        index.record([r for r in changed if conflict_key(r, SUBPAGE_CONFLICT_KEY) not in failed])
+    return len(result["upserted"]), len(result["failed"])
+
+
+def _write_touched_rows(eid: str, data_type: str, records: list[dict], deletes: list[str]) -> tuple[int, int]:
+    """Upserts the changed rows of some records and deletes removed ones; returns (written, failed)."""
+    table_name = SUBPAGE_TABLES[data_type]
+    index = RowHashIndex(table_name) if SYNC_ROW_HASHES else None
+    rows = [_subpage_row(eid, data_type, r) for r in records]
+    changed = index.diff(rows)[0] if index is not None else rows
+    result = (upsert_chunked(table_name, changed, WRITE_BATCH_ROWS, on_conflict=SUBPAGE_CONFLICT_KEY)
+              if changed else {"upserted": [], "failed": {}})
+    if deletes:
+        supabase.table(table_name).delete().eq("event_id", eid).in_("id", list(deletes)).execute()
+    if index is not None:
+        failed = set(result["failed"])
+        index.record([r for r in changed if conflict_key(r, SUBPAGE_CONFLICT_KEY) not in failed])
+        index.forget([(eid, rid) for rid in deletes])
+        index.save()
+    return len(result["upserted"]), len(result["failed"])
+
+
+async def _refresh_event_record(event_id: str) -> dict:
+    """Refetches one event and upserts its swapcard_events row (webhook "event.*" notifications)."""
+    ev = await run_blocking(get_events.fetch_event, event_id, pool="sync")
+    settings = await run_blocking(_load_sync_settings, pool="sync")
+    category = get_events.categorize_event(ev, settings) if ev else None
+    if category is None:
+        return {"upserted": 0, "skipped": 1}  # gone upstream or filtered out by the sync settings
+
+    def write():
+        res = supabase.table("swapcard_events").select("banner_url, community_logo_url, community_banner_url") \
+            .eq("id", event_id).execute()
+        result = upsert_chunked("swapcard_events", [_event_row(ev, category, (res.data or [{}])[0])])
+        if result["upserted"]:
+            watermarks = WatermarkStore()
+            watermarks.mark("events", event_id, event_fingerprint(ev, category))
+            watermarks.save()
+        return result
+
+    result = await run_blocking(write, pool="sync")
+    freshness.track(ev, category)
+    return {"upserted": len(result["upserted"]), "failed": len(result["failed"])}
+
+
+async def _refresh_touched_records(event_id: str, touched: dict) -> dict:
+    """
+    Refetches only the records webhooks reported as changed for one event and
+    pushes them through the same normalization as the subpage sync.
+
+    `touched` is {data_type: {"upserts": [ids], "deletes": [ids]}}; updated
+    records are patched into data/subpages/<id>/<type>.json and their changed
+    rows upserted, deleted ones are removed from the file and the table.
+    """
+    counts = {}
+    with sync_telemetry.event(event_id):
+        for data_type, ids in touched.items():
+            if data_type == "events":
+                with sync_telemetry.phase("events"):
+                    counts["events"] = await _refresh_event_record(event_id)
+                continue
+            upserts, deletes = ids.get("upserts") or [], ids.get("deletes") or []
+            with sync_telemetry.phase("fetch"):
+                fetched = await run_blocking(get_subpages.fetch_event_records, event_id, data_type, upserts,
+                                             pool="sync") if upserts else {}
+                found = {rid: r for rid, r in fetched.items() if r is not None}
+                if data_type == "exhibitors" and member_rosters.SUBPAGES_FULL_ROSTERS:
+                    await run_blocking(member_rosters.complete_rosters, list(found.values()), pool="sync")
+            with sync_telemetry.phase("write"):
+                await run_blocking(get_subpages.patch_event_records, event_id, data_type, found, deletes, pool="sync")
+                written, failed = await run_blocking(_write_touched_rows, event_id, data_type,
+                                                     list(found.values()), deletes, pool="sync")
+            counts[data_type] = {"upserted": written, "unchanged": len(found) - written - failed,
+                                 "deleted": len(deletes), "not_found": len(fetched) - len(found), "failed": failed}
+            if failed:
+                raise RuntimeError(f"{failed} {data_type} rows of {event_id} failed to upsert")
+    return counts
+
+
+# Webhook notifications are buffered per (event, data type) until their burst ends
+webhook_coalescer = WebhookCoalescer()
+WEBHOOK_MAX_ATTEMPTS = 3
+_webhook_flusher: asyncio.Task | None = None
+
+
+async def _dispatch_webhook_entities(entities: list[dict]):
+    """Turns coalesced entities into one refresh per event: a "records" job, or a run in this process."""
+    by_event = {}
+    for entity in entities:
+        by_event.setdefault(entity["event_id"], []).append(entity)
+
+    if SYNC_WORKERS:
+        queue = get_queue()
+        for event_id, group in by_event.items():
+            touched = {e["data_type"]: {"upserts": e["upserts"], "deletes": e["deletes"]} for e in group}
+            await run_blocking(queue.enqueue, "records", event_id, {"touched": touched}, "webhook", merge_touched)
+        return
+
+    slots = asyncio.Semaphore(WEBHOOK_WORKERS)
+
+    async def refresh(event_id, group):
+        async with slots:
+            touched = {e["data_type"]: {"upserts": e["upserts"], "deletes": e["deletes"]} for e in group}
+            try:
+                counts = await _refresh_touched_records(event_id, touched)
+                print(f"[Webhooks] Refreshed {event_id}: {counts}")
+            except Exception as e:
+                print(f"[Webhooks] Refresh of {event_id} failed: {e}")
+                for entity in group:
+                    if entity["attempts"] + 1 < WEBHOOK_MAX_ATTEMPTS:
+                        webhook_coalescer.retry(entity)
+                    else:
+                        print(f"[Webhooks] Giving up on {entity['data_type']} of {event_id} "
+                              f"after {WEBHOOK_MAX_ATTEMPTS} attempts")
+
+    with sync_telemetry.track_run("webhook", trigger="webhook"):
+        await asyncio.gather(*(refresh(event_id, group) for event_id, group in by_event.items()))
+
+
+async def _flush_webhooks(force: bool = False):
+    entities = webhook_coalescer.pop_ready(force=force)
+    if entities:
+        await _dispatch_webhook_entities(entities)
+
+
+async def _webhook_flush_loop():
+    """Dispatches each entity once its burst is over; exits when nothing is buffered."""
+    while True:
+        wait = webhook_coalescer.seconds_until_ready()
+        if wait is None:
+            return
+        await asyncio.sleep(wait)
+        try:
+            await _flush_webhooks()
+        except Exception as e:
+            print(f"[Webhooks] Dispatch failed: {e}")
+
+
+def _ensure_webhook_flusher():
+    global _webhook_flusher
+    if _webhook_flusher is None or _webhook_flusher.done():
+        _webhook_flusher = asyncio.create_task(_webhook_flush_loop())
+
+
+async def _scheduled_refresh_task(settings: dict | None = None, trigger: str = "scheduler") -> dict:
+    """Runs the due freshness work under the single-flight "scheduled" lease."""
+    return await single_flight("scheduled", lambda: _run_scheduled_refreshes(settings), trigger=trigger)
+
+
+def _subpages_lease(partition: str | None = None) -> str:
+    """Lease guarding writes to subpage data: account-wide, or one community's (worker jobs)."""
+    return "subpages" if partition is None else f"subpages.{partition}"
+
+
+async def _run_scheduled_refreshes(settings: dict | None = None) -> dict:
+    """
+    Runs the leads / subpages refreshes the freshness scheduler reports as due,
+    hottest first: light lead-counter refreshes for events whose leads budget ran
+    out, then full subpage refetches for events whose subpages budget did.
+
+    The work holds the "subpages" lease (so it never overlaps a full subpage sync)
+    and, per community, that community's worker-job lease.
+    """
+    work = freshness.pop_due()
+    counts = {"leads": 0, "subpages": 0, "failed": 0}
+    if not work:
+        return counts
+
+    subpages = [w for w in work if w["data_type"] == "subpages"]
+    # Events refetched this tick get fresh lead counters with their subpages
+    refetched = {w["event_id"] for w in subpages}
+    leads = [w for w in work if w["data_type"] == "leads" and w["event_id"] not in refetched]
+    print(f"[Scheduler] Due: {len(leads)} lead refreshes, {len(subpages)} subpage refreshes "
+          f"({', '.join(sorted({w['category'] for w in work}))})")
+
+    index = RowHashIndex(SUBPAGE_TABLES["exhibitors"]) if SYNC_ROW_HASHES and leads else None
+    slots = asyncio.Semaphore(SCHEDULED_LEADS_WORKERS)
+
+    async def refresh_leads(w):
+        async with slots:
+            try:
+                with sync_telemetry.phase("leads"), sync_telemetry.event(w["event_id"]):
+                    stats = await run_blocking(get_subpages.refresh_event_leads, w["event_id"],
+                                               w["community_id"], pool="sync")
+                    if stats is None:
+                        return  # no exhibitor file yet; the event's subpage refresh brings its leads
+                    _, failed = await run_blocking(_write_event_rows, w["event_id"], "exhibitors", index,
+                                                   pool="sync")
+                if failed:
+                    raise RuntimeError(f"{failed} exhibitor rows failed to upsert")
+                freshness.mark_synced("leads", [w["event_id"]])
+                counts["leads"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"[Scheduler] Leads refresh failed for {w['event_id']}: {e}")
+
+    async def refresh_community(group):
+        await asyncio.gather(*(refresh_leads(w) for w in group if w["data_type"] == "leads"))
+        due = [(w["category"], w["event"]) for w in group if w["data_type"] == "subpages"]
+        if due:
+            result = await _run_subpages_sync(settings, events=due, refetch=True)
+            counts["subpages"] += result["fetched"]
+            counts["failed"] += len(due) - result["fetched"]
+
+    async def refresh_all():
+        groups = {}
+        for w in leads + subpages:
+            groups.setdefault(w["community_id"] or "unassigned", []).append(w)
+        held = await asyncio.gather(*(
+            hold_lease(_subpages_lease(community), lambda group=group: refresh_community(group), trigger="scheduler")
+            for community, group in groups.items()))
+        if index is not None:
+            await run_blocking(index.save, pool="sync")
+        return sum(len(group) for group, h in zip(groups.values(), held) if h["status"] == "timeout")
+
+    held = await hold_lease(_subpages_lease(), refresh_all, trigger="scheduler")
+    if held["status"] == "timeout":
+        print("[Scheduler] Subpage sync still running; due refreshes wait for the next tick")
+    elif held["result"]:
+        print(f"[Scheduler] {held['result']} refreshes wait for community jobs still running")
+
+    # Anything that did not refresh is due again on the next tick
+    for w in leads + subpages:
+        freshness.requeue(w["data_type"], [w["event_id"]])
+    await run_blocking(freshness.save, pool="sync")
+    print(f"[Scheduler] Refreshed leads for {counts['leads']} and subpages for {counts['subpages']} events "
+          f"({counts['failed']} failed).")
+    return counts
+
+SUBPAGE_PAGE_SIZE = 50
+SUBPAGE_PAGE_MAX = 500
+# Local copies of Supabase rows for events without local subpage files (e.g. a cold Vercel /tmp)
+supabase_subpages = SubpageStore(SUBPAGES_DB.with_name("subpages_supabase.db"))
+
+
+def _supabase_subpage_query(table_name: str, event_id: str, data_type: str, query: dict):
+    """Runs a /api/subpages query on the event's Supabase row, re-copied only when the row changed."""
+    head = (supabase.table(table_name).select("record_count, updated_at")
+            .eq("event_id", event_id).limit(1).execute()).data
+    if not head:
+        return [], None, 0
+    version = hashlib.blake2b(str(head[0].get("updated_at")).encode("utf-8"), digest_size=7).hexdigest()
+    stamp = [head[0].get("record_count") or 0, int(version, 16)]
+
+    def load():
+        res = supabase.table(table_name).select("data").eq("event_id", event_id).single().execute()
+        return (res.data or {}).get("data") or []
+    supabase_subpages.ensure_version(data_type, event_id, stamp, load)
+    return supabase_subpages.query(data_type, event_id, **query)
+
+
+@app.get("/api/subpages/{event_id}/{data_type}")
+async def get_event_data_api(event_id: str, data_type: str,
+                             limit: int | None = Query(None, ge=1, le=SUBPAGE_PAGE_MAX),
+                             cursor: str | None = None, sort: str | None = None, fields: str | None = None,
+                             type_: list[str] | None = Query(None, alias="type"),
+                             country: list[str] | None = Query(None), industry: list[str] | None = Query(None),
+                             booth: list[str] | None = Query(None)):
+    """
+    Returns records for a specific event and type.
+
+    Without query parameters: the whole JSONB data array from Supabase. With any
+    of them, one page evaluated against the indexed local copy
+    (tools/subpage_store.py):
+        limit    page size (default 50, max 500)
+        cursor   `next_cursor` of the previous page
+        sort     name | updated_at | type | country | industry | booth | position
+                 (file order, the default); prefix with "-" for descending
+        type, country, industry, booth
+                 filters (case-insensitive; repeat a parameter to accept several values)
+        fields   comma-separated top-level fields to return (id is always included)
+    """
+    table_name = SUBPAGE_TABLES.get(data_type)
     if not table_name:
         return JSONResponse(content={"status": "error", "message": f"Unknown data type: {data_type}"}, status_code=400)
 
+    filters = {k: v for k, v in {"type": type_, "country": country, "industry": industry, "booth": booth}.items() if v}
+    if limit or cursor or sort or fields or filters:
+        query = {"filters": filters, "sort": (sort or "position").lstrip("-"), "descending": (sort or "").startswith("-"),
+                 "cursor": cursor, "limit": limit or SUBPAGE_PAGE_SIZE}
+        try:
+            result = await run_blocking(get_subpages.query_event_subpage_data, event_id, data_type, **query)
+            source = "local"
+            if result is None:
+                result = await run_blocking(_supabase_subpage_query, table_name, event_id, data_type, query)
+                source = "supabase"
+        except ValueError as e:
+            return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+        except Exception as e:
+            print(f"[API] Subpage query failed for {table_name}/{event_id}: {e}")
+            return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+
+        records, next_cursor, total = result
+        wanted = {f.strip() for f in fields.split(",") if f.strip()} | {"id"} if fields else None
+        for i, item in enumerate(records):
+            if data_type == 'exhibitors' and item.get('logoUrl'):
+                item['cachedLogoUrl'] = _local_url(item['logoUrl'])
+            if wanted:
+                records[i] = {k: v for k, v in item.items() if k in wanted}
+        return JSONResponse(content={"status": "success", "data": records, "source": source, "total": total,
+                                     "next_cursor": next_cursor, "limit": query["limit"]})
+
     try:
         # Query Supabase for single row with JSONB data array
-        res = supabase.table(table_name) \
-            .select("data, record_count, updated_at") \
-            .eq("event_id", event_id) \
-            .single() \
-            .execute()
+        res = await run_blocking(lambda: supabase.table(table_name)
+                                 .select("data, record_count, updated_at")
+                                 .eq("event_id", event_id)
+                                 .single()
+                                 .execute())
 
         if res.data and isinstance(res.data.get('data'), list):
             data = res.data['data']
@@ -669,15 +1331,27 @@ async def get_event_data_api(event_id: str, data_type: str):
 async def sync_subpages_live():
     """Forces a live fetch for all subpages data and pushes to Supabase."""
     try:
-        settings = _load_sync_settings()
-        result = get_events.get_events(settings=settings)
-        events_by_cat = result.get("events", {})
-        all_events_flat = [ev for evs in events_by_cat.values() for ev in evs]
-        _sync_subpages_to_supabase(all_events_flat)
+        if SYNC_WORKERS:
+            # A worker splits this into one job per community
+            job_id = await run_blocking(get_queue().enqueue, "subpages", trigger="api")
+            return JSONResponse(content={"status": "success", "message": "Subpage sync queued for the sync workers.",
+                                         "job_id": job_id})
+        settings = await run_blocking(_load_sync_settings)
+        run = await _sync_subpages_to_supabase(settings)
+        counts = run["result"]
+        if not counts:
+            # Another worker ran (or is still running) this sync while we waited on its lease
+            return JSONResponse(content={
+                "status": "success",
+                "message": f"Subpage sync already handled by another worker ({run['status']}).",
+                "lease": run["status"]
+            })
         return JSONResponse(content={
             "status": "success",
-            "message": f"Subpage data synced for {len(all_events_flat)} events and pushed to Supabase.",
-            "event_count": len(all_events_flat)
+            "message": f"Subpage data synced for {counts['events']} events and pushed to Supabase.",
+            "event_count": counts["events"],
+            "changes": counts["tables"],
+            "lease": run["status"]
         })
     except Exception as e:
         import traceback
@@ -688,8 +1362,8 @@ async def sync_subpages_live():
 async def sync_leap_only():
     """Clears exhibitor data and fetches ONLY LEAP x DeepFest 2026 exhibitors using the full V2 query."""
     try:
-        stats = get_subpages.fetch_leap_only()
-        data = get_subpages.get_subpages_data()
+        stats = await run_blocking(get_subpages.fetch_leap_only, pool="sync")
+        data = await run_blocking(get_subpages.get_subpages_data)
         for ex in data.get('exhibitors', []):
             if ex.get('logoUrl'):
                 ex['cachedLogoUrl'] = _local_url(ex['logoUrl'])
@@ -718,7 +1392,7 @@ class ActivityEntry(BaseModel):
 
 @app.get("/api/activity")
 async def get_activity():
-    return JSONResponse(content={"status": "success", "data": _read_activity()})
+    return JSONResponse(content={"status": "success", "data": await run_blocking(_read_activity)})
 
 @app.post("/api/activity")
 async def log_activity(entry: ActivityEntry):
@@ -730,7 +1404,7 @@ async def log_activity(entry: ActivityEntry):
         "timestamp": ts
     }
     try:
-        supabase.table("activity_logs").insert(new_entry).execute()
+        await run_blocking(lambda: supabase.table("activity_logs").insert(new_entry).execute())
     except Exception as e:
         print(f"Error saving activity log: {e}")
     # Return matched format for frontend (which expects 'user', not 'user_name')
@@ -742,7 +1416,8 @@ async def log_activity(entry: ActivityEntry):
 @app.post("/api/person")
 async def upsert_person(req: PersonRequest):
     # Route via Layer 2
-    result = navigation.route_action(
+    result = await run_blocking(
+        navigation.route_action,
         "upsert_person", 
         eventId=req.eventId, 
         email=req.email, 
@@ -755,7 +1430,7 @@ async def upsert_person(req: PersonRequest):
 @app.post("/api/exhibitor")
 async def manage_exhibitor(req: ExhibitorRequest):
     # Route via Layer 2
-    result = navigation.route_action("upsert_exhibitor", exhibitor_id=req.id, name=req.name)
+    result = await run_blocking(navigation.route_action, "upsert_exhibitor", exhibitor_id=req.id, name=req.name)
     return JSONResponse(content={"status": "success", "data": result})
 
 @app.get("/api/settings")
@@ -773,7 +1448,7 @@ async def get_settings():
                         env_vars[k] = v
         except Exception: pass
     
-    filters = _load_sync_settings()
+    filters = await run_blocking(_load_sync_settings)
             
     return JSONResponse(content={"status": "success", "keys": env_vars, "filters": filters})
 
@@ -795,7 +1470,11 @@ async def save_keys(req: Request):
 @app.post("/api/sync/manual")
 async def trigger_manual_sync(background_tasks: BackgroundTasks):
     """Triggers a full sync in the background with forced refresh from Swapcard."""
-    background_tasks.add_task(_sync_all_data_task, force_refresh=True)
+    if SYNC_WORKERS:
+        job_id = await run_blocking(get_queue().enqueue, "events", params={"force_refresh": True}, trigger="manual")
+        return JSONResponse(content={"status": "success", "message": "Manual sync queued for the sync workers.",
+                                     "job_id": job_id})
+    background_tasks.add_task(_sync_all_data_task, force_refresh=True, trigger="manual")
     return JSONResponse(content={"status": "success", "message": "Manual sync triggered in background."})
 
 @app.get("/api/cron/sync")
@@ -809,15 +1488,117 @@ async def cron_sync_task(request: Request, background_tasks: BackgroundTasks):
         return JSONResponse({"status": "error", "message": "Unauthorized"}, status_code=401)
         
     print("[Cron] Synchronizing data...")
+    if SYNC_WORKERS:
+        queue = get_queue()
+        jobs = {"events": await run_blocking(queue.enqueue, "events", params={"force_refresh": True}, trigger="cron"),
+                "scheduled": await run_blocking(queue.enqueue, "scheduled", trigger="cron")}
+        return {"status": "success", "message": "Cron sync queued for the sync workers", "jobs": jobs}
     # For Vercel, we might want to wait for it since the process will die after the request
     # but _sync_all_data_task is async, so we can just await it directly here.
-    await _sync_all_data_task(force_refresh=True)
-    return {"status": "success", "message": "Cron sync completed"}
+    run = await _sync_all_data_task(force_refresh=True, trigger="cron")
+    # No background loop on Vercel: each cron tick also runs the freshness work that is due
+    scheduled = await _scheduled_refresh_task(trigger="cron")
+    return {"status": "success", "message": "Cron sync completed", "lease": run["status"],
+            "events": run["result"], "scheduled": scheduled["result"]}
+
+@app.get("/api/sync/schedule")
+async def sync_schedule_status():
+    """Returns freshness budgets and how much leads / subpages work is due per category."""
+    return JSONResponse(content={"status": "success", "data": freshness.status()})
+
+@app.get("/api/sync/status")
+async def sync_status(limit: int = Query(10, ge=1, le=100), sync: str | None = None):
+    """
+    Sync telemetry: runs in flight and the last `limit` finished runs with
+    per-phase and per-event wall time, requests, bytes, rows, retries and throttles,
+    plus the rate limiter and read cache counters.
+    """
+    data = sync_telemetry.status(limit=limit, sync=sync)
+    data["rate_limit"] = swapcard_limiter.stats()
+    data["read_cache"] = subpage_cache.stats()
+    return JSONResponse(content={"status": "success", "data": data})
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Sync, upstream HTTP and read cache metrics in the Prometheus text format."""
+    limiter = swapcard_limiter.stats()
+    cache = subpage_cache.stats()
+    text = sync_telemetry.prometheus_text(
+        extra_gauges={
+            "eventhub_read_cache_bytes": cache["bytes"],
+            "eventhub_read_cache_entries": cache["entries"],
+        },
+        extra_counters={
+            "eventhub_swapcard_limiter_requests_delayed": limiter["requests_delayed"],
+            "eventhub_swapcard_limiter_wait_seconds": limiter["total_wait_sec"],
+            "eventhub_swapcard_limiter_throttled_responses": limiter["throttled_responses"],
+            "eventhub_read_cache_hits": cache["hits"],
+            "eventhub_read_cache_misses": cache["misses"],
+            "eventhub_read_cache_evictions": cache["evictions"],
+        })
+    return Response(content=text, media_type="text/plain; version=0.0.4")
+
+@app.post("/api/webhooks/swapcard")
+async def swapcard_webhook(request: Request, background_tasks: BackgroundTasks):
+    """
+    Receives signed change notifications for exhibitors, people, plannings,
+    sponsors and events (format in tools/webhooks.py). Notifications are
+    coalesced per event and data type; once a burst ends, only the touched
+    records are refetched and upserted.
+    """
+    body = await request.body()
+    try:
+        verify_signature(body, request.headers.get("X-Webhook-Signature"))
+        notifications = parse_notifications(_json.loads(body or b"null"))
+    except WebhookError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=e.status_code)
+    except ValueError:
+        return JSONResponse({"status": "error", "message": "Body is not valid JSON"}, status_code=400)
+
+    pending = webhook_coalescer.add(notifications)
+    if IS_VERCEL:
+        # No long-lived process to wait out the burst: refresh right after responding
+        background_tasks.add_task(_flush_webhooks, True)
+    else:
+        _ensure_webhook_flusher()
+    return JSONResponse({"status": "accepted", "notifications": len(notifications),
+                         "pending_entities": pending}, status_code=202)
+
+@app.get("/api/webhooks/status")
+async def webhook_status():
+    """Webhook notifications received / coalesced / dispatched and the entities still buffered."""
+    return JSONResponse(content={"status": "success", "mode": SYNC_MODE, "data": webhook_coalescer.status()})
+
+@app.get("/api/sync/jobs")
+async def sync_jobs(limit: int = Query(50, ge=1, le=500), status: str | None = None, kind: str | None = None):
+    """Sync worker jobs (newest first) with counts per kind and status (SYNC_MODE=workers)."""
+    queue = get_queue()
+    jobs = await run_blocking(queue.list_jobs, limit, status, kind)
+    summary = await run_blocking(queue.summary)
+    return JSONResponse(content={"status": "success", "mode": SYNC_MODE, "summary": summary, "data": jobs})
+
+@app.get("/api/sync/jobs/{job_id}")
+async def sync_job(job_id: int):
+    """One sync worker job: status, worker, attempts, timings and its result or error."""
+    job = await run_blocking(get_queue().get, job_id)
+    if job is None:
+        return JSONResponse(content={"status": "error", "message": "Job not found"}, status_code=404)
+    return JSONResponse(content={"status": "success", "data": job})
+
+@app.get("/api/sync/lease")
+async def sync_lease_status():
+    """Returns who holds each sync lease and which runs are in flight in this worker."""
+    return JSONResponse(content={"status": "success", "data": await lease_status()})
+
+@app.get("/api/sync/rate-limit")
+async def sync_rate_limit_status():
+    """Returns quota usage of the shared Swapcard rate limiter."""
+    return JSONResponse(content={"status": "success", "data": swapcard_limiter.stats()})
 
 @app.get("/api/communities")
 async def get_communities():
     """Fetches full list of communities and events from Swapcard without filtering."""
-    result = navigation.route_action("get_communities")
+    result = await run_blocking(navigation.route_action, "get_communities")
     return JSONResponse(content={"status": "success", "data": result})
 
 # ── Claude AI Chat Integration ───────────────────────────────────────────────
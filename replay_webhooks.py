@@ -0,0 +1,88 @@
+"""
+Replays Swapcard-style change notifications against the local webhook receiver
+(/api/webhooks/swapcard), signed like the real sender (see tools/webhooks.py).
+
+Notifications come from a file (JSON list or one notification per line) or are
+generated as a burst for one event, which shows the coalescing: many requests
+in, one refresh of the touched records out.
+
+Usage:
+    python replay_webhooks.py --file notifications.jsonl
+    python replay_webhooks.py --event <event id> --type exhibitor.updated --ids ex1,ex2 --repeat 20
+    python replay_webhooks.py --event <event id> --type event.updated --bad-signature   # expect 401
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import httpx
+
+sys.path.append(os.path.dirname(__file__))
+from tools.webhooks import sign
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+
+def load_notifications(args) -> list[dict]:
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        if text.startswith("["):
+            return json.loads(text)
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not args.event:
+        sys.exit("Pass --file or --event")
+    ids = [i for i in (args.ids or "").split(",") if i] or [args.event]
+    burst = [{"type": args.type, "eventId": args.event, "id": record_id, "communityId": args.community}
+             for record_id in ids]
+    return burst * args.repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay signed webhook notifications against a local server.")
+    parser.add_argument("--url", default="http://localhost:8000/api/webhooks/swapcard")
+    parser.add_argument("--secret", default=os.environ.get("SWAPCARD_WEBHOOK_SECRET"))
+    parser.add_argument("--file", help="JSON list or JSON-lines file of notifications")
+    parser.add_argument("--event", help="event id for a generated burst")
+    parser.add_argument("--community", help="community id for a generated burst")
+    parser.add_argument("--type", default="exhibitor.updated", help="notification type, e.g. person.deleted")
+    parser.add_argument("--ids", help="comma-separated record ids for a generated burst")
+    parser.add_argument("--repeat", type=int, default=1, help="times the generated burst is repeated")
+    parser.add_argument("--batch", type=int, default=1, help="notifications per request")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between requests")
+    parser.add_argument("--bad-signature", action="store_true", help="sign with a wrong secret")
+    args = parser.parse_args()
+
+    if not args.secret:
+        sys.exit("Set SWAPCARD_WEBHOOK_SECRET (or pass --secret) to the server's webhook secret")
+    secret = args.secret + "-wrong" if args.bad_signature else args.secret
+
+    notifications = load_notifications(args)
+    print(f"Replaying {len(notifications)} notifications to {args.url} in batches of {args.batch}...")
+    with httpx.Client(timeout=30) as client:
+        for start in range(0, len(notifications), args.batch):
+            batch = notifications[start:start + args.batch]
+            body = json.dumps(batch if args.batch > 1 else batch[0]).encode("utf-8")
+            resp = client.post(args.url, content=body, headers={
+                "Content-Type": "application/json",
+                "X-Webhook-Signature": sign(body, secret),
+            })
+            print(f"  [{start + len(batch)}/{len(notifications)}] HTTP {resp.status_code}: {resp.text[:200]}")
+            time.sleep(args.interval)
+
+        status_url = args.url.split("/api/")[0] + "/api/webhooks/status"
+        try:
+            print("Receiver status:", json.dumps(client.get(status_url).json().get("data"), indent=2))
+        except Exception as e:
+            print(f"Could not read {status_url}: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
 import os
 import json as _json
 import asyncio
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from pathlib import Path
 from tools import get_events, supabase_client
-from tools.supabase_client import supabase
+from tools.supabase_client import supabase, upsert_chunked
 from tools.fetch_analytics import get_event_analytics
 from tools.get_airtable import get_airtable_events, get_portfolio_mapping
+from tools.sync_watermarks import WatermarkStore, event_fingerprint, SYNC_INCREMENTAL
+from tools.sync_scheduler import is_stale, event_ended_at
+from tools import sync_telemetry
 import re
 
 BASE_DIR = Path(__file__).parent
@@ -22,21 +25,36 @@ def _load_sync_settings():
         print(f"Error loading sync settings from Supabase: {e}")
     return {"disabled_communities": [], "disabled_events": [], "sync_interval_minutes": 60}
 
-ANALYTICS_MAX_AGE_HOURS = 24  # Re-fetch analytics if older than this
-
-
-def _should_refresh_analytics(analytics_synced_at_str: str | None, force_refresh: bool) -> bool:
-    """Returns True if analytics data should be refreshed."""
+def _should_refresh_analytics(analytics_synced_at_str: str | None, force_refresh: bool, category: str,
+                              ended_at: float | None = None) -> bool:
+    """
+    Returns True if analytics data should be refreshed: its age is past the
+    category's analytics budget (tools/sync_scheduler.py; Active 1h, Future 24h,
+    Past frozen), or it was fetched before the event ended at `ended_at`.
+    """
     if force_refresh or not analytics_synced_at_str:
         return True
     try:
         synced_at = datetime.fromisoformat(analytics_synced_at_str.replace("Z", "+00:00"))
-        age = datetime.now(timezone.utc) - synced_at
-        return age > timedelta(hours=ANALYTICS_MAX_AGE_HOURS)
+        return is_stale(category, "analytics", synced_at.timestamp(), ended_at=ended_at)
     except Exception:
         return True
 
 
+def _prefetch_analytics_freshness(event_ids: list[str], chunk_size: int = 200) -> dict:
+    """Loads analytics_synced_at for all events in a few `in` queries instead of one per event."""
+    freshness = {}
+    for i in range(0, len(event_ids), chunk_size):
+        chunk = event_ids[i:i + chunk_size]
+        try:
+            res = supabase.table("swapcard_events").select("id, analytics_synced_at").in_("id", chunk).execute()
+            freshness.update({r["id"]: r.get("analytics_synced_at") for r in (res.data or [])})
+        except Exception as e:
+            # Unknown freshness is treated as stale, so these events get their analytics refreshed
+            print(f"[Sync] Warning: could not prefetch analytics freshness for {len(chunk)} events: {e}")
+    return freshness
+
+
 def _clean_community_name(name: str | None) -> str:
     if not name:
         return ""
@@ -65,57 +83,95 @@ async def run_standalone_sync(force_refresh: bool = False):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] [Sync] Starting events-only sync...")
     
     try:
-        # 1. Load settings
-        settings = _load_sync_settings()
-
-        # 2. Fetch Swapcard events
-        print("[Sync] Phase 1: Fetching Swapcard events via GraphQL...")
-        result = get_events.get_events(settings=settings)
-        events_by_cat = result.get("events", {})
-        all_events_flat = [ev for evs in events_by_cat.values() for ev in evs]
-        print(f"[Sync] Found {len(all_events_flat)} events total.")
-
-        # 2.5 Fetch Airtable Portfolio Mapping
-        print("[Sync] Phase 1.5: Fetching Airtable portfolio mapping...")
-        portfolio_records = get_portfolio_mapping()
+        # Telemetry for this run lands in data/sync_telemetry.json (see /api/sync/status)
+        with sync_telemetry.track_run("standalone", trigger="script"):
+            # 1. Load settings
+            settings = _load_sync_settings()
+
+            # 2. Fetch Swapcard events
+            print("[Sync] Phase 1: Fetching Swapcard events via GraphQL...")
+            with sync_telemetry.phase("events"):
+                result = get_events.get_events(settings=settings)
+            events_by_cat = result.get("events", {})
+            all_events_flat = [ev for evs in events_by_cat.values() for ev in evs]
+            print(f"[Sync] Found {len(all_events_flat)} events total.")
+
+            # 2.5 Fetch Airtable Portfolio Mapping
+            print("[Sync] Phase 1.5: Fetching Airtable portfolio mapping...")
+            with sync_telemetry.phase("airtable"):
+                portfolio_records = get_portfolio_mapping()
         
-        # Build base_name -> portfolio mapping
-        portfolio_map = {}
-        for record in portfolio_records:
-            p = record.get('portfolio')
-            name = record.get('name')
-            if name and p:
-                base_name = _get_base_name(name)
-                if base_name:
-                    portfolio_map[base_name] = p
+            # Build base_name -> portfolio mapping
+            portfolio_map = {}
+            for record in portfolio_records:
+                p = record.get('portfolio')
+                name = record.get('name')
+                if name and p:
+                    base_name = _get_base_name(name)
+                    if base_name:
+                        portfolio_map[base_name] = p
         
-        # Also include direct ID hits from the Projects table if possible
-        # (Optional but good for fallback)
-        direct_id_map = {}
-        try:
-            project_records = get_airtable_events()
-            for r in project_records:
-                eid = r.get('event_id')
-                p = r.get('portfolio')
-                if eid and p:
-                    direct_id_map[eid] = p
-        except Exception:
-            pass
+            # Also include direct ID hits from the Projects table if possible
+            # (Optional but good for fallback)
+            direct_id_map = {}
+            try:
+                with sync_telemetry.phase("airtable"):
+                    project_records = get_airtable_events()
+                for r in project_records:
+                    eid = r.get('event_id')
+                    p = r.get('portfolio')
+                    if eid and p:
+                        direct_id_map[eid] = p
+            except Exception:
+                pass
         
-        print(f"[Sync] Resolved portfolio mapping for {len(portfolio_map)} series.")
-
-        # 3. Upsert Events with metadata
-        print("[Sync] Phase 2: Updating events in Supabase (swapcard_events table)...")
-        for category, events in events_by_cat.items():
-            print(f"  - Processing {len(events)} {category} events...")
-            for ev in events:
+            print(f"[Sync] Resolved portfolio mapping for {len(portfolio_map)} series.")
+
+            # 3. Upsert Events with metadata
+            # Incremental mode only upserts events whose updatedAt/category watermark moved
+            # or whose analytics are due; force_refresh runs a full reconcile pass.
+            incremental = SYNC_INCREMENTAL and not force_refresh
+            watermarks = WatermarkStore()
+            rows, fingerprints = {}, {}  # written in chunked bulk upserts after the loop
+
+            # Refresh plan: one bulk freshness prefetch decides every analytics fetch
+            # before any of them start
+            with sync_telemetry.phase("plan"):
+                freshness = _prefetch_analytics_freshness([ev["id"] for ev in all_events_flat])
+            plan = []
+            for category, events in events_by_cat.items():
+                for ev in events:
+                    eid = ev["id"]
+                    fingerprint = event_fingerprint(ev, category)
+                    plan.append({
+                        "category": category,
+                        "event": ev,
+                        "fingerprint": fingerprint,
+                        "event_changed": not incremental or watermarks.is_changed("events", eid, fingerprint),
+                        "refresh_analytics": _should_refresh_analytics(freshness.get(eid), force_refresh, category,
+                                                                       event_ended_at(ev)),
+                    })
+            analytics_due = sum(1 for p in plan if p["refresh_analytics"])
+            skipped = sum(1 for p in plan if not p["refresh_analytics"] and not p["event_changed"])
+            print(f"[Sync] Plan: {len(plan)} events, {analytics_due} analytics fetches, "
+                  f"{len(plan) - analytics_due - skipped} metadata-only upserts, {skipped} unchanged.")
+            for category in events_by_cat:
+                cat_plan = [p for p in plan if p["category"] == category]
+                print(f"  - {category}: {len(cat_plan)} events, "
+                      f"{sum(1 for p in cat_plan if p['refresh_analytics'])} analytics fetches")
+
+            print(f"[Sync] Phase 2: Updating events in Supabase (swapcard_events table, {'incremental' if incremental else 'full reconcile'})...")
+            for item in plan:
+                category, ev, fingerprint = item["category"], item["event"], item["fingerprint"]
                 eid = ev["id"]
-                
+                if not item["refresh_analytics"] and not item["event_changed"]:
+                    continue
+
                 # Calculate registrations from groups (available in event metadata)
                 registrations = sum(group.get("peopleCount", 0) for group in ev.get("groups", []))
 
                 # ── Analytics: fetch lead counts from Swapcard Analytics API ──
-                # Check the current analytics_synced_at from Supabase to avoid unnecessary re-fetches
+                # Only events the plan marked stale are fetched; fresh ones keep their stored values
                 leads_data = {
                     "stats_total_leads": 0, "stats_badges_scanned": 0, "stats_business_cards_scanned": 0,
                     "stats_connections_made": 0, "stats_connection_requests_sent": 0, "stats_messages_exchanged": 0,
@@ -123,13 +179,9 @@ async def run_standalone_sync(force_refresh: bool = False):
                     "analytics_synced_at": None
                 }
                 try:
-                    existing = supabase.table("swapcard_events").select(
-                        "analytics_synced_at"
-                    ).eq("id", eid).maybe_single().execute()
-                    current_synced_at = (existing.data or {}).get("analytics_synced_at")
-
-                    if _should_refresh_analytics(current_synced_at, force_refresh):
-                        analytics = get_event_analytics(event_id=eid, use_cache=not force_refresh)
+                    if item["refresh_analytics"]:
+                        with sync_telemetry.phase("analytics"), sync_telemetry.event(eid):
+                            analytics = get_event_analytics(event_id=eid, use_cache=not force_refresh)
                         leads_data = {
                             "stats_total_leads":              analytics.get("stats_total_leads", 0),
                             "stats_badges_scanned":           analytics.get("stats_badges_scanned", 0),
@@ -144,14 +196,13 @@ async def run_standalone_sync(force_refresh: bool = False):
                         }
                         print(f"    [Analytics] {ev.get('title', eid)[:40]:40} → {leads_data['stats_total_leads']} leads")
                     else:
-                        print(f"    [Analytics] {ev.get('title', eid)[:40]:40} → skipped (fresh cache)")
                         # Preserve existing values by not overwriting
-                        leads_data = {"analytics_synced_at": current_synced_at}
+                        leads_data = {"analytics_synced_at": freshness.get(eid)}
                 except Exception as ae:
                     print(f"    [Analytics] Warning: could not fetch analytics for {eid}: {ae}")
 
                 # Prepare upsert data with metadata available from get_events
-                upsert_data = {
+                rows[eid] = {
                     "id": eid,
                     "slug": ev.get("slug"),
                     "title": ev.get("title"),
@@ -178,13 +229,18 @@ async def run_standalone_sync(force_refresh: bool = False):
                     "description_html": ev.get("htmlDescription"),
                     **leads_data,
                 }
-                
-                try:
-                    supabase.table("swapcard_events").upsert(upsert_data).execute()
-                except Exception as e:
-                    print(f"Error upserting event {eid}: {e}")
-
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] [Sync] Standalone events-only sync completed successfully.")
+                fingerprints[eid] = fingerprint
+
+            with sync_telemetry.phase("write"):
+                upsert_result = upsert_chunked("swapcard_events", list(rows.values()))
+            for eid in upsert_result["upserted"]:
+                watermarks.mark("events", eid, fingerprints[eid])
+            for eid, error in upsert_result["failed"].items():
+                print(f"Error upserting event {eid}: {error}")
+            watermarks.save()
+            print(f"[Sync] Upserted {len(upsert_result['upserted'])} events in {upsert_result['requests']} requests, "
+                  f"{skipped} unchanged, {len(upsert_result['failed'])} failed.")
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] [Sync] Standalone events-only sync completed successfully.")
         
     except Exception as e:
         print(f"[Sync] Standalone sync failed: {e}")
@@ -0,0 +1,241 @@
+"""
+sync_worker.py
+
+Dedicated sync worker processes (SYNC_MODE=workers).
+
+Syncing inside the web process (lifespan → _background_sync_loop) makes the
+CPU-heavy JSON normalization compete with request handlers for one GIL. With
+SYNC_MODE=workers set for the web app, it only enqueues jobs in the local job
+table (tools/sync_jobs.py) and reports their status (/api/sync/jobs); these
+processes claim and run them.
+
+Work is partitioned by community ID:
+  * A "subpages" job for the whole account ("*") is a planner: it lists the
+    events once and enqueues one "subpages" job per community.
+  * Community jobs are sharded over the workers by a stable hash of the
+    community ID, so one community's files, checkpoints and rows always go
+    through the same process, while large accounts spread over every core.
+  * Account-wide jobs ("events", "scheduled", the subpages planner) belong to
+    worker 0, which also runs the timer: the event list every
+    `sync_interval_minutes` and the freshness scheduler's due work.
+  * Webhook refreshes ("records") are partitioned by event ID.
+
+Each job runs the same sync functions as main.py, heartbeats while it runs and
+is requeued by any worker if its process dies (see SYNC_JOB_TTL).
+
+Configuration (environment variables):
+    SYNC_WORKERS            Worker processes started by the supervisor (default 2)
+    SYNC_WORKER_POLL        Seconds between job table polls when idle (default 2)
+    SYNC_JOB_HEARTBEAT      Seconds between heartbeats of a running job (default 30)
+
+Usage:
+    python sync_worker.py                      # supervisor, SYNC_WORKERS processes
+    python sync_worker.py --workers 4          # supervisor, 4 processes
+    python sync_worker.py --index 1 --total 4  # a single worker (e.g. one systemd unit each)
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import hashlib
+import argparse
+import traceback
+import multiprocessing
+
+WORKERS = int(os.environ.get("SYNC_WORKERS", 2))
+POLL_INTERVAL = float(os.environ.get("SYNC_WORKER_POLL", 2))
+JOB_HEARTBEAT = int(os.environ.get("SYNC_JOB_HEARTBEAT", 30))
+RESTART_DELAY = 5  # seconds before the supervisor restarts a crashed worker
+
+
+def shard_of(partition: str, total: int) -> int:
+    """Worker index owning a partition; account-wide jobs ("*") go to worker 0."""
+    if partition == "*" or total <= 1:
+        return 0
+    digest = hashlib.blake2b(partition.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % total
+
+
+class SyncWorker:
+    """Claims the jobs of one shard from the job table and runs them one at a time."""
+
+    def __init__(self, index: int, total: int):
+        # main.py is imported here, in the worker process, not by the supervisor
+        import main
+        from tools.sync_jobs import get_queue
+        from tools.blocking import run_blocking
+        from tools import sync_telemetry
+
+        self.main = main
+        self.queue = get_queue()
+        self.run_blocking = run_blocking
+        self.telemetry = sync_telemetry
+        self.index = index
+        self.total = max(1, total)
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{index}/{self.total}"
+
+    def owns(self, partition: str) -> bool:
+        return shard_of(partition, self.total) == self.index
+
+    async def run(self):
+        print(f"[SyncWorker {self.index}] {self.name} started")
+        if self.index == 0:
+            asyncio.create_task(self._timer())
+        last_recovery = 0.0
+        while True:
+            if time.monotonic() - last_recovery >= POLL_INTERVAL * 10:
+                recovered = await self.run_blocking(self.queue.requeue_stale, pool="sync")
+                if recovered:
+                    print(f"[SyncWorker {self.index}] Recovered {recovered} jobs of stopped workers")
+                last_recovery = time.monotonic()
+            job = await self.run_blocking(self.queue.claim, self.name, self.owns, pool="sync")
+            if job is None:
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            await self._process(job)
+
+    async def _process(self, job: dict):
+        label = f"{job['kind']}[{job['partition']}] #{job['id']}"
+        print(f"[SyncWorker {self.index}] Running {label} (attempt {job['attempts']}, {job['trigger']})")
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        started = time.monotonic()
+        try:
+            result = await self._run_job(job)
+        except Exception as e:
+            traceback.print_exc()
+            await self.run_blocking(self.queue.fail, job["id"], f"{type(e).__name__}: {e}", pool="sync")
+            print(f"[SyncWorker {self.index}] {label} failed after {time.monotonic() - started:.1f}s: {e}")
+            return
+        finally:
+            heartbeat.cancel()
+        await self.run_blocking(self.queue.finish, job["id"], result, pool="sync")
+        print(f"[SyncWorker {self.index}] {label} done in {time.monotonic() - started:.1f}s")
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT)
+            try:
+                await self.run_blocking(self.queue.heartbeat, job_id, pool="sync")
+            except Exception as e:
+                print(f"[SyncWorker {self.index}] Heartbeat for job {job_id} failed: {e}")
+
+    async def _run_job(self, job: dict):
+        main, params, trigger = self.main, job["params"], job["trigger"] or "worker"
+        if job["kind"] == "events":
+            run = await main._sync_all_data_task(force_refresh=params.get("force_refresh", False), trigger=trigger)
+            return {"lease": run["status"], "run_id": run["run_id"], "counts": run["result"]}
+
+        if job["kind"] == "scheduled":
+            # Community jobs in other workers record their refreshes in the shared freshness file
+            await self.run_blocking(main.freshness.reload, pool="sync")
+            settings = await self.run_blocking(main._load_sync_settings, pool="sync")
+            run = await main._scheduled_refresh_task(settings, trigger=trigger)
+            return {"lease": run["status"], "run_id": run["run_id"], "counts": run["result"]}
+
+        if job["kind"] == "records":
+            with self.telemetry.track_run("webhook", run_id=f"job-{job['id']}", trigger=trigger):
+                return await main._refresh_touched_records(job["partition"], params.get("touched", {}))
+
+        if job["partition"] == "*":
+            return await self._plan_subpages(params, trigger)
+
+        settings = await self.run_blocking(main._load_sync_settings, pool="sync")
+        with self.telemetry.track_run("subpages", run_id=f"job-{job['id']}", trigger=trigger):
+            # The community lease keeps scheduler refreshes of the same events out while the job runs
+            run = await main.hold_lease(
+                main._subpages_lease(job["partition"]),
+                lambda: main._run_subpages_sync(settings, params.get("force_refresh", False),
+                                                events=[tuple(item) for item in params.get("events", [])],
+                                                partition=job["partition"]),
+                trigger=trigger)
+        if run["status"] == "timeout":
+            raise RuntimeError(f"Lease {main._subpages_lease(job['partition'])} stayed busy")
+        counts = run["result"]
+        return {key: counts[key] for key in ("events", "fetched", "reused", "resumed", "rows", "failed_rows")}
+
+    async def _plan_subpages(self, params: dict, trigger: str) -> dict:
+        """Splits an account-wide subpage sync into one job per community."""
+        from tools import get_events
+        from tools.blocking import iterate_blocking
+
+        settings = await self.run_blocking(self.main._load_sync_settings, pool="sync")
+        communities = {}
+        async for page in iterate_blocking(get_events.iter_events(settings=settings)):
+            for category, ev in page:
+                community_id = (ev.get("community") or {}).get("id") or "unassigned"
+                communities.setdefault(community_id, []).append([category, ev])
+
+        jobs = {}
+        for community_id, events in communities.items():
+            jobs[community_id] = await self.run_blocking(
+                self.queue.enqueue, "subpages", community_id,
+                {"events": events, "force_refresh": params.get("force_refresh", False)}, trigger, pool="sync")
+        print(f"[SyncWorker {self.index}] Planned subpage sync: "
+              f"{sum(len(e) for e in communities.values())} events in {len(jobs)} community jobs")
+        return {"communities": len(jobs), "jobs": jobs}
+
+    async def _timer(self):
+        """Worker 0 enqueues the recurring work the web process's background loop used to run."""
+        main, last_events = self.main, None
+        while True:
+            try:
+                settings = await self.run_blocking(main._load_sync_settings, pool="sync")
+                interval_sec = max(5, settings.get("sync_interval_minutes", 60)) * 60
+                if last_events is None or time.monotonic() - last_events >= interval_sec:
+                    await self.run_blocking(self.queue.enqueue, "events", trigger="background", pool="sync")
+                    last_events = time.monotonic()
+                await self.run_blocking(main.freshness.reload, pool="sync")
+                if main.freshness.seconds_until_due() == 0:
+                    await self.run_blocking(self.queue.enqueue, "scheduled", trigger="scheduler", pool="sync")
+            except Exception as e:
+                print(f"[SyncWorker {self.index}] Timer failed: {e}")
+            await asyncio.sleep(main.SCHEDULER_MIN_SLEEP)
+
+
+def run_worker(index: int, total: int):
+    try:
+        asyncio.run(SyncWorker(index, total).run())
+    except KeyboardInterrupt:
+        pass
+
+
+def supervise(total: int):
+    """Runs `total` worker processes and restarts any that crash."""
+    ctx = multiprocessing.get_context("spawn")
+    procs = {}
+    try:
+        while True:
+            for index in range(total):
+                proc = procs.get(index)
+                if proc is not None and proc.is_alive():
+                    continue
+                if proc is not None:
+                    print(f"[SyncWorker] Worker {index} exited with {proc.exitcode}; restarting")
+                    time.sleep(RESTART_DELAY)
+                procs[index] = ctx.Process(target=run_worker, args=(index, total), name=f"sync-worker-{index}")
+                procs[index].start()
+            time.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print("[SyncWorker] Stopping workers...")
+        for proc in procs.values():
+            proc.terminate()
+        for proc in procs.values():
+            proc.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run EventHubX sync worker processes (SYNC_MODE=workers).")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes to supervise")
+    parser.add_argument("--index", type=int, help="run only this worker (0-based) instead of a supervisor")
+    parser.add_argument("--total", type=int, help="total workers when running a single one with --index")
+    args = parser.parse_args()
+
+    if args.index is not None:
+        total = args.total or args.workers
+        if not 0 <= args.index < total:
+            sys.exit(f"--index must be between 0 and {total - 1}")
+        run_worker(args.index, total)
+    else:
+        supervise(max(1, args.workers))
@@ -0,0 +1,139 @@
+"""
+tools/batch_writer.py
+
+Cross-event batched table writer.
+
+The subpage sync used to upsert each event's rows per data type in batches of
+100, so a small event with 12 exhibitors and 3 sponsors still cost one request
+per table, and a full resync issued thousands of tiny upserts. TableBatchWriter
+instead accumulates rows per target table across events and flushes a table's
+buffer once it reaches SUBPAGE_WRITE_BATCH_ROWS rows or SUBPAGE_WRITE_BATCH_BYTES
+of serialized JSON, whichever comes first. Each table flushes with at most
+SUBPAGE_WRITE_CONCURRENCY batches in flight; when all slots are busy, `add()`
+waits, which pushes back on whoever is feeding the writer.
+
+Rows are added in tagged parts (e.g. one normalized batch of one event). Parts
+are never split across flushes, and `on_done(table, parts, result, error)` tells
+the caller which parts a flush covered, so per-event bookkeeping (checkpoints,
+failures) still works when one request carries rows of many events.
+
+A batch mixing events may hold the same row twice, and Postgres rejects an
+upsert that touches one row twice ("ON CONFLICT DO UPDATE command cannot affect
+row a second time"). With `key` (row -> its conflict key), each flush keeps only
+the last version of every row.
+
+Configuration (environment variables):
+    SUBPAGE_WRITE_BATCH_ROWS      Rows per flushed batch (default 500)
+    SUBPAGE_WRITE_BATCH_BYTES     Serialized bytes per flushed batch (default 4 MiB)
+    SUBPAGE_WRITE_CONCURRENCY     Batches in flight per table (default 2)
+
+Usage:
+    from tools.batch_writer import TableBatchWriter, estimate_bytes
+
+    async def write_batch(table, rows):
+        return await run_blocking(upsert_chunked, table, rows, on_conflict="event_id,id", pool="sync")
+
+    writer = TableBatchWriter(write_batch, on_done=record, key=lambda row: (row["event_id"], row["id"]))
+    await writer.add("event_people", rows, tag=event_id, nbytes=estimate_bytes(rows))
+    await writer.close()   # flushes partial batches and waits for every write
+"""
+
+import os
+import json
+import time
+import asyncio
+
+WRITE_BATCH_ROWS = int(os.environ.get("SUBPAGE_WRITE_BATCH_ROWS", 500))
+WRITE_BATCH_BYTES = int(os.environ.get("SUBPAGE_WRITE_BATCH_BYTES", 4 * 1024 * 1024))
+WRITE_CONCURRENCY = int(os.environ.get("SUBPAGE_WRITE_CONCURRENCY", 2))
+
+
+def estimate_bytes(rows: list[dict]) -> int:
+    """Serialized size of rows as sent to PostgREST (run it off the event loop for big batches)."""
+    return sum(len(json.dumps(row, separators=(",", ":"), default=str)) for row in rows)
+
+
+class _Buffer:
+    def __init__(self):
+        self.parts: list[tuple] = []  # (tag, rows)
+        self.rows = 0
+        self.bytes = 0
+
+
+class TableBatchWriter:
+    """Per-table row buffers flushed as size- and byte-bounded batches with bounded concurrency."""
+
+    def __init__(self, write_batch, max_rows: int = WRITE_BATCH_ROWS, max_bytes: int = WRITE_BATCH_BYTES,
+                 concurrency: int = WRITE_CONCURRENCY, on_done=None, key=None):
+        self.write_batch = write_batch
+        self.key = key
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max(1, max_bytes)
+        self.concurrency = max(1, concurrency)
+        self.on_done = on_done
+        self._buffers: dict[str, _Buffer] = {}
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.stats: dict[str, dict] = {}
+
+    async def add(self, table: str, rows: list[dict], tag=None, nbytes: int | None = None):
+        """Buffers one part; flushes the table's buffer once it is over either bound."""
+        if not rows:
+            return
+        buf = self._buffers.setdefault(table, _Buffer())
+        buf.parts.append((tag, rows))
+        buf.rows += len(rows)
+        buf.bytes += nbytes if nbytes is not None else estimate_bytes(rows)
+        if buf.rows >= self.max_rows or buf.bytes >= self.max_bytes:
+            await self._flush(table)
+
+    async def _flush(self, table: str):
+        buf = self._buffers.pop(table, None)
+        if buf is None or not buf.parts:
+            return
+        slots = self._slots.setdefault(table, asyncio.Semaphore(self.concurrency))
+        await slots.acquire()  # backpressure: wait for a free write slot on this table
+        stats = self.stats.setdefault(table, {"batches": 0, "rows": 0, "bytes": 0, "max_batch_rows": 0,
+                                              "write_sec": 0.0, "errors": 0, "duplicates": 0})
+        stats["batches"] += 1
+        stats["rows"] += buf.rows
+        stats["bytes"] += buf.bytes
+        stats["max_batch_rows"] = max(stats["max_batch_rows"], buf.rows)
+        task = asyncio.create_task(self._write(table, buf, slots, stats))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, table: str, buf: _Buffer, slots: asyncio.Semaphore, stats: dict):
+        rows = [row for _, part in buf.parts for row in part]
+        if self.key is not None:
+            unique = {self.key(row): row for row in rows}  # last write wins
+            stats["duplicates"] += len(rows) - len(unique)
+            rows = list(unique.values())
+        result, error = None, None
+        started = time.monotonic()
+        try:
+            result = await self.write_batch(table, rows)
+        except Exception as e:
+            error = e
+            stats["errors"] += 1
+            print(f"[BatchWriter] Write of {len(rows)} rows into {table} failed: {e}")
+        finally:
+            stats["write_sec"] += time.monotonic() - started
+            slots.release()
+        if self.on_done is not None:
+            try:
+                await self.on_done(table, buf.parts, result, error)
+            except Exception as e:
+                print(f"[BatchWriter] on_done for {table} failed: {e}")
+
+    async def close(self):
+        """Flushes every partial buffer and waits until all writes have finished."""
+        for table in list(self._buffers):
+            await self._flush(table)
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    def summary(self) -> dict:
+        return {table: {**s, "write_sec": round(s["write_sec"], 3),
+                        "avg_batch_rows": round(s["rows"] / s["batches"], 1) if s["batches"] else 0}
+                for table, s in self.stats.items()}
@@ -0,0 +1,65 @@
+"""
+tools/blocking.py
+
+Bounded thread pools for blocking I/O called from async code.
+
+supabase-py, the Swapcard GraphQL helpers and plain file I/O are synchronous.
+Calling them directly inside an `async def` stalls the whole uvicorn event loop,
+so every request (images, subpages, chat SSE) waits behind them. Handlers and
+sync tasks hand such calls to one of two dedicated pools instead:
+
+    "api"   short request-path calls (login, activity, subpage lookups)
+    "sync"  long-running sync work (event pages, subpage fetches, bulk upserts)
+
+Keeping them separate means a sync that saturates its pool cannot starve
+request handlers, so API latency during a sync stays close to idle levels.
+Calls run in a copy of the caller's context (like `asyncio.to_thread`), so sync
+telemetry attributes their requests to the right run and phase.
+
+Configuration (environment variables):
+    BLOCKING_API_WORKERS    Threads for request handlers (default 16)
+    BLOCKING_SYNC_WORKERS   Threads for sync work (default 8)
+
+Usage:
+    from tools.blocking import run_blocking
+
+    users = await run_blocking(_load_users)
+    rows = await run_blocking(upsert_chunked, "swapcard_events", rows, pool="sync")
+"""
+
+import os
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+_POOLS = {
+    "api": ThreadPoolExecutor(max_workers=int(os.environ.get("BLOCKING_API_WORKERS", 16)),
+                              thread_name_prefix="blocking-api"),
+    "sync": ThreadPoolExecutor(max_workers=int(os.environ.get("BLOCKING_SYNC_WORKERS", 8)),
+                               thread_name_prefix="blocking-sync"),
+}
+
+_END = object()
+
+
+async def run_blocking(fn, *args, pool: str = "api", **kwargs):
+    """Runs `fn(*args, **kwargs)` on the named pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_POOLS[pool], functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+async def iterate_blocking(iterable, pool: str = "sync"):
+    """Async iterator over a blocking iterable/generator; each next() runs on the pool."""
+    it = iter(iterable)
+    while True:
+        item = await run_blocking(next, it, _END, pool=pool)
+        if item is _END:
+            return
+        yield item
+
+
+def shutdown():
+    for executor in _POOLS.values():
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,369 @@
+"""
+tools/compressed_storage.py
+
+Transparent compressed storage for the bulk JSON files: data/subpages/<event>/
+(records and member rosters), the global data/<type>.json files and the
+analytics / engagement caches (data/analytics, data/engagement).
+
+Callers keep using the logical path (".../exhibitors.json"); the bytes live in
+".../exhibitors.json.zst" (zstd, when the optional `zstandard` package is
+installed) or ".../exhibitors.json.gz" (gzip, standard library). Subpage JSON is
+highly repetitive, so this cuts disk use (Vercel's /tmp is small) and the bytes
+a cold read pulls from disk several times over.
+
+  * Reads decompress as a stream (`open_read`), so iter_records_file still holds
+    one record at a time.
+  * Writes go to a temporary file that atomically replaces the stored one
+    (`atomic_writer`); other variants of the same logical file are removed.
+  * Existing plain (or other-codec) files migrate automatically the first time
+    they are resolved, or in bulk: `python tools/compressed_storage.py migrate`.
+  * zstd dictionaries: `python tools/compressed_storage.py train exhibitors`
+    trains one on the stored exhibitor records. Files named after it
+    (exhibitors.json) are then compressed with it, which mostly helps the many
+    small files. Dictionaries are kept by id in data/dicts, and each zstd frame
+    names the dictionary it needs, so retraining never breaks older files.
+
+Configuration (environment variables):
+    STORAGE_CODEC         zstd | gzip | none (default zstd if installed, else gzip)
+    STORAGE_LEVEL         Compression level (default 9 for zstd, 6 for gzip)
+    STORAGE_DICTIONARIES  Set to 0 to ignore trained zstd dictionaries when writing (default 1)
+
+Usage:
+    from tools.compressed_storage import open_read, atomic_writer, read_json, write_json, exists
+
+    with atomic_writer(path) as f:
+        f.write(text)
+    with open_read(path) as f:
+        for line in f:
+            ...
+    python tools/compressed_storage.py migrate            # compress existing plain files
+    python tools/compressed_storage.py train exhibitors   # train a zstd dictionary
+    python tools/compressed_storage.py migrate --rewrite  # recompress everything with it
+    python tools/compressed_storage.py report             # stored vs. uncompressed bytes
+"""
+
+import io
+import os
+import sys
+import gzip
+import json
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+try:
+    import zstandard
+except ImportError:  # gzip is always available
+    zstandard = None
+
+# Same storage root as tools/get_subpages.py (Vercel only allows writes in /tmp)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+DICT_DIR = DATA_DIR / "dicts"
+MIGRATE_DIRS = ("subpages", "analytics", "engagement")
+
+SUFFIXES = {"zstd": ".zst", "gzip": ".gz", "none": ""}
+STORAGE_CODEC = os.environ.get("STORAGE_CODEC") or ("zstd" if zstandard else "gzip")
+if STORAGE_CODEC not in SUFFIXES or (STORAGE_CODEC == "zstd" and zstandard is None):
+    print(f"[Storage] STORAGE_CODEC={STORAGE_CODEC} is unavailable; using gzip")
+    STORAGE_CODEC = "gzip"
+STORAGE_LEVEL = int(os.environ.get("STORAGE_LEVEL") or (9 if STORAGE_CODEC == "zstd" else 6))
+STORAGE_DICTIONARIES = os.environ.get("STORAGE_DICTIONARIES", "1") == "1"
+DICT_SIZE = 112640  # zstd's default dictionary size
+
+_dict_lock = threading.Lock()
+_dicts: dict = {}
+
+
+# ─── Paths ────────────────────────────────────────────────────────────────────
+
+def _variants(path) -> list[str]:
+    """Physical files that may hold a logical path, the current codec's first."""
+    path = str(path)
+    current = SUFFIXES[STORAGE_CODEC]
+    return [path + current] + [path + s for s in (".zst", ".gz", "") if s != current]
+
+
+def resolve(path, migrate: bool = True) -> str | None:
+    """
+    Physical file holding `path`, or None. A file stored in another format
+    (plain JSON from before compression, or another codec) is migrated first.
+    """
+    variants = _variants(path)
+    for candidate in variants:
+        if os.path.exists(candidate):
+            if migrate and candidate != variants[0]:
+                return migrate_file(path, candidate)
+            return candidate
+    return None
+
+
+def exists(path) -> bool:
+    return resolve(path, migrate=False) is not None
+
+
+def stamp(path) -> list | None:
+    """[size, mtime_ns] of the file stored for `path` (None if there is none); changes on every write."""
+    for _ in range(3):
+        physical = resolve(path)
+        if physical is None:
+            return None
+        try:
+            st = os.stat(physical)
+            return [st.st_size, st.st_mtime_ns]
+        except FileNotFoundError:
+            continue  # replaced by a concurrent migration or write; resolve again
+    return None
+
+
+# ─── Dictionaries ─────────────────────────────────────────────────────────────
+
+def _load_dictionary(dict_id: int):
+    with _dict_lock:
+        if dict_id not in _dicts:
+            data = (DICT_DIR / f"{dict_id}.zdict").read_bytes()
+            _dicts[dict_id] = zstandard.ZstdCompressionDict(data)
+        return _dicts[dict_id]
+
+
+def _dictionary_for(path):
+    """The current trained dictionary for a file's kind ("exhibitors" for exhibitors.json), if any."""
+    if not STORAGE_DICTIONARIES:
+        return None
+    kind = Path(path).name.split(".", 1)[0]
+    pointer = DICT_DIR / f"{kind}.current"
+    try:
+        return _load_dictionary(int(pointer.read_text().strip()))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# ─── Streams ──────────────────────────────────────────────────────────────────
+
+def open_physical(physical: str):
+    """Text stream over one physical file (see resolve), decompressed on the fly."""
+    if physical.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{physical} is zstd-compressed; install the zstandard package to read it")
+        raw = open(physical, "rb")
+        try:
+            header = raw.read(18)
+            if not header:  # a file written with no records
+                raw.close()
+                return io.StringIO()
+            params = zstandard.get_frame_parameters(header)
+            raw.seek(0)
+            dctx = zstandard.ZstdDecompressor(dict_data=_load_dictionary(params.dict_id) if params.dict_id else None)
+            reader = dctx.stream_reader(raw, closefd=True, read_across_frames=True)
+            return io.TextIOWrapper(io.BufferedReader(reader), encoding="utf-8")
+        except BaseException:
+            raw.close()
+            raise
+    if physical.endswith(".gz"):
+        return gzip.open(physical, "rt", encoding="utf-8")
+    return open(physical, "r", encoding="utf-8")
+
+
+def open_read(path):
+    """Text stream over the logical file, decompressed on the fly; raises FileNotFoundError."""
+    for _ in range(3):
+        physical = resolve(path)
+        if physical is None:
+            break
+        try:
+            return open_physical(physical)
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(f"No stored file for {path}")
+
+
+def _open_write(tmp: str, path, binary: bool = False):
+    if binary:
+        return open(tmp, "wb")
+    if STORAGE_CODEC == "zstd":
+        cctx = zstandard.ZstdCompressor(level=STORAGE_LEVEL, dict_data=_dictionary_for(path), write_checksum=True)
+        return io.TextIOWrapper(cctx.stream_writer(open(tmp, "wb"), closefd=True), encoding="utf-8")
+    if STORAGE_CODEC == "gzip":
+        return gzip.open(tmp, "wt", encoding="utf-8", compresslevel=STORAGE_LEVEL)
+    return open(tmp, "w", encoding="utf-8")
+
+
+class ConcurrentWriteError(RuntimeError):
+    """The stored file changed while a rewrite of it was in progress; the rewrite was discarded."""
+
+
+@contextmanager
+def atomic_writer(path, binary: bool = False, if_stamp: list | None = None):
+    """
+    Text stream that replaces the stored file for `path` once the block exits
+    cleanly; on error the previous file is kept. With `binary` it is a raw byte
+    stream for data the caller compressed itself (see block_compressor).
+    `if_stamp` discards the write (ConcurrentWriteError) unless the stored file
+    still has that stamp, so a background rewrite never clobbers a newer write.
+    """
+    target = str(path) + SUFFIXES[STORAGE_CODEC]
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    try:
+        with _open_write(tmp, path, binary) as f:
+            yield f
+        if if_stamp is not None and stamp(path) != if_stamp:
+            raise ConcurrentWriteError(f"{path} changed during the rewrite")
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    for candidate in _variants(path)[1:]:
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
+
+
+# ─── Blocks ───────────────────────────────────────────────────────────────────
+# A stored file may be a sequence of independently compressed blocks (zstd frames
+# or gzip members, both still one valid stream for open_read). A reader that
+# knows a block's byte range decompresses just that block (tools/record_files.py).
+
+def block_compressor(path):
+    """Returns compress(bytes) -> bytes producing one self-contained block in the current codec."""
+    if STORAGE_CODEC == "zstd":
+        cctx = zstandard.ZstdCompressor(level=STORAGE_LEVEL, dict_data=_dictionary_for(path), write_checksum=True)
+        return cctx.compress
+    if STORAGE_CODEC == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=STORAGE_LEVEL, mtime=0)
+    return bytes
+
+
+def decompress_block(block: bytes, physical: str) -> bytes:
+    """Decompresses one block sliced from the physical file `physical`."""
+    if physical.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{physical} is zstd-compressed; install the zstandard package to read it")
+        dict_id = zstandard.get_frame_parameters(block[:18]).dict_id
+        dctx = zstandard.ZstdDecompressor(dict_data=_load_dictionary(dict_id) if dict_id else None)
+        return dctx.decompress(block)
+    if physical.endswith(".gz"):
+        return gzip.decompress(block)
+    return block
+
+
+def read_json(path):
+    with open_read(path) as f:
+        return json.load(f)
+
+
+def write_json(path, data, indent: int | None = None):
+    with atomic_writer(path) as f:
+        json.dump(data, f, indent=indent)
+
+
+# ─── Migration ────────────────────────────────────────────────────────────────
+
+def migrate_file(path, physical: str | None = None) -> str | None:
+    """
+    Rewrites a file stored in another format with the current codec; returns the
+    new physical file. Record files (those with a sidecar index) are rewritten
+    block by block with a new index, since a single recompressed stream would
+    not match the index's block offsets.
+    """
+    from tools import record_files  # record_files builds on this module
+    physical = physical or resolve(path, migrate=False)
+    try:
+        src = open_physical(physical)
+    except FileNotFoundError:
+        return resolve(path, migrate=False)  # another process migrated it meanwhile
+    with src:
+        if exists(record_files.index_path(path)):
+            record_files.rewrite_records(path, src)
+        else:
+            with atomic_writer(path) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+    return _variants(path)[0]
+
+
+def _logical_files(root: Path):
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            for suffix in (".json.zst", ".json.gz", ".json"):
+                if name.endswith(suffix):
+                    yield os.path.join(dirpath, name[:len(name) - len(suffix) + len(".json")])
+                    break
+
+
+def migrate_tree(root, rewrite: bool = False) -> dict:
+    """
+    Migrates every JSON file under `root` (`rewrite` also recompresses files
+    already in the current format, e.g. with a new dictionary); returns file
+    and byte counts before and after.
+    """
+    summary = {"files": 0, "migrated": 0, "bytes_before": 0, "bytes_after": 0}
+    for logical in sorted(set(_logical_files(Path(root)))):
+        before = resolve(logical, migrate=False)
+        size_before = os.path.getsize(before)
+        after = migrate_file(logical, before) if rewrite else resolve(logical)
+        summary["files"] += 1
+        summary["migrated"] += rewrite or after != before
+        summary["bytes_before"] += size_before
+        summary["bytes_after"] += os.path.getsize(after)
+    return summary
+
+
+def train_dictionary(kind: str, root=DATA_DIR / "subpages", size: int = DICT_SIZE) -> int:
+    """
+    Trains a zstd dictionary on the records of every stored <kind>.json under
+    `root`, makes it current for that kind and returns its id.
+    """
+    from tools import record_files  # record files are NDJSON blocks, not one JSON document
+    if zstandard is None:
+        raise RuntimeError("Dictionary training needs the zstandard package")
+    samples = []
+    for logical in _logical_files(Path(root)):
+        if Path(logical).name != f"{kind}.json":
+            continue
+        samples.extend(json.dumps(r).encode("utf-8") for r in record_files.iter_records(logical))
+    if not samples:
+        raise ValueError(f"No {kind}.json files under {root} to train on")
+    trained = zstandard.train_dictionary(size, samples)
+    DICT_DIR.mkdir(parents=True, exist_ok=True)
+    (DICT_DIR / f"{trained.dict_id()}.zdict").write_bytes(trained.as_bytes())
+    (DICT_DIR / f"{kind}.current").write_text(str(trained.dict_id()))
+    print(f"[Storage] Trained {kind} dictionary {trained.dict_id()} on {len(samples)} records")
+    return trained.dict_id()
+
+
+def report(root) -> dict:
+    """Stored vs. uncompressed bytes of the JSON files under `root`."""
+    summary = {"files": 0, "stored_bytes": 0, "json_bytes": 0}
+    for logical in set(_logical_files(Path(root))):
+        summary["files"] += 1
+        summary["stored_bytes"] += os.path.getsize(resolve(logical, migrate=False))
+        with open_read(logical) as f:
+            while chunk := f.read(1 << 20):
+                summary["json_bytes"] += len(chunk.encode("utf-8"))
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage compressed JSON storage.")
+    parser.add_argument("command", choices=("migrate", "train", "report"))
+    parser.add_argument("kind", nargs="?", help="file kind to train a dictionary for, e.g. exhibitors")
+    parser.add_argument("--size", type=int, default=DICT_SIZE, help="dictionary size in bytes")
+    parser.add_argument("--rewrite", action="store_true", help="migrate: also recompress files already compressed")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        if not args.kind:
+            sys.exit("Pass the kind to train, e.g. exhibitors")
+        train_dictionary(args.kind, size=args.size)
+        print(f"[Storage] Run 'migrate --rewrite' (or the next sync) to recompress {args.kind}.json files with it")
+    else:
+        for name in MIGRATE_DIRS:
+            root = DATA_DIR / name
+            if root.exists():
+                result = migrate_tree(root, args.rewrite) if args.command == "migrate" else report(root)
+                print(f"[Storage] {name}: {json.dumps(result)}")
@@ -40,15 +40,16 @@ Usage:
 """
 
 import os
+import sys
 import json
-import urllib.request
-import urllib.error
 from datetime import datetime, timedelta
 from pathlib import Path
 
-# ─── Constants ────────────────────────────────────────────────────────────────
+sys.path.append(str(Path(__file__).parent.parent))
+from tools.swapcard_client import stream_analytics, SwapcardAPIError
+from tools import compressed_storage as storage
 
-ANALYTICS_URL = "https://developer.swapcard.com/event-admin/export/analytics"
+# ─── Constants ────────────────────────────────────────────────────────────────
 
 # Which event names count as a "lead" for the total (typically physical & direct networking + exhibitor interactions)
 LEAD_EVENT_TYPES = {
@@ -62,7 +63,9 @@ LEAD_EVENT_TYPES = {
     "exhibitor_bookmark_create":    "stats_exhibitor_bookmarks",
 }
 
-ANALYTICS_CACHE_DIR = Path(__file__).parent.parent / "data" / "analytics"
+# Vercel only allows writes in /tmp; cache files are stored compressed (tools/compressed_storage.py)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+ANALYTICS_CACHE_DIR = DATA_DIR / "analytics"
 ANALYTICS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 
@@ -101,7 +104,7 @@ def _fetch_analytics_stream(event_ids: list, time_gt: str, time_lt: str | None =
             "cursor_last": str | None
         }
     """
-    api_key = _get_api_key()
+    _get_api_key()  # fail fast if the key is missing
 
     payload = {
         "event_ids": event_ids,
@@ -110,27 +113,19 @@ def _fetch_analytics_stream(event_ids: list, time_gt: str, time_lt: str | None =
     if time_lt:
         payload["time_lt"] = time_lt
 
-    req = urllib.request.Request(
-        ANALYTICS_URL,
-        data=json.dumps(payload).encode("utf-8"),
-        method="POST"
-    )
-    req.add_header("Authorization", api_key)
-    req.add_header("Content-Type", "application/json")
-
     count = 0
     breakdown: dict[str, int] = {}
     cursor_last = None
 
     try:
         # Increase timeout for large historical datasets and add explicit error handling for the stream
-        with urllib.request.urlopen(req, timeout=300) as resp:
-            for raw_line in resp:
+        with stream_analytics(payload, timeout=300) as resp:
+            for raw_line in resp.iter_lines():
                 try:
                     line = raw_line.strip()
                     if not line:
                         continue
-                    event_obj = json.loads(line.decode("utf-8"))
+                    event_obj = json.loads(line)
                 except (json.JSONDecodeError, UnicodeDecodeError, TimeoutError, Exception) as line_err:
                     if verbose:
                         print(f"  [Warn] Skipping line due to error: {line_err}")
@@ -157,9 +152,8 @@ def _fetch_analytics_stream(event_ids: list, time_gt: str, time_lt: str | None =
                         print(f"  Reached max_events limit ({max_events}). Stopping.")
                     break
 
-    except urllib.error.HTTPError as e:
-        detail = e.read().decode("utf-8") if hasattr(e, "read") else str(e)
-        raise RuntimeError(f"Analytics API HTTP {e.code}: {detail}") from e
+    except SwapcardAPIError as e:
+        raise RuntimeError(f"Analytics API HTTP {e.status_code}: {e.body or e}") from e
 
     return {
         "raw_count": count,
@@ -197,9 +191,8 @@ def get_event_analytics(
     cache_file = ANALYTICS_CACHE_DIR / f"{event_id}.json"
 
     # ── Cache read ──
-    if use_cache and cache_file.exists():
-        with open(cache_file, "r", encoding="utf-8") as f:
-            cached = json.load(f)
+    if use_cache and storage.exists(cache_file):
+        cached = storage.read_json(cache_file)
         fetched_at = datetime.fromisoformat(cached.get("fetched_at", "2000-01-01"))
         if datetime.utcnow() - fetched_at < timedelta(hours=6):
             if verbose:
@@ -258,8 +251,7 @@ def get_event_analytics(
     }
 
     # ── Cache write ──
-    with open(cache_file, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2)
+    storage.write_json(cache_file, result)
 
     if verbose:
         print(f"[analytics] Done. {raw['raw_count']} events → {leads_total} total leads")
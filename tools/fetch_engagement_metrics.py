@@ -21,17 +21,20 @@ Usage:
 """
 
 import os
+import sys
 import json
-import urllib.request
-import urllib.error
 from datetime import datetime, timedelta
 from pathlib import Path
 
-# ─── Constants ────────────────────────────────────────────────────────────────
+sys.path.append(str(Path(__file__).parent.parent))
+from tools.swapcard_client import stream_analytics, SwapcardAPIError
+from tools import compressed_storage as storage
 
-ANALYTICS_URL = "https://developer.swapcard.com/event-admin/export/analytics"
+# ─── Constants ────────────────────────────────────────────────────────────────
 
-ENGAGEMENT_CACHE_DIR = Path(__file__).parent.parent / "data" / "engagement"
+# Vercel only allows writes in /tmp; cache files are stored compressed (tools/compressed_storage.py)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+ENGAGEMENT_CACHE_DIR = DATA_DIR / "engagement"
 ENGAGEMENT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 # ─── Env Loading ──────────────────────────────────────────────────────────────
@@ -72,7 +75,7 @@ def _fetch_engagement_metrics_stream(event_id: str, time_gt: str, time_lt: str |
             "total_events": int
         }
     """
-    api_key = _get_api_key()
+    _get_api_key()  # fail fast if the key is missing
 
     payload = {
         "event_ids": [event_id],
@@ -81,14 +84,6 @@ def _fetch_engagement_metrics_stream(event_id: str, time_gt: str, time_lt: str |
     if time_lt:
         payload["time_lt"] = time_lt
 
-    req = urllib.request.Request(
-        ANALYTICS_URL,
-        data=json.dumps(payload).encode("utf-8"),
-        method="POST"
-    )
-    req.add_header("Authorization", api_key)
-    req.add_header("Content-Type", "application/json")
-
     # Track unique users for each engagement type
     unique_users_all = set()
     unique_users_connections = set()
@@ -99,13 +94,14 @@ def _fetch_engagement_metrics_stream(event_id: str, time_gt: str, time_lt: str |
     count = 0
 
     try:
-        with urllib.request.urlopen(req, timeout=300) as resp:
-            for raw_line in resp:
+        # Shared pool + rate limiter; long timeout for large historical datasets
+        with stream_analytics(payload, timeout=300) as resp:
+            for raw_line in resp.iter_lines():
                 try:
                     line = raw_line.strip()
                     if not line:
                         continue
-                    event_obj = json.loads(line.decode("utf-8"))
+                    event_obj = json.loads(line)
                 except (json.JSONDecodeError, UnicodeDecodeError, TimeoutError, Exception) as line_err:
                     if verbose:
                         print(f"  [Warn] Skipping line due to error: {line_err}")
@@ -142,9 +138,8 @@ def _fetch_engagement_metrics_stream(event_id: str, time_gt: str, time_lt: str |
                 if verbose and count % 25000 == 0:
                     print(f"  ... {count} events streamed, {len(unique_users_all)} unique users")
 
-    except urllib.error.HTTPError as e:
-        detail = e.read().decode("utf-8") if hasattr(e, "read") else str(e)
-        raise RuntimeError(f"Analytics API HTTP {e.code}: {detail}") from e
+    except SwapcardAPIError as e:
+        raise RuntimeError(f"Analytics API HTTP {e.status_code}: {e.body or e}") from e
 
     return {
         "stats_active_users": len(unique_users_all),
@@ -184,9 +179,8 @@ def get_event_engagement_metrics(
     cache_file = ENGAGEMENT_CACHE_DIR / f"{event_id}.json"
 
     # ── Cache read ──
-    if use_cache and cache_file.exists():
-        with open(cache_file, "r", encoding="utf-8") as f:
-            cached = json.load(f)
+    if use_cache and storage.exists(cache_file):
+        cached = storage.read_json(cache_file)
         synced_at = datetime.fromisoformat(cached.get("engagement_synced_at", "2000-01-01"))
         if datetime.utcnow() - synced_at < timedelta(hours=6):
             if verbose:
@@ -224,8 +218,7 @@ def get_event_engagement_metrics(
     }
 
     # ── Cache write ──
-    with open(cache_file, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2)
+    storage.write_json(cache_file, result)
 
     if verbose:
         print(f"[engagement] Done. {metrics['total_events']} events -> {metrics['stats_active_users']} active users")
@@ -1,7 +1,6 @@
 import os
-import json
-import urllib.request
-import urllib.error
+
+from tools.swapcard_client import post_graphql, SwapcardAPIError
 
 def load_env():
     env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -19,8 +18,7 @@ def get_event(event_id):
     api_key = os.environ.get('SWAPCARD_API_KEY')
     if not api_key:
         raise ValueError("Missing API key")
-        
-    url = 'https://developer.swapcard.com/event-admin/graphql'
+
     # Base query for event info
     query = """
     query GetEvent($eventId: ID!) {
@@ -32,18 +30,11 @@ def get_event(event_id):
     }
     """
     
-    data = json.dumps({'query': query, 'variables': {'eventId': event_id}}).encode('utf-8')
-    req = urllib.request.Request(url, data=data)
-    req.add_header('Authorization', str(api_key))
-    req.add_header('Content-Type', 'application/json')
-    req.add_header('Accept', 'application/json')
-    
     try:
-        response = urllib.request.urlopen(req)
-        return json.loads(response.read().decode('utf-8'))
-    except urllib.error.HTTPError as e:
-        print(f"HTTP Error: {e.code} - {e.reason}")
-        print(e.read().decode('utf-8'))
+        return post_graphql(query, {'eventId': event_id}, raise_errors=True)
+    except SwapcardAPIError as e:
+        print(f"HTTP Error: {e.status_code}")
+        print(e.body or e)
         return None
 
 if __name__ == '__main__':
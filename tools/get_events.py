@@ -1,7 +1,5 @@
 import os
 import json
-import urllib.request
-import urllib.error
 
 try:
     from dotenv import load_dotenv
@@ -11,17 +9,11 @@ except ImportError:
 
 import datetime
 
-def _fetch_all_raw_events():
-    """Internal helper to fetch all events from Swapcard API without any filtering."""
-    # load_env removed as it's now global
-    api_key = os.environ.get('SWAPCARD_API_KEY')
-    if not api_key:
-        raise ValueError("Missing API key")
-        
-    url = 'https://developer.swapcard.com/event-admin/graphql'
-    query = """
-    query GetEvents($page: Int!) {
-      events(page: $page, pageSize: 100) {
+from tools.swapcard_client import post_graphql
+from tools.pagination import iter_pages_parallel
+
+# Event fields the syncs store; shared by the paged list and single-event refetches
+EVENT_FIELDS = """
         id
         slug
         title
@@ -39,28 +31,37 @@ def _fetch_all_raw_events():
         address { city country }
         htmlDescription
         updatedAt
-      }
-    }
+"""
+
+def _iter_raw_event_pages():
+    """Internal helper that yields pages of events from Swapcard API without any filtering."""
+    # load_env removed as it's now global
+    api_key = os.environ.get('SWAPCARD_API_KEY')
+    if not api_key:
+        raise ValueError("Missing API key")
+
+    query = f"""
+    query GetEvents($page: Int!) {{
+      events(page: $page, pageSize: 100) {{
+        {EVENT_FIELDS}
+      }}
+    }}
     """
     
-    events_list = []
-    page = 1
-    while True:
-        data = json.dumps({'query': query, 'variables': {'page': page}}).encode('utf-8')
-        req = urllib.request.Request(url, data=data)
-        req.add_header('Authorization', str(api_key))
-        req.add_header('Content-Type', 'application/json')
-        
-        try:
-            response = urllib.request.urlopen(req)
-            raw_data = json.loads(response.read().decode('utf-8'))
-            batch = raw_data.get('data', {}).get('events', [])
-            if not batch: break
-            events_list.extend(batch)
-            page += 1
-            if page > 50: break
-        except Exception: break
-    return events_list
+    def fetch_page(page):
+        raw_data = post_graphql(query, {'page': page}, raise_errors=True)
+        if raw_data.get('errors') and not (raw_data.get('data') or {}).get('events'):
+            # Surface GraphQL errors so the page is retried instead of read as "last page"
+            raise RuntimeError(raw_data['errors'])
+        return (raw_data.get('data') or {}).get('events') or []
+
+    # Pages are fetched in a concurrent window; a failing page is retried and
+    # raises PaginationError rather than silently truncating the event list.
+    yield from iter_pages_parallel(fetch_page, max_pages=50, label="events")
+
+def _fetch_all_raw_events():
+    """Internal helper to fetch all events from Swapcard API without any filtering."""
+    return [ev for page in _iter_raw_event_pages() for ev in page]
 
 def get_raw_events():
     """Returns all events grouped by community for the settings page."""
@@ -84,11 +85,7 @@ def get_raw_events():
             })
     return sorted(list(communities.values()), key=lambda x: x["name"])
 
-def get_events(settings=None):
-    """Returns filtered events based on settings (dict) or default hardcoded rules."""
-    # load_env removed as it's now global
-    events_list = _fetch_all_raw_events()
-    
+def _resolve_settings(settings):
     # If settings not provided, try to load from local file (legacy)
     if settings is None:
         settings_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sync_settings.json')
@@ -97,41 +94,73 @@ def get_events(settings=None):
                 with open(settings_path, 'r') as f:
                     settings = json.load(f)
             except Exception: pass
+    return settings
+
+def _categorize(ev, settings, now):
+    """Returns "Active", "Future" or "Past" for an event, or None if settings filter it out."""
+    community_dict = ev.get('community') or {}
+    community_name = community_dict.get('name') or ''
+    ev_id = ev.get('id')
+
+    # 1. Custom settings check
+    if isinstance(settings, dict):
+        # If specific event is disabled, skip
+        if ev_id in settings.get('disabled_events', []): return None
+        # If entire community is disabled, skip
+        if community_name in settings.get('disabled_communities', []): return None
+    else:
+        # No settings yet, follow simple defaults (skip events without banners)
+        if not ev.get('banner') or not ev.get('banner').get('imageUrl'): return None
+
+    # Parse dates and categorize
+    begins_at = now + datetime.timedelta(days=365)
+    ends_at = now + datetime.timedelta(days=365)
+    try:
+        if ev.get('beginsAt'):
+            dt = datetime.datetime.fromisoformat(ev['beginsAt'].replace('Z', '+00:00'))
+            begins_at = dt.replace(tzinfo=datetime.timezone.utc) if dt.tzinfo is None else dt
+        if ev.get('endsAt'):
+            dt = datetime.datetime.fromisoformat(ev['endsAt'].replace('Z', '+00:00'))
+            ends_at = dt.replace(tzinfo=datetime.timezone.utc) if dt.tzinfo is None else dt
+    except Exception: pass
+
+    if now > ends_at: return "Past"
+    elif ev.get('isLive') or (begins_at <= now <= ends_at): return "Active"
+    else: return "Future"
+
+def fetch_event(event_id):
+    """Refetches one event with the same fields as the list (None if it no longer exists)."""
+    query = f"""
+    query GetEvent($eventId: ID!) {{
+      event(id: $eventId) {{
+        {EVENT_FIELDS}
+      }}
+    }}
+    """
+    raw_data = post_graphql(query, {'eventId': event_id}, raise_errors=True)
+    if raw_data.get('errors') and not (raw_data.get('data') or {}).get('event'):
+        raise RuntimeError(raw_data['errors'])
+    return (raw_data.get('data') or {}).get('event')
 
+def categorize_event(ev, settings=None):
+    """Category of a single event under the sync settings, or None if they filter it out."""
+    return _categorize(ev, _resolve_settings(settings), datetime.datetime.now(datetime.timezone.utc))
+
+def iter_events(settings=None):
+    """Yields pages of (category, event) pairs as they arrive, filtered like get_events."""
+    settings = _resolve_settings(settings)
     now = datetime.datetime.now(datetime.timezone.utc)
+    for page in _iter_raw_event_pages():
+        categorized = [(_categorize(ev, settings, now), ev) for ev in page]
+        yield [(cat, ev) for cat, ev in categorized if cat]
+
+def get_events(settings=None):
+    """Returns filtered events based on settings (dict) or default hardcoded rules."""
+    # load_env removed as it's now global
     filtered_events = {"Active": [], "Future": [], "Past": []}
-    
-    for ev in events_list:
-        community_dict = ev.get('community') or {}
-        community_name = community_dict.get('name') or ''
-        title = ev.get('title') or ''
-        ev_id = ev.get('id')
-
-        # 1. Custom settings check
-        if isinstance(settings, dict):
-            # If specific event is disabled, skip
-            if ev_id in settings.get('disabled_events', []): continue
-            # If entire community is disabled, skip
-            if community_name in settings.get('disabled_communities', []): continue
-        else:
-            # No settings yet, follow simple defaults (skip events without banners)
-            if not ev.get('banner') or not ev.get('banner').get('imageUrl'): continue
-
-        # Parse dates and categorize
-        begins_at = now + datetime.timedelta(days=365)
-        ends_at = now + datetime.timedelta(days=365)
-        try:
-            if ev.get('beginsAt'):
-                dt = datetime.datetime.fromisoformat(ev['beginsAt'].replace('Z', '+00:00'))
-                begins_at = dt.replace(tzinfo=datetime.timezone.utc) if dt.tzinfo is None else dt
-            if ev.get('endsAt'):
-                dt = datetime.datetime.fromisoformat(ev['endsAt'].replace('Z', '+00:00'))
-                ends_at = dt.replace(tzinfo=datetime.timezone.utc) if dt.tzinfo is None else dt
-        except Exception: pass
-            
-        if now > ends_at: filtered_events["Past"].append(ev)
-        elif ev.get('isLive') or (begins_at <= now <= ends_at): filtered_events["Active"].append(ev)
-        else: filtered_events["Future"].append(ev)
+    for page in iter_events(settings):
+        for category, ev in page:
+            filtered_events[category].append(ev)
             
     # Metrics
     total_events_count = sum(len(lst) for lst in filtered_events.values())
@@ -1,8 +1,20 @@
-import os, json, urllib.request, urllib.error, time
+import os, json
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from tools.get_events import get_events
+from tools.swapcard_client import post_graphql
+from tools.rate_limiter import swapcard_limiter
+from tools.pagination import iter_cursor_pages, iter_numbered_pages
+from tools.sync_watermarks import WatermarkStore, event_fingerprint, SYNC_INCREMENTAL
+from tools.sync_checkpoints import SyncCheckpoint
+from tools.state_files import update_json_file
+from tools.subpage_store import get_store, file_stamp, SUBPAGES_STORE, GLOBAL
+from tools.read_cache import subpage_cache
+from tools import compressed_storage as storage
+from tools import record_files
+from tools import sync_telemetry
 
 env_path = '.env'
 try:
@@ -13,8 +25,6 @@ try:
                 os.environ[k] = v
 except Exception: pass
 
-API_KEY = os.environ.get('SWAPCARD_API_KEY')
-URL = 'https://developer.swapcard.com/event-admin/graphql'
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 if os.environ.get("VERCEL") == "1":
     DATA_DIR = "/tmp/data"
@@ -28,269 +38,163 @@ if not os.path.exists(DATA_DIR):
 
 
 def query_graphql(query, variables):
-    req = urllib.request.Request(URL, data=json.dumps({'query': query, 'variables': variables}).encode('utf-8'))
-    req.add_header('Authorization', API_KEY)
-    req.add_header('Content-Type', 'application/json')
-    try:
-        resp = urllib.request.urlopen(req)
-        return json.loads(resp.read().decode('utf-8'))
-    except urllib.error.HTTPError as e:
-        print(f"HTTP Error: {e.read().decode()}")
-        return None
-    except Exception as e:
-        print(f"Error: {e}")
-        return None
-
-# ── Full ExhibitorsV2 Query ──────────────────────────────────────────────────
-EXHIBITORS_V2_QUERY = '''
-query ExhibitorsV2Query($communityId: ID!, $eventId: ID!, $cursor: CursorPaginationInput, $filter: CommunityExhibitorsFilterInput) {
-  exhibitorsV2(communityId: $communityId, cursor: $cursor, filter: $filter) {
+    # Goes through the shared keep-alive pool; returns None on HTTP/transport errors
+    return post_graphql(query, variables)
+
+# ── ExhibitorsV2 Field Profiles ─────────────────────────────────────────────
+# One field specification drives every ExhibitorsV2 query. Each entry carries the
+# smallest profile that needs it; profiles are cumulative:
+#   list   → exhibitor table columns (identity, logo, type, industry/booth, lead totals)
+#   leads  → list + every withEvent.leads counter, member totals and group (stats)
+#   detail → leads + what the exhibitor detail modal renders (members, documents,
+#            features, all custom fields); this is what the sync stores as `data`
+#   full   → everything the API exposes, including editable/limit/link metadata
+#            and the withEvent duplicates of fields, documents and members
+EXHIBITOR_PROFILES = ('list', 'leads', 'detail', 'full')
+L, E, D, F = EXHIBITOR_PROFILES
+
+
+def _definition(name_tier, *extra):
+    """Custom-field `definition` block; `name` may be needed earlier than the rest."""
+    return (name_tier, 'definition', [(D, 'id'), (name_tier, 'name'), (D, 'isDefault'), (D, 'isEditable'),
+                                      (D, 'isSearchable'), (D, 'placeholder')] + [(D, x) for x in extra])
+
+
+def _member_spec(tier, roles):
+    return [(tier, f) for f in (
+        'firstName', 'lastName', 'email', 'id', 'jobTitle', 'organization', 'photoUrl', 'userId', 'websiteUrl',
+        'biography', 'addresses { city country place state street zipCode }',
+        'phoneNumbers { countryCode formattedNumber label number type }', 'socialNetworks { profile type }',
+    )] + [(tier, 'roles', roles)]
+
+
+EXHIBITORS_V2_FIELD_SPEC = [
+    (L, 'id'), (L, 'name'), (L, 'email'), (F, 'clientIds'), (D, 'description'), (D, 'htmlDescription'),
+    (L, 'logoUrl'), (L, 'websiteUrl'), (D, 'backgroundImageUrl'), (L, 'createdAt'), (L, 'updatedAt'),
+    (L, 'totalMembers'), (L, 'type'),
+    (L, 'address', [(L, 'city'), (L, 'country'), (D, 'place'), (D, 'state'), (D, 'street'), (D, 'zipCode')]),
+    (D, 'banner', [(D, 'imageUrl')]),
+    (D, 'phoneNumbers', [(D, 'countryCode'), (D, 'formattedNumber'), (D, 'label'), (D, 'number'), (D, 'type')]),
+    (D, 'socialNetworks', [(D, 'profile'), (D, 'type')]),
+    (L, 'typeLabel', [(L, 'color'), (L, 'elements'), (L, 'id'), (L, 'name'), (L, 'position'), (L, 'value')]),
+    (D, 'features', [(D, f) for f in (
+        'inviteMembers', 'scanBadge', 'scanBadgeOneWay', 'qrCodeAccess', 'qualifyLeads', 'teamConnections',
+        'recommendedLeads', 'canViewVisits', 'canExportContacts', 'canExportMeetingsConfirmed', 'canExportChats',
+        'canExportExhibitorPages', 'canExportExhibitorItems', 'canExportAdvertisements', 'canExportRegistrations',
+        'canExportSessionScanning', 'canExportWatchedExhibitorPlannings', 'canExportDocuments', 'generateApiKey')]),
+    # Company Industry / Booth Location / Type are select or text fields, so the
+    # list profile keeps those fragments with just `definition { name }`.
+    (L, 'fields', [
+        (D, '... on NumberField', [(D, 'id'), (D, 'numberValue: value'), _definition(D)]),
+        (D, '... on UrlField', [(D, 'id'), (D, 'urlValue: value'), _definition(D)]),
+        (L, '... on TextField', [(L, 'id'), (L, 'textValue: value'), _definition(L, 'maxCharacters')]),
+        (D, '... on LongTextField', [(D, 'id'), (D, 'longTextValue: value'), _definition(D, 'maxCharacters')]),
+        (L, '... on SelectField', [(L, 'id'), (L, 'selectValue: value'), (D, 'usage'), (D, 'translations { value }'),
+                                   _definition(L)]),
+        (L, '... on MultipleSelectField', [(L, 'id'), (L, 'multipleSelectValue: value'), (D, 'usage'),
+                                           (D, 'translations { value }'), _definition(L, 'maxChoices')]),
+        (D, '... on MultipleTextField', [(D, 'id'), (D, 'multipleTextValue: value'),
+                                         _definition(D, 'maxCharacters', 'maxChoices')]),
+        (D, '... on DateField', [(D, 'id'), (D, 'dateValue: value'), _definition(D)]),
+        (D, '... on MediaField', [(D, 'id'), (D, 'mediaValue: value'), (D, 'fileName'), _definition(D)]),
+        (D, '... on TreeField', [(D, 'id'), (D, 'treeValue: value { path value }'), (D, 'translations { value }'),
+                                 _definition(D, 'maxChoices')]),
+    ]),
+    (D, 'members(page: 1, pageSize: 10)', _member_spec(D, [
+        (D, 'id'), (D, 'name'), (F, 'description'), (F, 'isDefault'), (F, 'translations { name }'),
+        (F, 'permissions { id description }')])),
+    (D, 'documents', [(D, f) for f in (
+        'id', 'name', 'description', 'url', 'embeddedUrl', 'clientId', 'totalExhibitors', 'totalPlannings')]),
+    (F, 'editableFields', [(F, f) for f in (
+        'name', 'address', 'logoUrl', 'description', 'categories', 'websiteUrl', 'type', 'socialNetworks',
+        'phoneNumbers', 'booth', 'email', 'bannerImage', 'bannerVideo', 'backgroundImage', 'advertisements')]),
+    (F, 'categoryLimits', [(F, 'limit'), (F, 'category { id name imageUrl translations { name } }')]),
+    (F, 'linkedExhibitors', [(F, 'link { id childName parentName translations { childName parentName } }')]),
+    (L, 'withEvent(eventId: $eventId)', [
+        (L, 'totalMembers'),
+        (L, 'booths', [(L, 'id'), (L, 'name'), (F, 'capacity'), (F, 'category'), (F, 'clientId'), (F, 'isVirtual'),
+                       (F, 'isBooth'), (F, 'externalUrl'), (F, 'totalMeetings')]),
+        (F, 'categoryLimits { limit category { id name imageUrl } }'),
+        (F, 'documents { id name description url embeddedUrl clientId totalExhibitors totalPlannings }'),
+        (F, 'fields', [(F, x) for x in (
+            '... on NumberField { id numberValue: value }',
+            '... on UrlField { id urlValue: value }',
+            '... on TextField { id textValue: value }',
+            '... on LongTextField { id longTextValue: value }',
+            '... on SelectField { id selectValue: value usage }',
+            '... on MultipleSelectField { id multipleSelectValue: value usage }',
+            '... on MultipleTextField { id multipleTextValue: value }',
+            '... on DateField { id dateValue: value }',
+            '... on MediaField { id mediaValue: value fileName }',
+            '... on TreeField { id treeValue: value { path value } }')]),
+        (F, 'linkedExhibitors { link { id childName parentName } }'),
+        (F, 'members(page: 1, pageSize: 10)', _member_spec(F, [(F, 'id'), (F, 'name'), (F, 'description'),
+                                                               (F, 'isDefault')])),
+        (E, 'group', [(E, f) for f in (
+            'id', 'name', 'isDefault', 'exhibitorCount', 'peopleCount', 'priority', 'announcementMessage')]),
+        (L, 'leads', [(L, 'contacts { totalCount }'), (L, 'meetings { totalCount }'), (E, 'chats { totalCount }'),
+                      (E, 'documents { totalCount }'), (L, 'products { totalCount }'),
+                      (E, 'advertisementViews { totalCount }'), (E, 'advertisementOpen { totalCount }'),
+                      (E, 'planningBookmarks { totalCount }'), (L, 'views { totalCount }'),
+                      (L, 'scans { totalCount }'), (L, 'bookmarks { totalCount }')]),
+    ]),
+]
+
+
+def _render_selection(spec, tier, indent):
+    lines = []
+    pad = '  ' * indent
+    for item in spec:
+        if EXHIBITOR_PROFILES.index(item[0]) > tier:
+            continue
+        if len(item) == 2:
+            lines.append(pad + item[1])
+            continue
+        inner = _render_selection(item[2], tier, indent + 1)
+        if inner:
+            lines.append(pad + item[1] + ' {')
+            lines.extend(inner)
+            lines.append(pad + '}')
+    return lines
+
+
+def build_exhibitors_v2_query(profile='full'):
+    """Renders the ExhibitorsV2 query for one of EXHIBITOR_PROFILES."""
+    if profile not in EXHIBITOR_PROFILES:
+        raise ValueError(f"Unknown exhibitor profile '{profile}', expected one of {EXHIBITOR_PROFILES}")
+    tier = EXHIBITOR_PROFILES.index(profile)
+    node_lines = '\n'.join(_render_selection(EXHIBITORS_V2_FIELD_SPEC, tier, 3))
+    return f'''
+query ExhibitorsV2Query($communityId: ID!, $eventId: ID!, $cursor: CursorPaginationInput, $filter: CommunityExhibitorsFilterInput) {{
+  exhibitorsV2(communityId: $communityId, cursor: $cursor, filter: $filter) {{
     totalCount
-    pageInfo {
+    pageInfo {{
       hasNextPage
       endCursor
-    }
-    nodes {
-      id
-      name
-      email
-      clientIds
-      description
-      htmlDescription
-      logoUrl
-      websiteUrl
-      backgroundImageUrl
-      createdAt
-      updatedAt
-      totalMembers
-      type
-      address {
-        city
-        country
-        place
-        state
-        street
-        zipCode
-      }
-      banner {
-        imageUrl
-      }
-      phoneNumbers {
-        countryCode
-        formattedNumber
-        label
-        number
-        type
-      }
-      socialNetworks {
-        profile
-        type
-      }
-      typeLabel {
-        color
-        elements
-        id
-        name
-        position
-        value
-      }
-      features {
-        inviteMembers
-        scanBadge
-        scanBadgeOneWay
-        qrCodeAccess
-        qualifyLeads
-        teamConnections
-        recommendedLeads
-        canViewVisits
-        canExportContacts
-        canExportMeetingsConfirmed
-        canExportChats
-        canExportExhibitorPages
-        canExportExhibitorItems
-        canExportAdvertisements
-        canExportRegistrations
-        canExportSessionScanning
-        canExportWatchedExhibitorPlannings
-        canExportDocuments
-        generateApiKey
-      }
-      fields {
-        ... on NumberField {
-          id
-          numberValue: value
-          definition { id name isDefault isEditable isSearchable placeholder }
-        }
-        ... on UrlField {
-          id
-          urlValue: value
-          definition { id name isDefault isEditable isSearchable placeholder }
-        }
-        ... on TextField {
-          id
-          textValue: value
-          definition { id name isDefault isEditable isSearchable placeholder maxCharacters }
-        }
-        ... on LongTextField {
-          id
-          longTextValue: value
-          definition { id name isDefault isEditable isSearchable placeholder maxCharacters }
-        }
-        ... on SelectField {
-          id
-          selectValue: value
-          usage
-          translations { value }
-          definition { id name isDefault isEditable isSearchable placeholder }
-        }
-        ... on MultipleSelectField {
-          id
-          multipleSelectValue: value
-          usage
-          translations { value }
-          definition { id name isDefault isEditable isSearchable placeholder maxChoices }
-        }
-        ... on MultipleTextField {
-          id
-          multipleTextValue: value
-          definition { id name isDefault isEditable isSearchable placeholder maxCharacters maxChoices }
-        }
-        ... on DateField {
-          id
-          dateValue: value
-          definition { id name isDefault isEditable isSearchable placeholder }
-        }
-        ... on MediaField {
-          id
-          mediaValue: value
-          fileName
-          definition { id name isDefault isEditable isSearchable placeholder }
-        }
-        ... on TreeField {
-          id
-          treeValue: value { path value }
-          translations { value }
-          definition { id name isDefault isEditable isSearchable placeholder maxChoices }
-        }
-      }
-      members(page: 1, pageSize: 10) {
-        firstName
-        lastName
-        email
-        id
-        jobTitle
-        organization
-        photoUrl
-        userId
-        websiteUrl
-        biography
-        addresses { city country place state street zipCode }
-        phoneNumbers { countryCode formattedNumber label number type }
-        socialNetworks { profile type }
-        roles { id name description isDefault translations { name } permissions { id description } }
-      }
-      documents {
-        id
-        name
-        description
-        url
-        embeddedUrl
-        clientId
-        totalExhibitors
-        totalPlannings
-      }
-      editableFields {
-        name
-        address
-        logoUrl
-        description
-        categories
-        websiteUrl
-        type
-        socialNetworks
-        phoneNumbers
-        booth
-        email
-        bannerImage
-        bannerVideo
-        backgroundImage
-        advertisements
-      }
-      categoryLimits {
-        limit
-        category { id name imageUrl translations { name } }
-      }
-      linkedExhibitors {
-        link { id childName parentName translations { childName parentName } }
-      }
-      withEvent(eventId: $eventId) {
-        totalMembers
-        booths { id name capacity category clientId isVirtual isBooth externalUrl totalMeetings }
-        categoryLimits { limit category { id name imageUrl } }
-        documents { id name description url embeddedUrl clientId totalExhibitors totalPlannings }
-        fields {
-          ... on NumberField { id numberValue: value }
-          ... on UrlField { id urlValue: value }
-          ... on TextField { id textValue: value }
-          ... on LongTextField { id longTextValue: value }
-          ... on SelectField { id selectValue: value usage }
-          ... on MultipleSelectField { id multipleSelectValue: value usage }
-          ... on MultipleTextField { id multipleTextValue: value }
-          ... on DateField { id dateValue: value }
-          ... on MediaField { id mediaValue: value fileName }
-          ... on TreeField { id treeValue: value { path value } }
-        }
-        linkedExhibitors { link { id childName parentName } }
-        members(page: 1, pageSize: 10) {
-          firstName
-          lastName
-          email
-          id
-          jobTitle
-          organization
-          photoUrl
-          userId
-          websiteUrl
-          biography
-          addresses { city country place state street zipCode }
-          phoneNumbers { countryCode formattedNumber label number type }
-          socialNetworks { profile type }
-          roles { id name description isDefault }
-        }
-        group {
-          id
-          name
-          isDefault
-          exhibitorCount
-          peopleCount
-          priority
-          announcementMessage
-        }
-        leads {
-          contacts { totalCount }
-          meetings { totalCount }
-          chats { totalCount }
-          documents { totalCount }
-          products { totalCount }
-          advertisementViews { totalCount }
-          advertisementOpen { totalCount }
-          planningBookmarks { totalCount }
-          views { totalCount }
-          scans { totalCount }
-          bookmarks { totalCount }
-        }
-      }
-    }
-  }
-}
+    }}
+    nodes {{
+{node_lines}
+    }}
+  }}
+}}
 '''
 
-def fetch_exhibitors_v2(community_id, event_id, filter_event_ids=None):
-    """Fetch full exhibitor data using the exhibitorsV2 query with cursor pagination.
+
+EXHIBITORS_V2_QUERIES = {p: build_exhibitors_v2_query(p) for p in EXHIBITOR_PROFILES}
+EXHIBITORS_V2_QUERY = EXHIBITORS_V2_QUERIES['full']
+
+# The sync stores each record as the `data` JSONB the exhibitor modal renders,
+# so it needs `detail`; override with SUBPAGES_EXHIBITOR_PROFILE.
+EXHIBITORS_SYNC_PROFILE = os.environ.get('SUBPAGES_EXHIBITOR_PROFILE', 'detail')
+
+def fetch_exhibitors_v2(community_id, event_id, filter_event_ids=None, profile=None):
+    """Fetch exhibitor data using the exhibitorsV2 query with cursor pagination.
 
     Args:
         filter_event_ids: Optional list of event IDs to scope exhibitors to specific events.
+        profile: One of EXHIBITOR_PROFILES (default: EXHIBITORS_SYNC_PROFILE).
     """
+    query = EXHIBITORS_V2_QUERIES[profile or EXHIBITORS_SYNC_PROFILE]
     all_nodes = []
     cursor_after = None
     page_size = 50
@@ -308,12 +212,13 @@ def fetch_exhibitors_v2(community_id, event_id, filter_event_ids=None):
         if cursor_after:
             variables['cursor']['after'] = cursor_after
 
-        result = query_graphql(EXHIBITORS_V2_QUERY, variables)
+        result = query_graphql(query, variables)
         if not result or 'data' not in result or not result['data'].get('exhibitorsV2'):
             if result and 'errors' in result:
                 print(f"  GraphQL errors on page {page_num}: {result['errors']}, retrying...")
-                time.sleep(2)
-                result = query_graphql(EXHIBITORS_V2_QUERY, variables)
+                # Back off through the shared limiter so concurrent workers slow down too
+                swapcard_limiter.throttle(2)
+                result = query_graphql(query, variables)
                 if not result or 'data' not in result or not result['data'].get('exhibitorsV2'):
                     print(f"  Retry failed on page {page_num}, stopping.")
                     break
@@ -330,7 +235,6 @@ def fetch_exhibitors_v2(community_id, event_id, filter_event_ids=None):
 
         if page_info.get('hasNextPage') and page_info.get('endCursor'):
             cursor_after = page_info['endCursor']
-            time.sleep(0.5)  # Rate limit protection
         else:
             break
 
@@ -338,161 +242,615 @@ def fetch_exhibitors_v2(community_id, event_id, filter_event_ids=None):
     return all_nodes
 
 
-def fetch_for_event(event_id, community_id=None):
-    # Fetch Data for a single event
+# ── Per-event resource selections ───────────────────────────────────────────
+# Shared by the one-request-per-resource path and the aliased batch documents.
+EXHIBITORS_BASIC_FIELDS = 'id name logoUrl backgroundImageUrl description htmlDescription email websiteUrl type typeLabel { name } totalMembers'
+PLANNINGS_FIELDS = 'id title type format beginsAt endsAt'
+SPONSORS_SELECTION = '... on Sponsor { id name category type externalUrl logoUrl }'
+PEOPLE_FIELDS = 'id firstName lastName jobTitle organization email type photoUrl address { city country }'
+PEOPLE_CONNECTION = f'pageInfo {{ hasNextPage endCursor }} nodes {{ {PEOPLE_FIELDS} }}'
 
+# People (cursor) and plannings (page number) are paged past the first 100 so
+# large events are not truncated; pages are streamed to disk as they arrive.
+PEOPLE_PAGE_SIZE = int(os.environ.get('SUBPAGES_PEOPLE_PAGE_SIZE', 100))
+PLANNINGS_PAGE_SIZE = int(os.environ.get('SUBPAGES_PLANNINGS_PAGE_SIZE', 100))
 
-    res = {
-        'eventId': event_id,
-        'exhibitors': [],
-        'plannings': [],
-        'sponsors': [],
-        'people': []
-    }
+# Batched mode folds plannings, sponsors, people and the fallback exhibitors
+# query for several events into one aliased GraphQL document.
+SUBPAGES_BATCH_MODE = os.environ.get('SUBPAGES_BATCH_MODE', '1') == '1'
+SUBPAGES_BATCH_EVENTS = int(os.environ.get('SUBPAGES_BATCH_EVENTS', 5))
 
-    # Exhibitors — use V2 if community mapping exists, else fallback to basic query
-    if community_id:
-        res['exhibitors'] = fetch_exhibitors_v2(community_id, event_id)
-    
-    # Fallback to basic if V2 produced nothing or no communityId
-    if not res['exhibitors']:
-        exhibitors_query = '''
-        query GetExh($eventId: String!) { exhibitors(eventId: $eventId, page: 1, pageSize: 100) { id name logoUrl backgroundImageUrl description htmlDescription email websiteUrl type typeLabel { name } totalMembers } }
+# `plannings` has been seen both as a plain list and as a connection with `nodes`.
+# The first shape that answers without errors is remembered for the process.
+_plannings_shape = None
+_plannings_shape_lock = threading.Lock()
+
+
+def _plannings_selection(shape):
+    return PLANNINGS_FIELDS if shape == 'list' else f'nodes {{ {PLANNINGS_FIELDS} }}'
+
+
+def _extract_plannings(value):
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        return value.get('nodes') or []
+    return []
+
+
+def _resolve_plannings_shape(event_id):
+    """
+    Probes the plannings query shape once and caches it. Returns (shape, plannings):
+    the probe's first page of `event_id`'s plannings when this call probed, else None.
+    The probe runs outside the lock, so concurrent batches never queue behind it
+    (at worst two threads probe at once and agree on the shape).
+    """
+    global _plannings_shape
+    with _plannings_shape_lock:
+        if _plannings_shape:
+            return _plannings_shape, None
+    for shape in ('list', 'conn'):
+        query = f'''
+        query GetPla($eventId: String!, $pageSize: Int!) {{ plannings(eventId: $eventId, page: 1, pageSize: $pageSize) {{ {_plannings_selection(shape)} }} }}
+        '''
+        data = query_graphql(query, {'eventId': event_id, 'pageSize': PLANNINGS_PAGE_SIZE})
+        if data and 'data' in data and not data.get('errors'):
+            with _plannings_shape_lock:
+                if not _plannings_shape:
+                    _plannings_shape = shape
+                    print(f"  [Subpages] plannings query shape resolved: {shape}")
+            return shape, _extract_plannings((data['data'] or {}).get('plannings'))
+    return None, []
+
+
+def _fetch_event_resources(event_id, include_exhibitors, plannings=None):
+    """
+    One request per resource (legacy path, also the fallback for failed batches).
+    `plannings` is a first page already fetched (by the shape probe).
+    """
+    res = {'exhibitors': [], 'plannings': [], 'sponsors': [], 'people': []}
+
+    if include_exhibitors:
+        exhibitors_query = f'''
+        query GetExh($eventId: String!) {{ exhibitors(eventId: $eventId, page: 1, pageSize: 100) {{ {EXHIBITORS_BASIC_FIELDS} }} }}
         '''
         exh_data = query_graphql(exhibitors_query, {'eventId': event_id})
         if exh_data and 'data' in exh_data and exh_data['data'].get('exhibitors'):
             res['exhibitors'] = exh_data['data']['exhibitors']
 
-    # Plannings
-    plannings_query_list = '''
-    query GetPla($eventId: String!) { plannings(eventId: $eventId, page: 1, pageSize: 100) { id title type format beginsAt endsAt } }
-    '''
-    plannings_query_conn = '''
-    query GetPla($eventId: String!) { plannings(eventId: $eventId, page: 1, pageSize: 100) { nodes { id title type format beginsAt endsAt } } }
-    '''
-    pla_data = query_graphql(plannings_query_list, {'eventId': event_id})
-    if pla_data and 'data' in pla_data and pla_data['data'].get('plannings'):
-        res['plannings'] = pla_data['data']['plannings']
-    else:
-        pla_data2 = query_graphql(plannings_query_conn, {'eventId': event_id})
-        if pla_data2 and 'data' in pla_data2 and pla_data2['data'].get('plannings') and 'nodes' in pla_data2['data']['plannings']:
-            res['plannings'] = pla_data2['data']['plannings']['nodes']
+    # Plannings (first page; the rest is streamed by iter_event_plannings)
+    shape, probed = (None, plannings) if plannings is not None else _resolve_plannings_shape(event_id)
+    if probed is not None:
+        res['plannings'] = probed
+    elif shape:
+        try:
+            res['plannings'] = _fetch_plannings_page(event_id, 1, shape)
+        except RuntimeError as e:
+            print(f"  [Subpages] plannings page 1 failed for {event_id}: {e}")
 
     # Sponsors
-    sponsors_query = '''
-    query GetSpo($eventId: String!) {
-      sponsors(eventId: $eventId) {
-        ... on Sponsor { id name category type externalUrl logoUrl }
-      }
-    }
+    sponsors_query = f'''
+    query GetSpo($eventId: String!) {{
+      sponsors(eventId: $eventId) {{
+        {SPONSORS_SELECTION}
+      }}
+    }}
     '''
     spo_data = query_graphql(sponsors_query, {'eventId': event_id})
     if spo_data and 'data' in spo_data and spo_data['data'].get('sponsors'):
         res['sponsors'] = spo_data['data']['sponsors']
 
-    # People (using eventPerson nodes)
-    people_query = '''
-    query GetPeo($eventId: ID!) { eventPerson(eventId: $eventId, cursor: { first: 100 }) { nodes { id firstName lastName jobTitle organization email type photoUrl address { city country } } } }
-    '''
-    peo_data = query_graphql(people_query, {'eventId': event_id})
-    if peo_data and 'data' in peo_data and peo_data['data'].get('eventPerson') and 'nodes' in peo_data['data']['eventPerson']:
-        res['people'] = peo_data['data']['eventPerson']['nodes']
+    # People (first page using eventPerson nodes; the rest is streamed by iter_event_people)
+    try:
+        res['people'], res['people_page_info'] = _fetch_people_page(event_id, None)
+    except RuntimeError as e:
+        print(f"  [Subpages] people page 1 failed for {event_id}: {e}")
 
     return res
 
+
+# ── Streaming people / plannings pagination ─────────────────────────────────
+
+def _fetch_people_page(event_id, after):
+    query = f'''
+    query GetPeo($eventId: ID!, $first: Int!, $after: String) {{ eventPerson(eventId: $eventId, cursor: {{ first: $first, after: $after }}) {{ {PEOPLE_CONNECTION} }} }}
+    '''
+    result = query_graphql(query, {'eventId': event_id, 'first': PEOPLE_PAGE_SIZE, 'after': after})
+    if not result or not (result.get('data') or {}).get('eventPerson'):
+        raise RuntimeError((result or {}).get('errors') or 'no eventPerson data')
+    conn = result['data']['eventPerson']
+    return conn.get('nodes') or [], conn.get('pageInfo') or {}
+
+
+def _fetch_plannings_page(event_id, page, shape=None):
+    shape = shape or _resolve_plannings_shape(event_id)[0] or 'list'
+    query = f'''
+    query GetPla($eventId: String!, $page: Int!, $pageSize: Int!) {{ plannings(eventId: $eventId, page: $page, pageSize: $pageSize) {{ {_plannings_selection(shape)} }} }}
+    '''
+    result = query_graphql(query, {'eventId': event_id, 'page': page, 'pageSize': PLANNINGS_PAGE_SIZE})
+    if not result or 'data' not in result or (result.get('errors') and not (result['data'] or {}).get('plannings')):
+        raise RuntimeError((result or {}).get('errors') or 'no plannings data')
+    return _extract_plannings((result['data'] or {}).get('plannings'))
+
+
+def iter_event_people(event_id, after=None):
+    """Yields pages of eventPerson nodes for one event (cursor pagination)."""
+    return iter_cursor_pages(lambda cursor: _fetch_people_page(event_id, cursor), after=after,
+                             label=f"people {event_id}")
+
+
+def iter_event_plannings(event_id, start_page=1):
+    """Yields pages of plannings for one event (page-number pagination)."""
+    return iter_numbered_pages(lambda page: _fetch_plannings_page(event_id, page), start_page=start_page,
+                               page_size=PLANNINGS_PAGE_SIZE, label=f"plannings {event_id}")
+
+
+def _stream_people(event_id, first_nodes, page_info):
+    if first_nodes:
+        yield first_nodes
+    if (page_info or {}).get('hasNextPage') and page_info.get('endCursor'):
+        yield from iter_event_people(event_id, after=page_info['endCursor'])
+
+
+def _stream_plannings(event_id, first_page):
+    if first_page:
+        yield first_page
+    if len(first_page or []) >= PLANNINGS_PAGE_SIZE:
+        yield from iter_event_plannings(event_id, start_page=2)
+
+
+def _build_batch_document(entries, plannings_shape, known_plannings=()):
+    """
+    Builds one aliased query for [(event_id, include_exhibitors), ...].
+    Aliases are `e<i>_<resource>` so results can be routed back per event.
+    Plannings are not selected for events in `known_plannings`.
+    """
+    var_defs, selections, variables = [], [], {}
+    for i, (event_id, include_exhibitors) in enumerate(entries):
+        # exhibitors/plannings/sponsors take `String!`, eventPerson takes `ID!`
+        var_defs += [f'$s{i}: String!', f'$i{i}: ID!']
+        variables[f's{i}'] = event_id
+        variables[f'i{i}'] = event_id
+        if include_exhibitors:
+            selections.append(f'e{i}_exhibitors: exhibitors(eventId: $s{i}, page: 1, pageSize: 100) {{ {EXHIBITORS_BASIC_FIELDS} }}')
+        if event_id not in known_plannings:
+            selections.append(f'e{i}_plannings: plannings(eventId: $s{i}, page: 1, pageSize: {PLANNINGS_PAGE_SIZE}) {{ {_plannings_selection(plannings_shape)} }}')
+        selections.append(f'e{i}_sponsors: sponsors(eventId: $s{i}) {{ {SPONSORS_SELECTION} }}')
+        selections.append(f'e{i}_people: eventPerson(eventId: $i{i}, cursor: {{ first: {PEOPLE_PAGE_SIZE} }}) {{ {PEOPLE_CONNECTION} }}')
+    query = 'query SubpagesBatch(' + ', '.join(var_defs) + ') {\n  ' + '\n  '.join(selections) + '\n}'
+    return query, variables
+
+
+def _fetch_resources_batched(entries):
+    """
+    Fetches plannings/sponsors/people (+ fallback exhibitors) for several events in a
+    single aliased request. Returns {event_id: resources}. Events whose batch fails
+    outright fall back to one request per resource.
+    """
+    if not entries:
+        return {}
+    # The probe's first page of plannings (when this call probed) is kept, not refetched
+    shape, probed = _resolve_plannings_shape(entries[0][0])
+    known = {entries[0][0]: probed} if probed is not None else {}
+    if not shape:
+        return {eid: _fetch_event_resources(eid, inc) for eid, inc in entries}
+
+    query, variables = _build_batch_document(entries, shape, known)
+    result = query_graphql(query, variables)
+    data = (result or {}).get('data')
+    if not data:
+        # Whole-document failure (transport or validation): degrade to the per-resource path
+        if result and result.get('errors'):
+            print(f"  [Subpages] Batch query failed, falling back per event: {result['errors'][:1]}")
+        return {eid: _fetch_event_resources(eid, inc, known.get(eid)) for eid, inc in entries}
+    if result.get('errors'):
+        print(f"  [Subpages] Batch query returned partial errors: {result['errors'][:1]}")
+
+    out = {}
+    for i, (event_id, include_exhibitors) in enumerate(entries):
+        people = data.get(f'e{i}_people') or {}
+        out[event_id] = {
+            'exhibitors': (data.get(f'e{i}_exhibitors') or []) if include_exhibitors else [],
+            'plannings': known[event_id] if event_id in known else _extract_plannings(data.get(f'e{i}_plannings')),
+            'sponsors': data.get(f'e{i}_sponsors') or [],
+            'people': people.get('nodes') or [],
+            'people_page_info': people.get('pageInfo') or {},
+        }
+    return out
+
+
+def fetch_for_events(events, batched=None, stream=False):
+    """
+    Fetch subpage data for several events: V2 exhibitors per event (cursor-paginated),
+    then everything else in one aliased request per chunk of SUBPAGES_BATCH_EVENTS.
+
+    Args:
+        events: list of (event_id, community_id) tuples.
+        stream: If True, 'people' and 'plannings' are generators of pages that fetch
+                the remaining pages lazily; otherwise they are fully materialized lists.
+    """
+    if batched is None:
+        batched = SUBPAGES_BATCH_MODE
+
+    results = {}
+    for event_id, community_id in events:
+        with sync_telemetry.event(event_id):
+            results[event_id] = {
+                'eventId': event_id,
+                'exhibitors': fetch_exhibitors_v2(community_id, event_id) if community_id else [],
+                'plannings': [],
+                'sponsors': [],
+                'people': []
+            }
+
+    # Fallback to basic exhibitors query if V2 produced nothing or no communityId
+    entries = [(eid, not res['exhibitors']) for eid, res in results.items()]
+    if batched:
+        for start in range(0, len(entries), SUBPAGES_BATCH_EVENTS):
+            chunk = entries[start:start + SUBPAGES_BATCH_EVENTS]
+            for eid, resources in _fetch_resources_batched(chunk).items():
+                _merge_resources(results[eid], resources)
+    else:
+        for eid, include_exhibitors in entries:
+            _merge_resources(results[eid], _fetch_event_resources(eid, include_exhibitors))
+
+    if not stream:
+        for res in results.values():
+            res['people'] = [p for page in res['people'] for p in page]
+            res['plannings'] = [p for page in res['plannings'] for p in page]
+    return [results[eid] for eid, _ in events]
+
+
+def _merge_resources(res, resources):
+    eid = res['eventId']
+    res['sponsors'] = resources.get('sponsors') or []
+    res['people'] = _stream_people(eid, resources.get('people') or [], resources.get('people_page_info'))
+    res['plannings'] = _stream_plannings(eid, resources.get('plannings') or [])
+    if resources.get('exhibitors'):
+        res['exhibitors'] = resources['exhibitors']
+
+
+def write_records_file(path, pages):
+    """
+    Writes records page by page as offset-indexed NDJSON (tools/record_files.py)
+    and returns the record count. The file is replaced atomically once complete.
+    """
+    return record_files.write_records(path, pages)
+
+
+def iter_records_file(path):
+    """Yields records from a subpage file one at a time, without loading it whole."""
+    return record_files.iter_records(path)
+
+
+def fetch_for_event(event_id, community_id=None, batched=None):
+    # Fetch Data for a single event
+    return fetch_for_events([(event_id, community_id)], batched=batched)[0]
+
+def _read_subpages_stats():
+    """Parsed stats manifest, cached until the file changes (shared: copy before mutating)."""
+    stats_path = os.path.join(DATA_DIR, 'subpages_stats.json')
+    stamp = file_stamp(stats_path)
+
+    def load():
+        with open(stats_path, 'r', encoding='utf-8') as f:
+            return json.load(f), stamp[0]
+    return subpage_cache.get_or_load(('stats',), stamp, load) if stamp else {}
+
+
+def load_subpages_stats():
+    """Loads the per-event stats manifest (data/subpages_stats.json)."""
+    try:
+        return dict(_read_subpages_stats())
+    except Exception:
+        return {}
+
+
+def save_subpages_stats(global_stats):
+    with open(os.path.join(DATA_DIR, 'subpages_stats.json'), 'w', encoding='utf-8') as f:
+        json.dump(global_stats, f, indent=2)
+
+
+def update_subpages_stats(updates):
+    """Replaces the stats of the given events only, keeping what other sync workers saved meanwhile."""
+    def apply(global_stats):
+        global_stats.update(updates)
+    return update_json_file(os.path.join(DATA_DIR, 'subpages_stats.json'), apply, indent=2)
+
+
+def plan_event_subpages(ev, category, watermarks, force_refresh=False):
+    """
+    Decides whether one event's subpages must be fetched or the files on disk reused.
+
+    Returns (fetch, fingerprint); fingerprint is None for Past events, which are
+    reused whenever their folder exists.
+    """
+    ev_dir = os.path.join(DATA_DIR, 'subpages', ev['id'].replace('=', ''))  # Remove = for cleaner paths
+    if category == 'Past':
+        return force_refresh or not os.path.exists(ev_dir), None
+
+    # Future events whose watermark (updatedAt, category and subpage totals) is
+    # unchanged reuse their files. Active events are always refetched because
+    # their lead counters move without touching the event record.
+    fingerprint = event_fingerprint(ev, category, with_counts=True)
+    incremental = SYNC_INCREMENTAL and not force_refresh
+    reuse = (incremental and category == 'Future' and os.path.exists(ev_dir)
+             and not watermarks.is_changed('subpages', ev['id'], fingerprint))
+    return not reuse, fingerprint
+
+
+def _file_source(path):
+    # Stamp first: a file replaced while it is being read is re-indexed on the next read
+    stamp = file_stamp(path)
+    return iter_records_file(path), stamp
+
+
+def save_event_data(eid, data):
+    # Create directory for event
+    safe_eid = eid.replace('=', '')
+    ev_dir = os.path.join(DATA_DIR, 'subpages', safe_eid)
+    if not os.path.exists(ev_dir):
+        os.makedirs(ev_dir)
+    
+    # Save specific types (people/plannings may be page generators; written as they arrive)
+    counts = {}
+    for t in ['exhibitors', 'people', 'sponsors', 'plannings']:
+        counts[t] = write_records_file(os.path.join(ev_dir, f'{t}.json'), data.get(t, []))
+    if SUBPAGES_STORE:
+        # Index the completed files in one transaction: readers see all four types of this run or none
+        get_store().replace_event(eid, {t: _file_source(os.path.join(ev_dir, f'{t}.json')) for t in counts})
+    
+    # Calculate stats for this event
+    stats = {
+        'exhibitorCount': counts['exhibitors'],
+        'personCount': counts['people'],
+        'sponsorsCount': counts['sponsors'],
+        'sessionsCount': counts['plannings'],
+        **_exhibitor_totals(data.get('exhibitors', []))
+    }
+    
+    return eid, stats
+
+
+LEAD_COUNTERS = ('scans', 'views', 'contacts', 'meetings', 'bookmarks', 'products')
+
+
+def _exhibitor_totals(exhibitors):
+    """leadsCount / membersCount stats summed over one event's exhibitors."""
+    totals = {'leadsCount': 0, 'membersCount': 0}
+    for ex in exhibitors:
+        # Total members across all exhibitors in this event
+        totals['membersCount'] += (ex.get('withEvent', {}).get('totalMembers') or ex.get('totalMembers') or 0)
+
+        # Total leads
+        leads = ex.get('withEvent', {}).get('leads', {})
+        if leads:
+            for counter in LEAD_COUNTERS:
+                totals['leadsCount'] += (leads.get(counter, {}).get('totalCount') or 0)
+    return totals
+
+
+def refresh_event_leads(event_id, community_id):
+    """
+    Refreshes only the lead counters and member totals of one event's exhibitors.
+
+    Uses the light 'leads' exhibitor profile instead of a full subpage fetch and
+    merges the counters into the event's exhibitors.json. Returns the updated
+    stats entry, or None when the event has no exhibitor file yet (its first full
+    subpage fetch has not happened).
+    """
+    path = os.path.join(DATA_DIR, 'subpages', event_id.replace('=', ''), 'exhibitors.json')
+    if not community_id or not storage.exists(path):
+        return None
+
+    fresh = {ex['id']: ex.get('withEvent') or {}
+             for ex in fetch_exhibitors_v2(community_id, event_id, profile='leads') if ex.get('id')}
+    exhibitors = list(iter_records_file(path))
+    for ex in exhibitors:
+        update = fresh.get(ex.get('id'))
+        if update is None:
+            continue
+        with_event = ex.setdefault('withEvent', {})
+        with_event['leads'] = update.get('leads') or {}
+        if update.get('totalMembers') is not None:
+            with_event['totalMembers'] = update['totalMembers']
+    write_records_file(path, exhibitors)
+
+    entry = {**load_subpages_stats().get(event_id, {}), **_exhibitor_totals(exhibitors)}
+    update_subpages_stats({event_id: entry})
+    return entry
+
+
+# ── Record-level refreshes (webhooks) ──────────────────────────────────────
+EXHIBITORS_BY_ID_BATCH = 20  # exhibitor(id:) aliases per request
+STATS_COUNT_KEYS = {'exhibitors': 'exhibitorCount', 'people': 'personCount', 'sponsors': 'sponsorsCount',
+                    'plannings': 'sessionsCount'}
+
+
+def fetch_exhibitors_by_id(event_id, exhibitor_ids, profile=None):
+    """
+    Refetches individual exhibitors with the sync profile, in aliased batches.
+    Returns {exhibitor_id: node}; ids Swapcard no longer returns map to None.
+    """
+    tier = EXHIBITOR_PROFILES.index(profile or EXHIBITORS_SYNC_PROFILE)
+    node_lines = '\n'.join(_render_selection(EXHIBITORS_V2_FIELD_SPEC, tier, 2))
+    ids = list(dict.fromkeys(exhibitor_ids))
+    found = {}
+    for start in range(0, len(ids), EXHIBITORS_BY_ID_BATCH):
+        chunk = ids[start:start + EXHIBITORS_BY_ID_BATCH]
+        var_defs, selections, variables = ['$eventId: ID!'], [], {'eventId': event_id}
+        for i, exhibitor_id in enumerate(chunk):
+            var_defs.append(f'$x{i}: ID!')
+            variables[f'x{i}'] = exhibitor_id
+            selections.append(f'x{i}: exhibitor(id: $x{i}) {{\n{node_lines}\n  }}')
+        query = 'query ExhibitorsById(' + ', '.join(var_defs) + ') {\n  ' + '\n  '.join(selections) + '\n}'
+        result = query_graphql(query, variables)
+        data = (result or {}).get('data')
+        if data is None:
+            raise RuntimeError((result or {}).get('errors') or 'no exhibitor data')
+        for i, exhibitor_id in enumerate(chunk):
+            found[exhibitor_id] = data.get(f'x{i}')
+    return found
+
+
+def _iter_fresh_records(event_id, data_type):
+    """Pages of one data type straight from the API (people/plannings are paged lazily)."""
+    if data_type == 'people':
+        return iter_event_people(event_id)
+    if data_type == 'plannings':
+        return iter_event_plannings(event_id)
+    if data_type == 'sponsors':
+        result = query_graphql(f'query GetSpo($eventId: String!) {{ sponsors(eventId: $eventId) {{ {SPONSORS_SELECTION} }} }}',
+                               {'eventId': event_id})
+        if not result or 'data' not in result:
+            raise RuntimeError((result or {}).get('errors') or 'no sponsors data')
+        return iter([(result['data'] or {}).get('sponsors') or []])
+    raise ValueError(f"Unknown subpage data type '{data_type}'")
+
+
+def fetch_event_records(event_id, data_type, record_ids):
+    """
+    Refetches the given records of one event. Exhibitors are fetched by id; the
+    other types have no by-id query, so their pages are scanned until every
+    requested id has been seen. Returns {record_id: record or None}.
+    """
+    if data_type == 'exhibitors':
+        return fetch_exhibitors_by_id(event_id, record_ids)
+    wanted = set(record_ids)
+    found = dict.fromkeys(wanted)
+    for page in _iter_fresh_records(event_id, data_type):
+        for record in page:
+            if record.get('id') in wanted:
+                found[record['id']] = record
+                wanted.discard(record['id'])
+        if not wanted:
+            break  # stop paging as soon as the touched records are in hand
+    return found
+
+
+def patch_event_records(event_id, data_type, upserts, deletes=()):
+    """
+    Replaces / adds the `upserts` ({id: record}) and drops the `deletes` ids in one
+    event's subpage file, keeping every other record, and updates that event's
+    stats. Returns the event's new stats entry.
+    """
+    ev_dir = os.path.join(DATA_DIR, 'subpages', event_id.replace('=', ''))
+    os.makedirs(ev_dir, exist_ok=True)
+    path = os.path.join(ev_dir, f'{data_type}.json')
+    pending, deletes = dict(upserts), set(deletes)
+    kept = []  # exhibitors only: their lead/member totals are recomputed
+
+    def pages():
+        if storage.exists(path):
+            page = []
+            for record in iter_records_file(path):
+                rid = record.get('id')
+                if rid in deletes:
+                    continue
+                record = pending.pop(rid, None) or record
+                page.append(record)
+                if len(page) >= 500:
+                    yield page
+                    page = []
+            if page:
+                yield page
+        if pending:
+            yield list(pending.values())
+
+    def tracked():
+        for page in pages():
+            if data_type == 'exhibitors':
+                kept.extend(page)
+            yield page
+
+    count = write_records_file(path, tracked())
+    if SUBPAGES_STORE:
+        get_store().replace_event(event_id, {data_type: _file_source(path)})
+    entry = {**load_subpages_stats().get(event_id, {}), STATS_COUNT_KEYS[data_type]: count}
+    if data_type == 'exhibitors':
+        entry.update(_exhibitor_totals(kept))
+    update_subpages_stats({event_id: entry})
+    return entry
+
+
+def fetch_and_save_events(group):
+    """
+    Fetches one batch of [(event_id, community_id), ...] and writes each event's
+    files. Returns [(event_id, stats), ...].
+    """
+    # Saving on the fetching thread lets the people/plannings page streams drain
+    # straight to disk instead of buffering in memory.
+    saved = []
+    for data in fetch_for_events(group, stream=True):
+        if data:
+            with sync_telemetry.event(data['eventId']):
+                saved.append(save_event_data(data['eventId'], data))
+    return saved
+
+
 def fetch_all_subpages_data(force_refresh=False):
     events_data = get_events()
     event_dict = events_data.get('events', {})
 
     # Stats for the global preview (to keep dashboards fast)
     # Structure: eventId -> { exhibitorCount: X, leadsCount: Y, membersCount: Z, personCount: W, sessionsCount: K, sponsorsCount: L }
-    global_stats = {}
-    stats_path = os.path.join(DATA_DIR, 'subpages_stats.json')
-    if os.path.exists(stats_path):
-        try:
-            with open(stats_path, 'r', encoding='utf-8') as f:
-                global_stats = json.load(f)
-        except Exception: pass
+    # Only the events fetched here are merged into the manifest (see update_subpages_stats),
+    # each batch as soon as it is saved, before its checkpoint
 
     # We determine which events to fetch vs reuse
     # Reusing logic: if folder data/subpages/{id} exists, skip fetching for Past events
     # UNLESS force_refresh is True
     events_to_fetch = []
     events_to_reuse = []
-
-    for cat in ['Active', 'Future']:
-        if cat in event_dict:
-            events_to_fetch.extend(event_dict[cat])
-
-    for cat in ['Past']:
-        if cat in event_dict:
-            for ev in event_dict[cat]:
-                ev_dir = os.path.join(DATA_DIR, 'subpages', ev['id'].replace('=', '')) # Remove = for cleaner paths
-                if os.path.exists(ev_dir) and not force_refresh:
-                    events_to_reuse.append(ev)
-                else:
-                    events_to_fetch.append(ev)
+    watermarks = WatermarkStore()
+    # Events saved by an interrupted earlier run are reused instead of refetched
+    checkpoint = SyncCheckpoint('subpages_fetch')
+    fingerprints = {}
+    for cat in ['Active', 'Future', 'Past']:
+        for ev in event_dict.get(cat, []):
+            fetch, fingerprint = plan_event_subpages(ev, cat, watermarks, force_refresh)
+            if fingerprint:
+                fingerprints[ev['id']] = fingerprint
+            if fetch and cat != 'Active' and checkpoint.is_done('fetch', ev['id'], fingerprint):
+                fetch = False
+            (events_to_fetch if fetch else events_to_reuse).append(ev)
 
     if force_refresh:
         print(f"Force Refresh enabled: Fetching ALL {len(events_to_fetch)} events.")
     else:
-        print(f"Sync Strategy: Fetching {len(events_to_fetch)} active/new events, reusing {len(events_to_reuse)} past events.")
-
-    def save_event_data(eid, data):
-        # Create directory for event
-        safe_eid = eid.replace('=', '')
-        ev_dir = os.path.join(DATA_DIR, 'subpages', safe_eid)
-        if not os.path.exists(ev_dir):
-            os.makedirs(ev_dir)
-        
-        # Save specific types
-        for t in ['exhibitors', 'people', 'sponsors', 'plannings']:
-            with open(os.path.join(ev_dir, f'{t}.json'), 'w', encoding='utf-8') as f:
-                json.dump(data.get(t, []), f)
-        
-        # Calculate stats for this event
-        stats = {
-            'exhibitorCount': len(data.get('exhibitors', [])),
-            'personCount': len(data.get('people', [])),
-            'sponsorsCount': len(data.get('sponsors', [])),
-            'sessionsCount': len(data.get('plannings', [])),
-            'leadsCount': 0,
-            'membersCount': 0
-        }
-        
-        for ex in data.get('exhibitors', []):
-            # Total members across all exhibitors in this event
-            stats['membersCount'] += (ex.get('withEvent', {}).get('totalMembers') or ex.get('totalMembers') or 0)
-            
-            # Total leads
-            leads = ex.get('withEvent', {}).get('leads', {})
-            if leads:
-                stats['leadsCount'] += (leads.get('scans', {}).get('totalCount') or 0)
-                stats['leadsCount'] += (leads.get('views', {}).get('totalCount') or 0)
-                stats['leadsCount'] += (leads.get('contacts', {}).get('totalCount') or 0)
-                stats['leadsCount'] += (leads.get('meetings', {}).get('totalCount') or 0)
-                stats['leadsCount'] += (leads.get('bookmarks', {}).get('totalCount') or 0)
-                stats['leadsCount'] += (leads.get('products', {}).get('totalCount') or 0)
-        
-        return eid, stats
-
-    # 1. Fetch new data in parallel
+        print(f"Sync Strategy: Fetching {len(events_to_fetch)} active/changed events, reusing {len(events_to_reuse)} unchanged/past events.")
+
+    # 1. Fetch new data in parallel (each worker handles one batch of events)
+    failed_groups = 0
     if events_to_fetch:
         print(f"Fetching subpage data for {len(events_to_fetch)} events in parallel...")
+        group_size = SUBPAGES_BATCH_EVENTS if SUBPAGES_BATCH_MODE else 1
+        groups = [
+            [(e['id'], (e.get('community') or {}).get('id')) for e in events_to_fetch[i:i + group_size]]
+            for i in range(0, len(events_to_fetch), group_size)
+        ]
         with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {executor.submit(fetch_for_event, e['id'], (e.get('community') or {}).get('id')): e['id'] for e in events_to_fetch}
+            futures = {executor.submit(sync_telemetry.in_context(fetch_and_save_events), group): [eid for eid, _ in group]
+                       for group in groups}
             for future in as_completed(futures):
                 try:
-                    data = future.result()
-                    if not data: continue
-                    eid, stats = save_event_data(data['eventId'], data)
-                    global_stats[eid] = stats
+                    saved = future.result()
+                    if saved:
+                        update_subpages_stats(dict(saved))
+                    for eid, stats in saved:
+                        if eid in fingerprints:
+                            watermarks.mark('subpages', eid, fingerprints[eid])
+                        checkpoint.mark('fetch', eid, fingerprints.get(eid))
                 except Exception as e:
-                    print(f"Error fetching subpages for event {futures[future]}: {e}")
+                    failed_groups += 1
+                    print(f"Error fetching subpages for events {futures[future]}: {e}")
 
-    # 2. Update global stats manifest
-    with open(stats_path, 'w', encoding='utf-8') as f:
-        json.dump(global_stats, f, indent=2)
+    watermarks.save()
+    # Failed groups were neither checkpointed nor watermarked, so the next run refetches them
+    checkpoint.complete()
+
+    # 2. Stats were merged batch by batch above; read the manifest back for the summary
+    global_stats = load_subpages_stats()
 
     print(f"Saved stats for {len(global_stats)} events to data/subpages_stats.json")
 
@@ -500,6 +858,7 @@ def fetch_all_subpages_data(force_refresh=False):
         'status': 'success',
         'events_fetched': len(events_to_fetch),
         'events_reused': len(events_to_reuse),
+        'failed_batches': failed_groups,
         'total_events_in_stats': len(global_stats)
     }
 
@@ -516,55 +875,125 @@ def fetch_leap_only():
         ex['eventId'] = event_id
 
     # Clear and save only LEAP data
-    with open(os.path.join(DATA_DIR, 'exhibitors.json'), 'w', encoding='utf-8') as f:
-        json.dump(exhibitors, f, ensure_ascii=False)
+    storage.write_json(os.path.join(DATA_DIR, 'exhibitors.json'), exhibitors)
 
     print(f"Saved {len(exhibitors)} LEAP exhibitors to data/exhibitors.json")
     return {'exhibitors': len(exhibitors)}
 
 def get_subpages_stats():
     """Returns the global stats for all events (lightweight)."""
-    stats_path = os.path.join(DATA_DIR, 'subpages_stats.json')
-    if os.path.exists(stats_path):
-        with open(stats_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    return dict(_read_subpages_stats())
+
+def _event_data_version(event_id, data_type):
+    """Cache version of one event's records: the stamp of the file they are read from (None without one)."""
+    stamp = file_stamp(os.path.join(DATA_DIR, 'subpages', event_id.replace('=', ''), f'{data_type}.json'))
+    if stamp:
+        return ('event', *stamp)
+    stamp = file_stamp(os.path.join(DATA_DIR, f'{data_type}.json'))
+    # A global file is far larger than one event's share of it, so its size overstates the entry
+    return ('global', *stamp) if stamp else None
 
 def get_event_subpage_data(event_id, data_type):
-    """Returns specific data (exhibitors, people, etc) for ONE event."""
-    # Try event-specific path first
-    safe_eid = event_id.replace('=', '')
-    path = os.path.join(DATA_DIR, 'subpages', safe_eid, f'{data_type}.json')
-    if os.path.exists(path):
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    """Returns specific data (exhibitors, people, etc) for ONE event (cached; copy records before mutating)."""
+    version = _event_data_version(event_id, data_type)
+    if version is None:
+        return []
+
+    def load():
+        return list(_iter_event_records(event_id, data_type)), version[1]
+    return list(subpage_cache.get_or_load((data_type, event_id), version, load))
+
+def _read_global_file(path):
+    data = storage.read_json(path)
+    return data if isinstance(data, list) else []
 
-    # Fallback to global data files (all events combined)
+def iter_event_subpage_data(event_id, data_type):
+    """
+    Streams records for ONE event: from the read cache when they are cached,
+    else from the store without filling the cache (syncs stream whole accounts).
+    """
+    found, records = subpage_cache.peek((data_type, event_id), _event_data_version(event_id, data_type))
+    yield from records if found else _iter_event_records(event_id, data_type)
+
+def _iter_event_records(event_id, data_type):
+    """Streams records for ONE event from the indexed store (tools/subpage_store.py)."""
+    # Try event-specific path first
+    path = os.path.join(DATA_DIR, 'subpages', event_id.replace('=', ''), f'{data_type}.json')
     global_path = os.path.join(DATA_DIR, f'{data_type}.json')
-    if os.path.exists(global_path):
+    if not SUBPAGES_STORE:
+        yield from _iter_event_files(event_id, data_type, path, global_path)
+        return
+
+    store = get_store()
+    if store.ensure_current(data_type, event_id, path, iter_records_file):
+        yield from store.iter_records(data_type, event_id)
+    # Fallback to global data files (all events combined), indexed by each record's eventId
+    elif store.ensure_current(data_type, GLOBAL, global_path, _read_global_file):
         print(f"[get_event_subpage_data] Using global {data_type}.json for event {event_id}")
-        with open(global_path, 'r', encoding='utf-8') as f:
-            all_data = json.load(f)
-            # Filter by event_id if the data has an eventId field
-            if all_data and isinstance(all_data, list) and len(all_data) > 0:
-                # Check if items have event_id field
-                if 'eventId' in all_data[0]:
-                    filtered = [item for item in all_data if item.get('eventId') == event_id]
-                    print(f"[get_event_subpage_data] Filtered {len(filtered)} from {len(all_data)} {data_type} for event {event_id}")
-                    return filtered
-                else:
-                    # No event_id field, return all (assumes single-event file)
-                    print(f"[get_event_subpage_data] Returning all {len(all_data)} {data_type} (no event filtering)")
-                    return all_data
+        yield from store.iter_records(data_type, event_id, source='global')
+
+def _iter_event_files(event_id, data_type, path, global_path):
+    """SUBPAGES_STORE=0: reads the JSON files directly."""
+    if storage.exists(path):
+        yield from iter_records_file(path)
+    elif storage.exists(global_path):
+        all_data = _read_global_file(global_path)
+        # Filter by event_id if the data has an eventId field
+        if all_data and 'eventId' in all_data[0]:
+            yield from (item for item in all_data if item.get('eventId') == event_id)
+        else:
+            # No event_id field, return all (assumes single-event file)
+            yield from all_data
 
-    return []
+def get_event_subpage_page(event_id, data_type, offset=0, limit=50):
+    """
+    Returns (records offset..offset+limit-1, total) for ONE event. Reads only the
+    blocks holding those records (tools/record_files.py) unless the event is cached.
+    """
+    version = _event_data_version(event_id, data_type)
+    found, records = subpage_cache.peek((data_type, event_id), version)
+    if not found and version and version[0] == 'event':
+        path = os.path.join(DATA_DIR, 'subpages', event_id.replace('=', ''), f'{data_type}.json')
+        page = record_files.read_page(path, offset, limit)
+        if page is not None:
+            return page, record_files.record_count(path)
+    if not found:
+        records = get_event_subpage_data(event_id, data_type)
+    return records[offset:offset + limit], len(records)
+
+def query_event_subpage_data(event_id, data_type, **query):
+    """
+    Filters, sorts and pages ONE event's records in the indexed store (see
+    SubpageStore.query for `query`). Returns (records, next_cursor, total), or
+    None when there is no local copy of the event's data.
+    """
+    path = os.path.join(DATA_DIR, 'subpages', event_id.replace('=', ''), f'{data_type}.json')
+    store = get_store()
+    if store.ensure_current(data_type, event_id, path, iter_records_file):
+        return store.query(data_type, event_id, **query)
+    if store.ensure_current(data_type, GLOBAL, os.path.join(DATA_DIR, f'{data_type}.json'), _read_global_file):
+        return store.query(data_type, event_id, source='global', **query)
+    return None
+
+def get_event_subpage_record(event_id, data_type, record_id):
+    """Point lookup of one record of ONE event (None when it is not there)."""
+    path = os.path.join(DATA_DIR, 'subpages', event_id.replace('=', ''), f'{data_type}.json')
+    matches = record_files.find_records(path, record_id=record_id)
+    if matches is not None:
+        return matches[0] if matches else None
+    if not SUBPAGES_STORE or storage.exists(path):
+        return next((r for r in iter_event_subpage_data(event_id, data_type) if r.get('id') == record_id), None)
+    # No per-event file: the global data file, through the store's index
+    store = get_store()
+    store.ensure_current(data_type, GLOBAL, os.path.join(DATA_DIR, f'{data_type}.json'), _read_global_file)
+    return store.get_record(data_type, event_id, record_id)
 
 def get_subpages_data():
     """Legacy helper: Returns stats instead of full data to prevent app crash."""
     return get_subpages_stats()
 
 def ensure_data():
-    if not os.path.exists(os.path.join(DATA_DIR, 'exhibitors.json')):
+    if not storage.exists(os.path.join(DATA_DIR, 'exhibitors.json')):
         fetch_all_subpages_data()
 
 if __name__ == '__main__':
@@ -0,0 +1,186 @@
+"""
+tools/member_rosters.py
+
+Completes exhibitor member rosters beyond the first `members(page: 1, pageSize: 10)`.
+
+The ExhibitorsV2 query only returns the first 10 members per exhibitor, while
+`totalMembers` is often larger. This tool finds exhibitors whose roster is
+incomplete, pages their members concurrently (several exhibitor pages per
+aliased GraphQL document, all under the shared Swapcard rate limiter) and merges
+the full list back into data/subpages/<id>/exhibitors.json, from which the
+`event_exhibitors` rows are built.
+
+Rosters are cached per event in data/subpages/<id>/member_rosters.json keyed by
+exhibitor id, and are only refetched when that exhibitor's `totalMembers` changes.
+
+Usage:
+    from tools.member_rosters import refresh_member_rosters
+
+    refresh_member_rosters("RXZlbnRfMjc3NzQ3Mw==")
+"""
+
+import os
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from tools import get_subpages
+from tools import compressed_storage as storage
+from tools.get_subpages import query_graphql, write_records_file, iter_records_file
+from tools.sync_telemetry import in_context
+
+# ─── Constants ────────────────────────────────────────────────────────────────
+
+ROSTER_PAGE_SIZE = int(os.environ.get("ROSTER_PAGE_SIZE", 50))
+ROSTER_PAGES_PER_QUERY = int(os.environ.get("ROSTER_PAGES_PER_QUERY", 10))
+ROSTER_WORKERS = int(os.environ.get("ROSTER_WORKERS", 4))
+SUBPAGES_FULL_ROSTERS = os.environ.get("SUBPAGES_FULL_ROSTERS", "1") == "1"
+
+# Same member selection the ExhibitorsV2 "detail" profile uses for the first page
+_MEMBERS_SPEC = next(item[2] for item in get_subpages.EXHIBITORS_V2_FIELD_SPEC if item[1].startswith("members("))
+MEMBER_FIELDS = " ".join(line.strip() for line in get_subpages._render_selection(
+    _MEMBERS_SPEC, get_subpages.EXHIBITOR_PROFILES.index("detail"), 0))
+
+
+# ─── Fetching ─────────────────────────────────────────────────────────────────
+
+def _needs_roster(ex: dict) -> bool:
+    total = ex.get("totalMembers") or 0
+    return "members" in ex and total > len(ex.get("members") or [])
+
+
+def _fetch_member_pages(tasks: list[tuple[str, int]]) -> dict[tuple[str, int], list]:
+    """Fetches [(exhibitor_id, page), ...] in one aliased document."""
+    var_defs, selections, variables = [], [], {}
+    for i, (exhibitor_id, page) in enumerate(tasks):
+        var_defs.append(f"$x{i}: ID!")
+        variables[f"x{i}"] = exhibitor_id
+        selections.append(
+            f"m{i}: exhibitor(id: $x{i}) {{ members(page: {page}, pageSize: {ROSTER_PAGE_SIZE}) {{ {MEMBER_FIELDS} }} }}"
+        )
+    query = "query MemberRosters(" + ", ".join(var_defs) + ") {\n  " + "\n  ".join(selections) + "\n}"
+    result = query_graphql(query, variables)
+    data = (result or {}).get("data") or {}
+    if result and result.get("errors"):
+        print(f"  [Rosters] Partial errors: {result['errors'][:1]}")
+
+    out = {}
+    for i, task in enumerate(tasks):
+        node = data.get(f"m{i}")
+        if node is not None:
+            out[task] = node.get("members") or []
+    return out
+
+
+def fetch_rosters(exhibitors: list[dict]) -> dict[str, list]:
+    """
+    Pages the full member list for each exhibitor concurrently.
+
+    Returns {exhibitor_id: members}; exhibitors with any failed page are omitted so
+    their existing (partial) roster is kept rather than replaced by a shorter one.
+    """
+    tasks = []
+    for ex in exhibitors:
+        pages = math.ceil((ex.get("totalMembers") or 0) / ROSTER_PAGE_SIZE)
+        tasks.extend((ex["id"], page) for page in range(1, pages + 1))
+    if not tasks:
+        return {}
+
+    chunks = [tasks[i:i + ROSTER_PAGES_PER_QUERY] for i in range(0, len(tasks), ROSTER_PAGES_PER_QUERY)]
+    pages: dict[tuple[str, int], list] = {}
+    with ThreadPoolExecutor(max_workers=ROSTER_WORKERS) as executor:
+        for future in [executor.submit(in_context(_fetch_member_pages), chunk) for chunk in chunks]:
+            pages.update(future.result())
+
+    rosters = {}
+    for ex in exhibitors:
+        expected = math.ceil((ex.get("totalMembers") or 0) / ROSTER_PAGE_SIZE)
+        ex_pages = [pages.get((ex["id"], p)) for p in range(1, expected + 1)]
+        if any(p is None for p in ex_pages):
+            continue
+        rosters[ex["id"]] = [m for page in ex_pages for m in page]
+    return rosters
+
+
+# ─── Public API ───────────────────────────────────────────────────────────────
+
+def complete_rosters(exhibitors: list[dict]) -> int:
+    """Fills in the full member list of the given exhibitors in place; returns how many were completed."""
+    rosters = fetch_rosters([ex for ex in exhibitors if ex.get("id") and _needs_roster(ex)])
+    for ex in exhibitors:
+        if ex.get("id") in rosters:
+            ex["members"] = rosters[ex["id"]]
+    return len(rosters)
+
+
+def refresh_member_rosters(event_id: str) -> dict:
+    """
+    Completes member rosters in one event's exhibitors.json. Only exhibitors whose
+    `totalMembers` differs from the cached roster are refetched.
+
+    Returns:
+        {"exhibitors_incomplete": int, "fetched": int, "from_cache": int}
+    """
+    ev_dir = os.path.join(get_subpages.DATA_DIR, "subpages", event_id.replace("=", ""))
+    exhibitors_path = os.path.join(ev_dir, "exhibitors.json")
+    cache_path = os.path.join(ev_dir, "member_rosters.json")
+    summary = {"exhibitors_incomplete": 0, "fetched": 0, "from_cache": 0}
+    if not storage.exists(exhibitors_path):
+        return summary
+
+    exhibitors = list(iter_records_file(exhibitors_path))
+    incomplete = [ex for ex in exhibitors if ex.get("id") and _needs_roster(ex)]
+    summary["exhibitors_incomplete"] = len(incomplete)
+    if not incomplete:
+        return summary
+
+    cache = {}
+    if storage.exists(cache_path):
+        try:
+            cache = storage.read_json(cache_path)
+        except Exception:
+            cache = {}
+
+    stale = [ex for ex in incomplete
+             if (cache.get(ex["id"]) or {}).get("totalMembers") != ex.get("totalMembers")]
+    for ex_id, members in fetch_rosters(stale).items():
+        total = next(ex.get("totalMembers") for ex in stale if ex["id"] == ex_id)
+        cache[ex_id] = {"totalMembers": total, "members": members}
+        summary["fetched"] += 1
+
+    changed = False
+    for ex in incomplete:
+        entry = cache.get(ex["id"])
+        if entry and entry.get("totalMembers") == ex.get("totalMembers"):
+            ex["members"] = entry["members"]
+            changed = True
+            if ex not in stale:
+                summary["from_cache"] += 1
+
+    if summary["fetched"]:
+        storage.write_json(cache_path, cache)
+    if changed:
+        write_records_file(exhibitors_path, exhibitors)
+
+    print(f"  [Rosters] {event_id}: {summary['exhibitors_incomplete']} incomplete, "
+          f"{summary['fetched']} fetched, {summary['from_cache']} from cache")
+    return summary
+
+
+def refresh_all_member_rosters(event_ids: list[str]) -> dict:
+    """Runs refresh_member_rosters for each event; returns {event_id: summary}."""
+    results = {}
+    for eid in event_ids:
+        try:
+            results[eid] = refresh_member_rosters(eid)
+        except Exception as e:
+            print(f"  [Rosters] Error for event {eid}: {e}")
+            results[eid] = {"error": str(e)}
+    return results
+
+
+# ─── CLI ─────────────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    import sys
+
+    print(refresh_member_rosters(sys.argv[1] if len(sys.argv) > 1 else "RXZlbnRfMjc3NzQ3Mw=="))
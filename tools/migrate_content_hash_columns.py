@@ -0,0 +1,34 @@
+"""
+Migration script to add a content_hash column to the normalized subpage tables.
+Lets each row carry the hash the sync uses to skip unchanged rows (see tools/row_hashes.py).
+"""
+
+def migrate_add_content_hash_columns():
+    """
+    Adds content_hash (text) to event_exhibitors, event_people, event_planning and
+    event_sponsors. After running the SQL, set SYNC_HASH_COLUMN=1 so the sync writes it.
+    """
+
+    print("[Migration] Generating content_hash migration...")
+
+    # Note: Supabase schema changes must be done via SQL in the Supabase dashboard
+    # This script will show you the SQL to run
+
+    sql = """
+    -- Stable hash of each row's normalized content (excluding updated_at)
+    ALTER TABLE event_exhibitors ADD COLUMN IF NOT EXISTS content_hash TEXT;
+    ALTER TABLE event_people     ADD COLUMN IF NOT EXISTS content_hash TEXT;
+    ALTER TABLE event_planning   ADD COLUMN IF NOT EXISTS content_hash TEXT;
+    ALTER TABLE event_sponsors   ADD COLUMN IF NOT EXISTS content_hash TEXT;
+    """
+
+    print("\n" + "="*80)
+    print("RUN THIS SQL IN SUPABASE SQL EDITOR:")
+    print("="*80)
+    print(sql)
+    print("="*80)
+    print("\nAfter running the SQL, set SYNC_HASH_COLUMN=1 and the next sync will populate content_hash.")
+    print("\nMigration SQL generated successfully!")
+
+if __name__ == "__main__":
+    migrate_add_content_hash_columns()
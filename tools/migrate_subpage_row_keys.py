@@ -0,0 +1,40 @@
+"""
+Migration script to key the normalized subpage tables by (event_id, id).
+With SUBPAGES_COMPOSITE_KEY=1 the sync upserts with on_conflict="event_id,id"
+(SUBPAGE_CONFLICT_KEY in main.py), since the same exhibitor or person id is listed
+by several events. PostgREST rejects that conflict target until this SQL has run.
+"""
+
+def migrate_subpage_row_keys():
+    """
+    Adds a unique index on (event_id, id) to event_exhibitors, event_people,
+    event_planning and event_sponsors, which PostgREST needs to resolve the
+    upsert conflict target.
+    """
+
+    print("[Migration] Generating subpage row key migration...")
+
+    # Note: Supabase schema changes must be done via SQL in the Supabase dashboard
+    # This script will show you the SQL to run
+
+    sql = """
+    -- One row per record per event
+    CREATE UNIQUE INDEX IF NOT EXISTS event_exhibitors_event_id_id_key ON event_exhibitors (event_id, id);
+    CREATE UNIQUE INDEX IF NOT EXISTS event_people_event_id_id_key     ON event_people (event_id, id);
+    CREATE UNIQUE INDEX IF NOT EXISTS event_planning_event_id_id_key   ON event_planning (event_id, id);
+    CREATE UNIQUE INDEX IF NOT EXISTS event_sponsors_event_id_id_key   ON event_sponsors (event_id, id);
+    """
+
+    print("\n" + "="*80)
+    print("RUN THIS SQL IN SUPABASE SQL EDITOR:")
+    print("="*80)
+    print(sql)
+    print("="*80)
+    print("\nIf a table's primary key is id alone, replace it with (event_id, id) first:")
+    print("    ALTER TABLE event_exhibitors DROP CONSTRAINT event_exhibitors_pkey,")
+    print("        ADD PRIMARY KEY (event_id, id);")
+    print("\nAfter running the SQL, set SUBPAGES_COMPOSITE_KEY=1 so the sync upserts on (event_id, id).")
+    print("\nMigration SQL generated successfully!")
+
+if __name__ == "__main__":
+    migrate_subpage_row_keys()
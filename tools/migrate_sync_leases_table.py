@@ -0,0 +1,43 @@
+"""
+Migration script to create the sync_leases table used by tools/sync_lease.py
+when SYNC_LEASE_BACKEND=supabase (instances that do not share a disk, e.g. Vercel).
+"""
+
+def migrate_create_sync_leases_table():
+    """
+    Creates sync_leases: one row per sync kind ("events", "subpages") naming the
+    current holder. Rows expire unless the holder heartbeats.
+    """
+
+    print("[Migration] Generating sync_leases migration...")
+
+    # Note: Supabase schema changes must be done via SQL in the Supabase dashboard
+    # This script will show you the SQL to run
+
+    sql = """
+    CREATE TABLE IF NOT EXISTS sync_leases (
+        name         TEXT PRIMARY KEY,
+        holder       TEXT NOT NULL,
+        run_id       TEXT NOT NULL,
+        trigger      TEXT,
+        acquired_at  TIMESTAMPTZ NOT NULL,
+        heartbeat_at TIMESTAMPTZ NOT NULL,
+        expires_at   TIMESTAMPTZ NOT NULL,
+        finished_at  TIMESTAMPTZ,
+        outcome      TEXT
+    );
+    -- Tables created before releases recorded the run's outcome
+    ALTER TABLE sync_leases ADD COLUMN IF NOT EXISTS finished_at TIMESTAMPTZ;
+    ALTER TABLE sync_leases ADD COLUMN IF NOT EXISTS outcome TEXT;
+    """
+
+    print("\n" + "="*80)
+    print("RUN THIS SQL IN SUPABASE SQL EDITOR:")
+    print("="*80)
+    print(sql)
+    print("="*80)
+    print("\nAfter running the SQL, set SYNC_LEASE_BACKEND=supabase.")
+    print("\nMigration SQL generated successfully!")
+
+if __name__ == "__main__":
+    migrate_create_sync_leases_table()
@@ -1,4 +1,5 @@
-import os, json, urllib.request
+import os
+from tools.swapcard_client import post_graphql
 
 API_KEY = os.environ.get('SWAPCARD_API_KEY')
 if not API_KEY:
@@ -12,20 +13,9 @@ if not API_KEY:
                         os.environ[k] = v
     except Exception: pass
 
-URL = 'https://developer.swapcard.com/event-admin/graphql'
-
 def query_graphql(query, variables):
-    req = urllib.request.Request(URL, data=json.dumps({'query': query, 'variables': variables}).encode('utf-8'))
-    req.add_header('Authorization', API_KEY)
-    req.add_header('Content-Type', 'application/json')
-    try:
-        resp = urllib.request.urlopen(req)
-        return json.loads(resp.read().decode('utf-8'))
-    except urllib.error.HTTPError as e:
-        print(f"HTTP Error: {e.read().decode('utf-8')}")
-        raise e
-    except Exception as e:
-        raise e
+    # Mutations surface failures to the API handlers, so raise instead of returning None
+    return post_graphql(query, variables, raise_errors=True)
 
 def create_event_person(event_id: str, first_name: str, last_name: str, email: str = None, job_title: str = None, organization: str = None):
     query = '''
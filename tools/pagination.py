@@ -0,0 +1,164 @@
+"""
+tools/pagination.py
+
+Pagination helpers for the Swapcard APIs.
+
+`iter_cursor_pages` / `iter_numbered_pages` are generators that yield one page
+of items at a time, so large lists (20k attendees) can be written to disk or
+pushed to Supabase as they arrive without holding the whole list in memory.
+
+`fetch_pages_parallel` walks page-numbered queries (e.g. `events(page:, pageSize:)`)
+with a sliding window of concurrent requests. Because the total page count is
+unknown up front, it speculatively keeps `window` pages in flight, stops issuing
+new pages once any page comes back empty, retries failed pages, and returns the
+batches in page order. `iter_pages_parallel` is the streaming form that yields
+each page in order as soon as it is available. Throughput is still bounded by
+the shared rate limiter.
+
+Usage:
+    from tools.pagination import fetch_pages_parallel, iter_cursor_pages
+
+    def fetch_page(page):
+        return post_graphql(QUERY, {"page": page}, raise_errors=True)["data"]["events"]
+
+    events = fetch_pages_parallel(fetch_page, window=8, max_pages=50)
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tools.sync_telemetry import in_context
+
+PAGE_WINDOW = int(os.environ.get("SWAPCARD_PAGE_WINDOW", 8))
+
+
+class PaginationError(RuntimeError):
+    """Raised when a page keeps failing after all retries (instead of truncating silently)."""
+
+
+def _call_after(delay, fetch_page, page):
+    if delay:
+        time.sleep(delay)
+    return fetch_page(page)
+
+
+def iter_pages_parallel(fetch_page, window: int = PAGE_WINDOW, max_pages: int = 50,
+                        retries: int = 3, label: str = "pages"):
+    """
+    Fetches pages 1..N concurrently until the first empty page and yields each
+    non-empty page in page order as soon as it and every page before it are in.
+
+    Args:
+        fetch_page: Callable(page_number) -> list of items (empty list = past the end).
+                    Exceptions are treated as transient and retried.
+        window:     Max pages in flight at once.
+        max_pages:  Hard upper bound on page numbers.
+        retries:    Retries per page before raising PaginationError.
+        label:      Name used in log lines.
+    """
+    results: dict[int, list] = {}
+    attempts: dict[int, int] = {}
+    end_page = max_pages + 1   # first page known to be empty (exclusive bound)
+    next_page = 1
+    next_yield = 1
+
+    with ThreadPoolExecutor(max_workers=max(1, window)) as executor:
+        in_flight = {}
+
+        def submit(page, delay=0.0):
+            # Retry back-off sleeps in the worker so other pages keep flowing
+            in_flight[executor.submit(in_context(_call_after), delay, fetch_page, page)] = page
+
+        while next_page < end_page and len(in_flight) < window:
+            submit(next_page)
+            next_page += 1
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = in_flight.pop(future)
+                try:
+                    batch = future.result() or []
+                except Exception as e:
+                    if page >= end_page:
+                        continue  # speculative page past the end; nothing to recover
+                    attempts[page] = attempts.get(page, 0) + 1
+                    if attempts[page] > retries:
+                        raise PaginationError(f"{label}: page {page} failed after {retries} retries: {e}") from e
+                    print(f"  [Paginate] {label} page {page} failed ({e}), retry {attempts[page]}/{retries}")
+                    submit(page, delay=min(2 ** (attempts[page] - 1), 8))
+                    continue
+
+                if not batch:
+                    end_page = min(end_page, page)
+                else:
+                    results[page] = batch
+
+            # Top the window back up, never past the first empty page
+            while next_page < end_page and len(in_flight) < window:
+                submit(next_page)
+                next_page += 1
+
+            # Release the contiguous prefix of completed pages
+            while next_yield < end_page and next_yield in results:
+                yield results.pop(next_yield)
+                next_yield += 1
+
+
+def fetch_pages_parallel(fetch_page, window: int = PAGE_WINDOW, max_pages: int = 50,
+                         retries: int = 3, label: str = "pages") -> list:
+    """Same as iter_pages_parallel, but returns all items concatenated in page order."""
+    items = []
+    for batch in iter_pages_parallel(fetch_page, window, max_pages, retries, label):
+        items.extend(batch)
+    return items
+
+
+def _with_retries(fn, arg, retries, label):
+    for attempt in range(retries + 1):
+        try:
+            return fn(arg)
+        except Exception as e:
+            if attempt == retries:
+                raise PaginationError(f"{label}: page {arg!r} failed after {retries} retries: {e}") from e
+            print(f"  [Paginate] {label} page {arg!r} failed ({e}), retry {attempt + 1}/{retries}")
+            time.sleep(min(2 ** attempt, 8))
+
+
+def iter_cursor_pages(fetch_page, after: str | None = None, retries: int = 3, label: str = "pages"):
+    """
+    Yields pages from a cursor connection.
+
+    Args:
+        fetch_page: Callable(after_cursor) -> (items, page_info) where page_info has
+                    `hasNextPage` / `endCursor`. Exceptions are retried.
+        after:      Cursor to resume from (None = first page).
+    """
+    while True:
+        items, page_info = _with_retries(fetch_page, after, retries, label)
+        if items:
+            yield items
+        page_info = page_info or {}
+        next_cursor = page_info.get("endCursor")
+        if not page_info.get("hasNextPage") or not next_cursor or next_cursor == after:
+            return
+        after = next_cursor
+
+
+def iter_numbered_pages(fetch_page, start_page: int = 1, page_size: int | None = None,
+                        max_pages: int = 1000, retries: int = 3, label: str = "pages"):
+    """
+    Yields pages from a page-numbered query until an empty (or short) page.
+
+    Args:
+        fetch_page: Callable(page_number) -> list of items. Exceptions are retried.
+        page_size:  If given, a page shorter than this is treated as the last one.
+    """
+    for page in range(start_page, max_pages + 1):
+        batch = _with_retries(fetch_page, page, retries, label)
+        if not batch:
+            return
+        yield batch
+        if page_size and len(batch) < page_size:
+            return
@@ -0,0 +1,165 @@
+"""
+tools/rate_limiter.py
+
+Process-wide token-bucket rate limiter for the Swapcard APIs.
+
+All Swapcard traffic (GraphQL reads, mutations and the analytics export stream)
+draws from the same bucket, so the sync thread pool, background tasks and API
+handlers share one budget instead of each sleeping blindly. When the server
+answers 429 (or sends `Retry-After`), the bucket pauses for everyone.
+
+Configuration (environment variables):
+    SWAPCARD_RATE_PER_SEC   Sustained requests per second (default 5)
+    SWAPCARD_RATE_BURST     Bucket size / max burst (default 10)
+
+Usage:
+    from tools.rate_limiter import swapcard_limiter
+
+    swapcard_limiter.acquire()          # blocking (threads)
+    await swapcard_limiter.aacquire()   # asyncio
+    swapcard_limiter.stats()            # quota usage snapshot
+"""
+
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parses a Retry-After header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket usable from both threads and asyncio.
+
+    Callers reserve a token under the lock and then sleep outside it, so waiters
+    are released in arrival order at exactly `rate` requests per second once the
+    burst is spent.
+    """
+
+    def __init__(self, rate: float, burst: int, name: str = "bucket"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._rate = float(rate)
+        self._burst = int(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        # Usage counters
+        self._granted = 0
+        self._waited = 0
+        self._wait_seconds = 0.0
+        self._throttled = 0
+        self._last_retry_after = None
+        self._server_quota: dict = {}
+
+    # ── Configuration ──
+
+    def configure(self, rate: float | None = None, burst: int | None = None):
+        with self._lock:
+            self._refill(time.monotonic())
+            if rate:
+                self._rate = float(rate)
+            if burst:
+                self._burst = int(burst)
+                self._tokens = min(self._tokens, self._burst)
+
+    # ── Core ──
+
+    def _refill(self, now: float):
+        start = max(self._last, self._paused_until)
+        if now > start:
+            self._tokens = min(self._burst, self._tokens + (now - start) * self._rate)
+        self._last = max(self._last, now)
+
+    def _reserve(self) -> float:
+        """Takes one token (possibly going into debt) and returns how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            base = max(now, self._paused_until)
+            wait = (base - now) + (max(0.0, -self._tokens) / self._rate)
+            self._granted += 1
+            if wait > 0:
+                self._waited += 1
+                self._wait_seconds += wait
+            return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttle(self, retry_after: float):
+        """Pauses the whole bucket after a 429 / Retry-After from the server."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + retry_after)
+            self._tokens = min(self._tokens, 0.0)
+            self._throttled += 1
+            self._last_retry_after = retry_after
+        print(f"[RateLimit] {self.name} throttled by server, pausing {retry_after:.1f}s")
+
+    def record_headers(self, headers):
+        """Keeps the last quota headers the server advertised, if any."""
+        quota = {}
+        for key in ("x-ratelimit-limit", "x-ratelimit-remaining", "x-ratelimit-reset",
+                    "ratelimit-limit", "ratelimit-remaining", "ratelimit-reset"):
+            if key in headers:
+                quota[key] = headers[key]
+        if quota:
+            with self._lock:
+                self._server_quota = quota
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "name": self.name,
+                "rate_per_sec": self._rate,
+                "burst": self._burst,
+                "tokens_available": round(max(0.0, self._tokens), 2),
+                "queued_debt": round(max(0.0, -self._tokens), 2),
+                "paused_for_sec": round(max(0.0, self._paused_until - now), 2),
+                "requests_granted": self._granted,
+                "requests_delayed": self._waited,
+                "total_wait_sec": round(self._wait_seconds, 2),
+                "throttled_responses": self._throttled,
+                "last_retry_after_sec": self._last_retry_after,
+                "server_quota": dict(self._server_quota),
+            }
+
+
+# ─── Shared Instance ──────────────────────────────────────────────────────────
+
+swapcard_limiter = TokenBucket(
+    rate=float(os.environ.get("SWAPCARD_RATE_PER_SEC", 5)),
+    burst=int(os.environ.get("SWAPCARD_RATE_BURST", 10)),
+    name="swapcard",
+)
@@ -0,0 +1,120 @@
+"""
+tools/read_cache.py
+
+Bounded in-process LRU cache for parsed subpage reads.
+
+`get_event_subpage_data`, `get_subpages_stats` and `get_subpages_data` used to
+re-read and re-parse their files on every call (dashboard requests, the
+startup preload, every sync). Parsed payloads are now kept here, keyed by what
+was read and validated by a version token: the source file's [size, mtime_ns]
+stamp, which every writer (sync, webhook patches, member rosters, the indexed
+store's files) changes. A hit costs one stat() and no read or parse; an entry
+whose file changed is reloaded, and the least recently used entries are
+evicted once the cache holds more than READ_CACHE_BYTES.
+
+Entry sizes are the byte size of the source they were parsed from, which is a
+stable proxy for the parsed payload's footprint (parsed objects take a few
+times more). Payloads larger than a quarter of the budget are not cached, so a
+single huge event cannot flush every hot one.
+
+Cached values are shared between callers: copy before mutating them.
+
+Configuration (environment variables):
+    READ_CACHE_BYTES   Byte budget of the cache (default 67108864, 64 MB; 0 disables it)
+
+Usage:
+    from tools.read_cache import subpage_cache
+
+    records = subpage_cache.get_or_load(("people", event_id), stamp, load)   # load() -> (value, size)
+    subpage_cache.stats()   # hits, misses, evictions, bytes, entries
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+READ_CACHE_BYTES = int(os.environ.get("READ_CACHE_BYTES", 64 * 1024 * 1024))
+
+
+class ReadCache:
+    """Thread-safe LRU of (version, value, size) entries bounded by total size in bytes."""
+
+    def __init__(self, max_bytes: int = READ_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "uncacheable": 0}
+
+    def get(self, key, version):
+        """Returns (True, value) for a current entry, (False, None) otherwise; counts the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return True, entry[1]
+            if entry is not None:
+                # The source changed since it was cached
+                self._drop(key)
+                self._counters["invalidations"] += 1
+            self._counters["misses"] += 1
+            return False, None
+
+    def put(self, key, version, value, size: int):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if self.max_bytes <= 0 or size > self.max_bytes // 4:
+                self._counters["uncacheable"] += 1
+                return
+            self._entries[key] = (version, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def get_or_load(self, key, version, load):
+        """
+        Returns the cached value for `key` at `version`, or `load()` → (value, size)
+        cached under that version. A None version (no source) is never cached.
+        """
+        if version is None:
+            return load()[0]
+        found, value = self.get(key, version)
+        if found:
+            return value
+        value, size = load()
+        self.put(key, version, value, size)
+        return value
+
+    def peek(self, key, version):
+        """Like get() without counting a miss; for streaming readers that do not fill the cache."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return False, None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return True, entry[1]
+
+    def invalidate(self, match=None):
+        """Drops every entry, or those whose key satisfies `match(key)`."""
+        with self._lock:
+            for key in [k for k in self._entries if match is None or match(k)]:
+                self._drop(key)
+                self._counters["invalidations"] += 1
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {**self._counters, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes,
+                    "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else None}
+
+
+subpage_cache = ReadCache()
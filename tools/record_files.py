@@ -0,0 +1,280 @@
+"""
+tools/record_files.py
+
+Subpage record files as offset-indexed NDJSON, for paging and single-record
+reads without parsing a whole file.
+
+A record file (data/subpages/<event>/<type>.json) holds one JSON record per
+line. Lines are grouped into blocks of about RECORD_BLOCK_BYTES, and each block
+is compressed on its own (a zstd frame or gzip member, see
+tools/compressed_storage.py), so the file is still one valid stream for
+sequential readers. A sidecar index (<type>.json.idx, stored compressed)
+records:
+
+    stamp    [size, mtime_ns] of the data file it describes
+    count    records in the file
+    blocks   [[byte offset, byte length, first record number], ...]
+    ids      {record id: record number}
+    names    {lowercased name / title / full name: [record numbers]}
+
+A reader loads the index (cached in the read cache until it changes),
+mmaps the data file and decompresses only the blocks holding the records it
+needs. Reading records 500-550 touches one or two blocks, and a lookup by id or
+name touches one block per match, whatever the file's size. An index whose
+stamp no longer matches its data file is ignored.
+
+Files written before this format (a JSON array) are still read sequentially,
+and are rewritten in this format the first time a reader needs random access.
+Run `python tools/record_files.py reindex` to convert all of them up front.
+
+Configuration (environment variables):
+    RECORD_BLOCK_BYTES   Uncompressed bytes per block (default 65536)
+
+Usage:
+    from tools import record_files
+
+    record_files.write_records(path, pages)             # pages: lists or a generator of lists
+    for record in record_files.iter_records(path):
+        ...
+    record_files.read_page(path, start=500, count=50)   # None when the file cannot be indexed
+    record_files.find_records(path, record_id="RXhoaWJpdG9yXzE=")
+"""
+
+import os
+import sys
+import mmap
+import json
+import bisect
+import argparse
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from tools import compressed_storage as storage
+from tools.read_cache import subpage_cache
+from tools.subpage_store import record_name
+
+RECORD_BLOCK_BYTES = int(os.environ.get("RECORD_BLOCK_BYTES", 64 * 1024))
+INDEX_VERSION = 1
+REWRITE_PAGE = 500  # records per page when converting an old file
+
+
+def index_path(path) -> str:
+    return f"{path}.idx"
+
+
+def _iter_pages(value):
+    """Accepts a list of records or a generator of pages and yields pages."""
+    if isinstance(value, list):
+        if value:
+            yield value
+    elif value is not None:
+        yield from value
+
+
+# ─── Writing ──────────────────────────────────────────────────────────────────
+
+def write_records(path, pages, if_stamp: list | None = None) -> int:
+    """
+    Writes records page by page as compressed NDJSON blocks plus their sidecar
+    index, and returns the record count. The data file is replaced atomically
+    once complete (only if it still has `if_stamp`, when given).
+    """
+    compress = storage.block_compressor(path)
+    blocks, ids, names = [], {}, {}
+    count = offset = 0
+    buffer, buffered, first = [], 0, 0
+
+    with storage.atomic_writer(path, binary=True, if_stamp=if_stamp) as f:
+        def flush():
+            nonlocal offset, buffer, buffered, first
+            if buffer:
+                block = compress("".join(buffer).encode("utf-8"))
+                f.write(block)
+                blocks.append([offset, len(block), first])
+                offset += len(block)
+                buffer, buffered, first = [], 0, count
+
+        for page in _iter_pages(pages):
+            for record in page:
+                line = json.dumps(record) + "\n"
+                if record.get("id") is not None:
+                    ids[str(record["id"])] = count
+                name = record_name(record)
+                if name:
+                    names.setdefault(name.lower(), []).append(count)
+                buffer.append(line)
+                buffered += len(line)
+                count += 1
+                if buffered >= RECORD_BLOCK_BYTES:
+                    flush()
+        flush()
+
+    # Written after the data: until then readers see a stale stamp and read sequentially
+    storage.write_json(index_path(path), {"version": INDEX_VERSION, "stamp": storage.stamp(path), "count": count,
+                                          "blocks": blocks, "ids": ids, "names": names})
+    return count
+
+
+# ─── Sequential reads ─────────────────────────────────────────────────────────
+
+def iter_records(path):
+    """
+    Yields every record in file order, decompressing as it reads. Also reads
+    files from before this format: a JSON array with one record per line, or any
+    JSON array (json.load).
+    """
+    with storage.open_read(path) as f:
+        yield from _iter_stream(f)
+
+
+def _iter_stream(f):
+    first = f.readline()
+    head = first.strip()
+    if head == "[":
+        for line in f:
+            line = line.strip().rstrip(",")
+            if line and line != "]":
+                yield json.loads(line)
+        return
+    if head.startswith("{") and head.endswith("}"):
+        try:
+            record = json.loads(head)
+        except ValueError:
+            record = None
+        if record is not None:
+            yield record
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+    if not head:
+        return
+    data = json.loads(first + f.read())
+    yield from (data if isinstance(data, list) else [])
+
+
+def rewrite_records(path, stream) -> int:
+    """
+    Rewrites a record file from an open text stream of its stored bytes (in any
+    codec), with fresh blocks and index; used by compressed_storage.migrate_file.
+    """
+    return write_records(path, _chunks(_iter_stream(stream), REWRITE_PAGE))
+
+
+# ─── Random access ────────────────────────────────────────────────────────────
+
+def load_index(path) -> dict | None:
+    """The sidecar index of `path` if it describes the file as stored now, else None."""
+    stamp = storage.stamp(path)
+    idx_stamp = storage.stamp(index_path(path))
+    if stamp is None or idx_stamp is None:
+        return None
+
+    def load():
+        return storage.read_json(index_path(path)), idx_stamp[0]
+    try:
+        index = subpage_cache.get_or_load(("index", str(path)), tuple(idx_stamp), load)
+    except (FileNotFoundError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("stamp") != stamp:
+        return None
+    return index
+
+
+def ensure_index(path) -> dict | None:
+    """Index of `path`, converting a file from before this format first; None without a file."""
+    index = load_index(path)
+    if index is not None:
+        return index
+    stamp = storage.stamp(path)
+    if stamp is None:
+        return None
+    try:
+        records = iter_records(path)
+        write_records(path, _chunks(records, REWRITE_PAGE), if_stamp=stamp)
+        print(f"[RecordFiles] Indexed {path}")
+    except storage.ConcurrentWriteError:
+        pass  # a sync rewrote it meanwhile, with an index
+    return load_index(path)
+
+
+def _chunks(records, size):
+    page = []
+    for record in records:
+        page.append(record)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _read(path, index: dict, numbers: list[int]) -> list[dict] | None:
+    """Records with the given record numbers (in that order); None if the file changed under the index."""
+    if not numbers:
+        return []
+    firsts = [b[2] for b in index["blocks"]]
+    wanted = {}
+    for n in numbers:
+        wanted.setdefault(bisect.bisect_right(firsts, n) - 1, []).append(n)
+
+    physical = storage.resolve(path, migrate=False)
+    if physical is None:
+        return None
+    found = {}
+    with open(physical, "rb") as f:
+        st = os.fstat(f.fileno())
+        if [st.st_size, st.st_mtime_ns] != index["stamp"]:
+            return None  # replaced after the index was loaded
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            for b, block_numbers in wanted.items():
+                offset, length, first = index["blocks"][b]
+                lines = storage.decompress_block(m[offset:offset + length], physical).decode("utf-8").splitlines()
+                for n in block_numbers:
+                    found[n] = json.loads(lines[n - first])
+    return [found[n] for n in numbers]
+
+
+def read_page(path, start: int = 0, count: int = 50) -> list[dict] | None:
+    """Records start..start+count-1 in file order; None when the file is missing or cannot be indexed."""
+    index = ensure_index(path)
+    if index is None:
+        return None
+    numbers = list(range(max(0, start), min(index["count"], max(0, start) + max(0, count))))
+    return _read(path, index, numbers)
+
+
+def find_records(path, record_id: str | None = None, name: str | None = None) -> list[dict] | None:
+    """
+    Records matching an id or an exact (case-insensitive) name, in file order;
+    None when the file is missing or cannot be indexed.
+    """
+    index = ensure_index(path)
+    if index is None:
+        return None
+    numbers = set()
+    if record_id is not None and str(record_id) in index["ids"]:
+        numbers.add(index["ids"][str(record_id)])
+    if name:
+        numbers.update(index["names"].get(name.lower(), []))
+    return _read(path, index, sorted(numbers))
+
+
+def record_count(path) -> int | None:
+    index = ensure_index(path)
+    return index["count"] if index else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert subpage record files to indexed NDJSON.")
+    parser.add_argument("command", choices=("reindex",))
+    parser.add_argument("--root", default=str(storage.DATA_DIR / "subpages"))
+    args = parser.parse_args()
+
+    converted = 0
+    for event_dir in sorted(Path(args.root).iterdir()):
+        for data_type in ("exhibitors", "people", "plannings", "sponsors"):
+            path = event_dir / f"{data_type}.json"
+            if storage.exists(path) and load_index(path) is None:
+                converted += ensure_index(path) is not None
+    print(f"[RecordFiles] Converted {converted} files under {args.root}")
@@ -0,0 +1,155 @@
+"""
+tools/row_hashes.py
+
+Content-hash change detection for normalized Supabase rows.
+
+Each row gets a stable hash of its normalized content (canonical JSON, with
+volatile columns such as `updated_at` left out). A local index per table maps
+row id → last written hash, so a sync only upserts rows whose hash changed and
+identical data is no longer rewritten on every run.
+
+Rows are keyed by (event_id, id): the same exhibitor or person is listed by
+several events, and a bare id would let each event's row overwrite the others'
+hash. Indexes live in data/row_hashes/<table>.json:
+    { "<event id>|<row id>": "<hash>" }
+Entries from the older bare-id format are dropped on load.
+
+A missing index (fresh deploy, Vercel /tmp wiped) just means every row is
+written once and the index is rebuilt. `save()` merges this process's changes
+into the file (tools/state_files.py), so sync workers writing rows of different
+events into the same table keep each other's hashes.
+
+Set SYNC_HASH_COLUMN=1 once the `content_hash` column exists (see
+tools/migrate_content_hash_columns.py) to also store the hash on each row.
+
+Usage:
+    from tools.row_hashes import RowHashIndex
+
+    index = RowHashIndex("event_people")
+    changed, counts = index.diff(rows)
+    ...upsert changed...
+    index.record(written_rows)
+    index.forget([(event_id, row_id)])   # deleted rows
+    index.save()
+"""
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+from tools.state_files import update_json_file
+
+# Same storage root as tools/get_subpages.py (Vercel only allows writes in /tmp)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+HASH_DIR = DATA_DIR / "row_hashes"
+
+SYNC_ROW_HASHES = os.environ.get("SYNC_ROW_HASHES", "1") == "1"
+SYNC_HASH_COLUMN = os.environ.get("SYNC_HASH_COLUMN", "0") == "1"
+
+VOLATILE_COLUMNS = ("updated_at", "content_hash")
+ROW_KEY = ("event_id", "id")
+KEY_SEP = "|"
+
+
+def content_hash(row: dict, exclude=VOLATILE_COLUMNS) -> str:
+    """Stable hash of a row's content; key order and volatile columns do not affect it."""
+    content = {k: v for k, v in row.items() if k not in exclude}
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class RowHashIndex:
+    """Thread-safe JSON-backed map of row key (event_id, id) → content hash for one table."""
+
+    def __init__(self, table: str, directory: Path = HASH_DIR, key: tuple = ROW_KEY):
+        self.table = table
+        self.key = key
+        self.path = Path(directory) / f"{table}.json"
+        self._lock = threading.Lock()
+        self._hashes: dict[str, str] = {}
+        self._changed: set[str] = set()  # row keys recorded or forgotten since the last save
+        self._cleared = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._hashes = {k: v for k, v in json.load(f).items() if self._current(k)}
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._hashes = {}
+        except Exception as e:
+            print(f"[RowHashes] Could not read {self.path}: {e}")
+
+    def _current(self, stored: str) -> bool:
+        return stored.count(KEY_SEP) == len(self.key) - 1
+
+    def row_key(self, row: dict) -> str:
+        return KEY_SEP.join(str(row.get(column)) for column in self.key)
+
+    def diff(self, rows: list[dict]) -> tuple[list[dict], dict]:
+        """
+        Splits rows into the ones that need writing.
+
+        Returns (changed_rows, {"unchanged": n, "inserted": n, "updated": n}).
+        Each returned row has its hash in `content_hash` when SYNC_HASH_COLUMN is on.
+        """
+        counts = {"unchanged": 0, "inserted": 0, "updated": 0}
+        changed = []
+        with self._lock:
+            for row in rows:
+                h = content_hash(row)
+                previous = self._hashes.get(self.row_key(row))
+                if previous == h:
+                    counts["unchanged"] += 1
+                    continue
+                counts["inserted" if previous is None else "updated"] += 1
+                if SYNC_HASH_COLUMN:
+                    row["content_hash"] = h
+                changed.append(row)
+        return changed, counts
+
+    def record(self, rows: list[dict]):
+        """Stores the hashes of rows that were written successfully."""
+        with self._lock:
+            for row in rows:
+                k = self.row_key(row)
+                self._hashes[k] = row.get("content_hash") or content_hash(row)
+                self._changed.add(k)
+
+    def forget(self, keys=None):
+        """
+        Drops some (or all) hashes so those rows are rewritten next sync; `keys`
+        are tuples of the key columns' values, e.g. (event_id, id).
+        """
+        with self._lock:
+            if keys is None:
+                self._hashes.clear()
+                self._changed.clear()
+                self._cleared = True
+            else:
+                for values in keys:
+                    k = KEY_SEP.join(str(v) for v in values)
+                    self._hashes.pop(k, None)
+                    self._changed.add(k)
+
+    def save(self):
+        with self._lock:
+            if not self._changed and not self._cleared:
+                return
+
+            def apply(hashes):
+                if self._cleared:
+                    hashes.clear()
+                for stale in [k for k in hashes if not self._current(k)]:
+                    del hashes[stale]
+                for k in self._changed:
+                    if k in self._hashes:
+                        hashes[k] = self._hashes[k]
+                    else:
+                        hashes.pop(k, None)
+
+            try:
+                self._hashes = update_json_file(self.path, apply)
+                self._changed.clear()
+                self._cleared = False
+            except Exception as e:
+                print(f"[RowHashes] Could not save {self.path}: {e}")
@@ -0,0 +1,59 @@
+"""
+tools/state_files.py
+
+Merge-on-save for the JSON state files shared by sync processes.
+
+Watermarks, row-hash indexes, the freshness schedule and the subpage stats
+manifest are each one JSON file that a sync loads, updates in memory and writes
+back. With several sync worker processes (sync_worker.py) writing the same file,
+a plain rewrite would drop whatever another process saved in between. Saving
+through `update_json_file()` instead re-reads the file under an exclusive OS
+file lock, applies only this process's changes to it and atomically replaces it.
+
+Usage:
+    from tools.state_files import update_json_file
+
+    def apply(data):
+        data.setdefault("subpages", {})[event_id] = fingerprint
+
+    merged = update_json_file(path, apply)   # returns the merged contents
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: only writers inside this process are serialized
+    fcntl = None
+
+_thread_lock = threading.Lock()
+
+
+def update_json_file(path: Path, mutate, indent: int | None = None, default=dict):
+    """
+    Applies `mutate(data)` to the file's current contents (`default()` when it is
+    missing) under a lock, writes the result back and returns it.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _thread_lock, open(path.with_suffix(".lock"), "a+") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = default()
+            mutate(data)
+            tmp = path.with_suffix(f".json.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=indent)
+            os.replace(tmp, path)
+            return data
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
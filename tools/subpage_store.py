@@ -0,0 +1,436 @@
+"""
+tools/subpage_store.py
+
+Indexed local store for subpage records (exhibitors, people, plannings, sponsors).
+
+Reading `data/subpages/<event>/<type>.json` with json.load parses up to 4 MB per
+call, and the global fallback (`data/<type>.json`, every event combined) was
+parsed whole and filtered in a linear scan. This store keeps the same records
+in SQLite (WAL mode, one file next to the job table), one table per data type:
+
+    <type>(source, event_id, position, id, name, updated_at,
+           type, country, industry, booth, data)
+
+    source      "event" (per-event file) | "global" (data/<type>.json)
+    position    the record's index in its file, so reads keep the file order
+    name        name, title or "firstName lastName"
+    type ...    filter / sort facets (see record_facets); industry holds every
+                selected value as "|a|b|"
+    data        the record as JSON
+
+keyed by (source, event_id, position) and indexed by (event_id, id), id, name and
+updated_at, so a per-event read is one index range scan and a record lookup is
+a point query. `query()` pages one event's records with filters on the facets,
+a sort and an opaque keyset cursor (/api/subpages/{event_id}/{data_type}).
+
+The JSON files remain what the sync streams pages into (and what the member
+roster and webhook patches rewrite); `save_event_data` indexes an event's files
+into the store in one transaction once they are complete. A `sources` table
+records each file's size and mtime when it was indexed, and readers re-index a
+file whose stamp changed, so the store never serves records older than the
+files.
+
+Configuration (environment variables):
+    SUBPAGES_DB      SQLite file (default data/subpages.db)
+    SUBPAGES_STORE   Set to 0 to read the JSON files directly (default 1)
+
+Usage:
+    from tools.subpage_store import get_store
+
+    store = get_store()
+    store.replace_event(event_id, {"people": (records, stamp)})
+    if store.ensure_current("people", event_id, path, read_file):
+        for record in store.iter_records("people", event_id):
+            ...
+    records, next_cursor, total = store.query("exhibitors", event_id, filters={"country": ["France"]},
+                                              sort="name", limit=50)
+"""
+
+import os
+import json
+import base64
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tools import compressed_storage as storage
+
+# Same storage root as tools/get_subpages.py (Vercel only allows writes in /tmp)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+STORE_DB = Path(os.environ.get("SUBPAGES_DB") or DATA_DIR / "subpages.db")
+SUBPAGES_STORE = os.environ.get("SUBPAGES_STORE", "1") == "1"
+
+DATA_TYPES = ("exhibitors", "people", "plannings", "sponsors")
+GLOBAL = "*"  # sources key of a global data/<type>.json file
+SCHEMA_VERSION = 2  # the store is derived from the files: an older schema is dropped and re-indexed
+
+FILTER_COLUMNS = ("type", "country", "industry", "booth")
+SORT_COLUMNS = ("position", "name", "updated_at", *FILTER_COLUMNS)
+
+_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {t} (
+    source     TEXT NOT NULL,
+    event_id   TEXT NOT NULL,
+    position   INTEGER NOT NULL,
+    id         TEXT,
+    name       TEXT COLLATE NOCASE,
+    updated_at TEXT,
+    type       TEXT COLLATE NOCASE,
+    country    TEXT COLLATE NOCASE,
+    industry   TEXT COLLATE NOCASE,
+    booth      TEXT COLLATE NOCASE,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (source, event_id, position)
+);
+CREATE INDEX IF NOT EXISTS {t}_record_idx ON {t} (event_id, id);
+CREATE INDEX IF NOT EXISTS {t}_id_idx ON {t} (id);
+CREATE INDEX IF NOT EXISTS {t}_name_idx ON {t} (name);
+CREATE INDEX IF NOT EXISTS {t}_updated_idx ON {t} (updated_at);
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    data_type  TEXT NOT NULL,
+    event_id   TEXT NOT NULL,
+    size       INTEGER,
+    mtime_ns   INTEGER,
+    records    INTEGER NOT NULL,
+    scoped     INTEGER NOT NULL DEFAULT 1,
+    indexed_at TEXT NOT NULL,
+    PRIMARY KEY (data_type, event_id)
+);
+""" + "".join(_TABLE_SCHEMA.format(t=t) for t in DATA_TYPES)
+
+
+def file_stamp(path) -> list | None:
+    """[size, mtime_ns] of the (compressed) file stored for a path, or None when there is none."""
+    return storage.stamp(path)
+
+
+def record_name(record: dict) -> str | None:
+    name = record.get("name") or record.get("title")
+    if not name and (record.get("firstName") or record.get("lastName")):
+        name = " ".join(p for p in (record.get("firstName"), record.get("lastName")) if p)
+    return name or None
+
+
+def record_facets(record: dict) -> tuple:
+    """(type, country, industry, booth) of a record, as /api/subpages filters on them."""
+    industries = []
+    for field in record.get("fields") or []:
+        if (field.get("definition") or {}).get("name") == "Company Industry":
+            value = field.get("multipleSelectValue") or field.get("selectValue") or field.get("textValue")
+            industries = [str(v) for v in (value if isinstance(value, list) else [value]) if v]
+            break
+    booths = (record.get("withEvent") or {}).get("booths") or []
+    return (record.get("type"), (record.get("address") or {}).get("country"),
+            f"|{'|'.join(industries)}|" if industries else None,
+            (booths[0] or {}).get("name") if booths else None)
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != 5:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _table(data_type: str) -> str:
+    if data_type not in DATA_TYPES:
+        raise ValueError(f"Unknown subpage data type '{data_type}'")
+    return data_type
+
+
+class SubpageStore:
+    """SQLite-backed subpage records; every call opens its own connection, so it is safe across threads and processes."""
+
+    def __init__(self, path: Path = STORE_DB):
+        self.path = Path(path)
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout = 30000")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode = WAL")
+                    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                        conn.executescript("".join(f"DROP TABLE IF EXISTS {t};" for t in ("sources", *DATA_TYPES)))
+                        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                    conn.executescript(_SCHEMA)
+                    self._ready = True
+        return conn
+
+    # ── Writes ──────────────────────────────────────────────────────────────
+
+    def _replace(self, conn, data_type: str, event_id: str, records, stamp) -> int:
+        table = _table(data_type)
+        source = "global" if event_id == GLOBAL else "event"
+        if source == "global":
+            conn.execute(f"DELETE FROM {table} WHERE source = 'global'")
+        else:
+            conn.execute(f"DELETE FROM {table} WHERE source = 'event' AND event_id = ?", (event_id,))
+        count, scoped = 0, 1
+
+        def rows():
+            nonlocal count, scoped
+            for position, record in enumerate(records):
+                if not isinstance(record, dict):
+                    continue
+                count += 1
+                owner = event_id
+                if source == "global":
+                    # Records of a global file carry their event; files without one belong to every event
+                    owner = record.get("eventId") or ""
+                    scoped = scoped and bool(owner)
+                rid = record.get("id")
+                yield (source, owner, position, str(rid) if rid is not None else None, record_name(record),
+                       record.get("updatedAt"), *record_facets(record), json.dumps(record))
+
+        conn.executemany(f"INSERT OR REPLACE INTO {table} (source, event_id, position, id, name, updated_at, "
+                         f"type, country, industry, booth, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows())
+        size, mtime_ns = stamp or (None, None)
+        conn.execute("INSERT OR REPLACE INTO sources (data_type, event_id, size, mtime_ns, records, scoped, indexed_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (data_type, event_id, size, mtime_ns, count, int(scoped),
+                      datetime.now(timezone.utc).isoformat()))
+        return count
+
+    def replace_event(self, event_id: str, types: dict) -> dict:
+        """
+        Replaces an event's records of each data type in one transaction.
+
+        `types` maps data type → (records iterable, file stamp); returns {data type: count}.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            counts = {dt: self._replace(conn, dt, event_id, records, stamp)
+                      for dt, (records, stamp) in types.items()}
+            conn.execute("COMMIT")
+            return counts
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def drop(self, data_type: str, event_id: str):
+        """Forgets the records of one source (its file was removed)."""
+        table = _table(data_type)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if event_id == GLOBAL:
+                conn.execute(f"DELETE FROM {table} WHERE source = 'global'")
+            else:
+                conn.execute(f"DELETE FROM {table} WHERE source = 'event' AND event_id = ?", (event_id,))
+            conn.execute("DELETE FROM sources WHERE data_type = ? AND event_id = ?", (data_type, event_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # ── Freshness ───────────────────────────────────────────────────────────
+
+    def source(self, data_type: str, event_id: str) -> dict | None:
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM sources WHERE data_type = ? AND event_id = ?",
+                               (data_type, event_id)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def ensure_current(self, data_type: str, event_id: str, path, read_file) -> bool:
+        """
+        Makes the store match the file at `path` (re-indexing it with
+        `read_file(path)` when its stamp changed); returns False when there is no
+        such file, so the caller falls back to the next source.
+        """
+        stamp = file_stamp(path)
+        if stamp is None:
+            if self.source(data_type, event_id):
+                self.drop(data_type, event_id)
+            return False
+        count = self.ensure_version(data_type, event_id, stamp, lambda: read_file(path))
+        if count is not None:
+            print(f"[SubpageStore] Indexed {count} {data_type} from {path}")
+        return True
+
+    def ensure_version(self, data_type: str, event_id: str, stamp: list, load) -> int | None:
+        """
+        Replaces the records of (data type, event) with `load()` unless they were
+        indexed at `stamp` ([size, mtime_ns] or any other pair of integers that
+        changes with the data); returns the new record count, or None if current.
+        """
+        known = self.source(data_type, event_id)
+        if known and [known["size"], known["mtime_ns"]] == stamp:
+            return None
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Another reader may have indexed the same file while we waited for the lock
+            row = conn.execute("SELECT size, mtime_ns FROM sources WHERE data_type = ? AND event_id = ?",
+                               (data_type, event_id)).fetchone()
+            if row and list(row) == stamp:
+                conn.execute("COMMIT")
+                return None
+            count = self._replace(conn, data_type, event_id, load(), stamp)
+            conn.execute("COMMIT")
+            return count
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # ── Reads ───────────────────────────────────────────────────────────────
+
+    def iter_records(self, data_type: str, event_id: str, source: str = "event"):
+        """Yields one event's records in file order, straight from the index."""
+        table = _table(data_type)
+        query = f"SELECT data FROM {table} WHERE source = ? AND event_id = ? ORDER BY position"
+        args = (source, event_id)
+        if source == "global":
+            known = self.source(data_type, GLOBAL)
+            if known and not known["scoped"]:
+                # Global file without eventId fields: the records belong to every event
+                query, args = f"SELECT data FROM {table} WHERE source = 'global' ORDER BY position", ()
+        conn = self._connect()
+        try:
+            for (data,) in conn.execute(query, args):
+                yield json.loads(data)
+        finally:
+            conn.close()
+
+    def get_record(self, data_type: str, event_id: str, record_id: str) -> dict | None:
+        """Point lookup of one record of one event."""
+        table = _table(data_type)
+        conn = self._connect()
+        try:
+            row = conn.execute(f"SELECT data FROM {table} WHERE event_id = ? AND id = ? "
+                               f"ORDER BY source = 'global' LIMIT 1", (event_id, record_id)).fetchone()
+            return json.loads(row[0]) if row else None
+        finally:
+            conn.close()
+
+    def find(self, data_type: str, record_id: str | None = None, name: str | None = None,
+             updated_since: str | None = None, event_id: str | None = None, limit: int = 100) -> list[dict]:
+        """
+        Per-event records matching every given filter; `name` is a case-insensitive
+        prefix. Each result carries its event as "eventId".
+        """
+        table = _table(data_type)
+        query, args = f"SELECT event_id, data FROM {table} WHERE source = 'event'", []
+        if record_id:
+            query, args = query + " AND id = ?", args + [record_id]
+        if event_id:
+            query, args = query + " AND event_id = ?", args + [event_id]
+        if name:
+            query, args = query + " AND name LIKE ? ESCAPE '\\'", args + [
+                name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"]
+        if updated_since:
+            query, args = query + " AND updated_at >= ?", args + [updated_since]
+        conn = self._connect()
+        try:
+            return [{**json.loads(data), "eventId": eid}
+                    for eid, data in conn.execute(query + " ORDER BY event_id, position LIMIT ?", (*args, limit))]
+        finally:
+            conn.close()
+
+    def query(self, data_type: str, event_id: str, filters: dict | None = None, sort: str = "position",
+              descending: bool = False, cursor: str | None = None, limit: int = 50,
+              source: str = "event") -> tuple[list[dict], str | None, int]:
+        """
+        One page of an event's records: `filters` maps a FILTER_COLUMNS facet to
+        accepted values (case-insensitive; any selected industry matches), `sort`
+        is one of SORT_COLUMNS (empty values last) and `cursor` continues after the
+        previous page. Returns (records, next cursor or None, total matches).
+        """
+        table = _table(data_type)
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort '{sort}'; use one of {', '.join(SORT_COLUMNS)}")
+        where, args = ["source = ?", "event_id = ?"], [source, event_id]
+        if source == "global":
+            known = self.source(data_type, GLOBAL)
+            if known and not known["scoped"]:
+                where, args = ["source = 'global'"], []  # as in iter_records
+        for column, values in (filters or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unknown filter '{column}'; use one of {', '.join(FILTER_COLUMNS)}")
+            values = [str(v) for v in values if str(v)]
+            if not values:
+                continue
+            if column == "industry":
+                where.append("(" + " OR ".join("industry LIKE ? ESCAPE '\\'" for _ in values) + ")")
+                args += ["%|" + v.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "|%"
+                         for v in values]
+            else:
+                where.append(f"{column} IN ({', '.join('?' for _ in values)})")
+                args += values
+
+        # Keyset order: (value missing, value, position); the cursor is the last row's key
+        empty = f"({sort} IS NULL)"
+        value = "position" if sort == "position" else f"COALESCE({sort}, '') COLLATE NOCASE"
+        order = "DESC" if descending else "ASC"
+        page_where, page_args = list(where), list(args)
+        if cursor:
+            c_sort, c_desc, c_empty, c_value, c_position = decode_cursor(cursor)
+            if c_sort != sort or bool(c_desc) != descending:
+                raise ValueError("Cursor belongs to a different sort")
+            op = "<" if descending else ">"
+            page_where.append(f"({empty} > ? OR ({empty} = ? AND ({value} {op} ? OR ({value} = ? AND position {op} ?))))")
+            page_args += [c_empty, c_empty, c_value, c_value, c_position]
+
+        conn = self._connect()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {' AND '.join(where)}", args).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {empty}, {value}, position, data FROM {table} WHERE {' AND '.join(page_where)} "
+                f"ORDER BY {empty} ASC, {value} {order}, position {order} LIMIT ?", (*page_args, limit + 1)).fetchall()
+        finally:
+            conn.close()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([sort, descending, *rows[-1][:3]])
+        return [json.loads(r[3]) for r in rows], next_cursor, total
+
+    def summary(self) -> dict:
+        """Indexed sources and records per data type."""
+        conn = self._connect()
+        try:
+            return {dt: {"sources": n, "records": r or 0} for dt, n, r in conn.execute(
+                "SELECT data_type, COUNT(*), SUM(records) FROM sources GROUP BY data_type")}
+        finally:
+            conn.close()
+
+
+_store = None
+
+
+def get_store() -> SubpageStore:
+    global _store
+    if _store is None:
+        _store = SubpageStore()
+    return _store
@@ -1,5 +1,10 @@
 import os
+import time
 from supabase import create_client, Client
+from postgrest import ReturnMethod
+from postgrest.exceptions import APIError
+
+from tools import sync_telemetry
 
 # Attempt to load from .env if it exists (local dev)
 try:
@@ -16,3 +21,143 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     print("[Supabase] Warning: Missing SUPABASE_URL or SUPABASE_ANON_KEY")
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+# ─── Bulk Upserts ─────────────────────────────────────────────────────────────
+UPSERT_CHUNK_SIZE = int(os.environ.get("SUPABASE_UPSERT_CHUNK_SIZE", 200))
+UPSERT_RETRIES = int(os.environ.get("SUPABASE_UPSERT_RETRIES", 2))
+
+
+# SQLSTATE classes worth retrying: connection, transaction rollback (deadlock,
+# serialization), insufficient resources, operator intervention (statement timeout)
+TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57")
+# SQLSTATE classes caused by the content of particular rows: cardinality (the same
+# row twice in one upsert), data exceptions, integrity constraints
+ROW_SQLSTATE_CLASSES = ("21", "22", "23")
+
+
+def _error_code(error: Exception) -> str:
+    return str(getattr(error, "code", None) or "")
+
+
+def _is_transient(error: Exception) -> bool:
+    """Network failures, 5xx / 408 / 429 and transient database errors; other API errors fail the same way again."""
+    if not isinstance(error, APIError):
+        return True  # transport errors (timeouts, dropped connections)
+    code = _error_code(error)
+    if code.isdigit() and len(code) == 3:  # HTTP status of a response without a JSON error
+        return code.startswith("5") or code in ("408", "429")
+    if code.startswith("PGRST"):
+        return code.startswith("PGRST0")  # PGRST0xx: PostgREST cannot reach the database
+    return code[:2] in TRANSIENT_SQLSTATE_CLASSES
+
+
+def _is_row_level(error: Exception) -> bool:
+    """Errors some rows of a batch can cause while others would succeed (worth splitting the batch)."""
+    return isinstance(error, APIError) and _error_code(error)[:2] in ROW_SQLSTATE_CLASSES
+
+
+def _upsert_with_retries(table: str, rows: list, on_conflict: str):
+    for attempt in range(UPSERT_RETRIES + 1):
+        try:
+            supabase.table(table).upsert(rows, on_conflict=on_conflict, returning=ReturnMethod.minimal).execute()
+            sync_telemetry.record_request("supabase", retry=attempt > 0)
+            return None
+        except Exception as e:
+            sync_telemetry.record_request("supabase", retry=attempt > 0, error=True)
+            if attempt == UPSERT_RETRIES or not _is_transient(e):
+                return e
+            time.sleep(min(2 ** attempt, 8))
+
+
+def conflict_key(row: dict, on_conflict: str = "id"):
+    """A row's value for the conflict column, or a tuple of values for a composite key ("event_id,id")."""
+    columns = on_conflict.split(",")
+    return row.get(columns[0]) if len(columns) == 1 else tuple(row.get(c) for c in columns)
+
+
+def upsert_chunked(table: str, rows: list[dict], chunk_size: int | None = None, on_conflict: str = "id") -> dict:
+    """
+    Upserts rows in chunked bulk requests with `Prefer: return=minimal`.
+
+    Rows are grouped by column set first: PostgREST bulk upserts write NULL for
+    keys a row omits, which would wipe columns a caller left out on purpose.
+
+    Only transient errors are retried. A chunk that fails with a row-level error
+    (bad value, constraint violation) is bisected until the bad rows are isolated,
+    so they are reported without dropping the rest of the chunk. Any other error
+    (unknown column or conflict target, auth, other 4xx) would fail every request
+    the same way, so it aborts the table: the remaining rows are reported failed
+    without further requests. So does a first single-row attempt that fails
+    exactly like its chunk did.
+
+    Rows must be unique by `on_conflict` within a call: Postgres rejects a bulk
+    upsert that would update the same row twice.
+
+    Returns:
+        {"upserted": [keys...], "failed": {key: "error"}, "requests": int, "aborted": "error" | None}
+        where a key is conflict_key(row, on_conflict)
+    """
+    chunk_size = max(1, chunk_size or UPSERT_CHUNK_SIZE)
+    result = {"upserted": [], "failed": {}, "requests": 0, "aborted": None}
+
+    def fail(batch, error):
+        for row in batch:
+            result["failed"][conflict_key(row, on_conflict)] = str(error)
+
+    def attempt(batch):
+        result["requests"] += 1
+        return _upsert_with_retries(table, batch, on_conflict)
+
+    def bisect(batch, chunk_error):
+        """Writes a failed chunk in halves; returns an error that should abort the table, or None."""
+        if len(batch) == 1:
+            row = batch[0]
+            print(f"[Supabase] Upsert into {table} failed for {conflict_key(row, on_conflict)}: {chunk_error}")
+            fail(batch, chunk_error)
+            return None
+        for half in (batch[:len(batch) // 2], batch[len(batch) // 2:]):
+            error = attempt(half)
+            if error is None:
+                result["upserted"].extend(conflict_key(r, on_conflict) for r in half)
+                continue
+            if not _is_row_level(error):
+                fail(half, error)
+                return error
+            if len(half) == 1 and not result["failed"] and not result["upserted"] and str(error) == str(chunk_error):
+                fail(half, error)
+                return error  # the very first row fails like the whole chunk: not about row content
+            aborted = bisect(half, error)
+            if aborted is not None:
+                return aborted
+        return None
+
+    groups: dict[tuple, list] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    chunks = [group[i:i + chunk_size] for group in groups.values() for i in range(0, len(group), chunk_size)]
+
+    for n, chunk in enumerate(chunks):
+        error = attempt(chunk)
+        if error is None:
+            result["upserted"].extend(conflict_key(r, on_conflict) for r in chunk)
+            continue
+        if _is_row_level(error) and len(chunk) > 1:
+            print(f"[Supabase] Bulk upsert of {len(chunk)} rows into {table} failed ({error}); isolating bad rows")
+            error = bisect(chunk, error)
+            if error is None:
+                continue
+        elif _is_row_level(error):
+            print(f"[Supabase] Upsert into {table} failed for {conflict_key(chunk[0], on_conflict)}: {error}")
+            fail(chunk, error)
+            continue
+        # Systemic failure: every further request would fail the same way
+        result["aborted"] = str(error)
+        done = set(result["upserted"]) | set(result["failed"])
+        remaining = [row for later in chunks[n:] for row in later if conflict_key(row, on_conflict) not in done]
+        fail(remaining, error)
+        print(f"[Supabase] Upsert into {table} aborted after {result['requests']} requests; "
+              f"{len(result['failed'])} rows not written: {error}")
+        break
+    sync_telemetry.record_rows(len(result["upserted"]))
+    return result
@@ -0,0 +1,261 @@
+"""
+tools/swapcard_client.py
+
+Shared, pooled HTTP client for the Swapcard Event Admin APIs (GraphQL and the
+analytics export stream).
+
+Every tool used to open a fresh `urllib.request.urlopen` connection per call,
+paying a full TCP + TLS handshake for every page of every event. This module
+keeps one keep-alive connection pool per process (and one per asyncio event
+loop for the async front-end) so consecutive requests reuse sockets.
+
+Configuration (environment variables):
+    SWAPCARD_HTTP2              "1" to negotiate HTTP/2 (requires the `h2` package)
+    SWAPCARD_HTTP_TIMEOUT       Read/write timeout in seconds (default 60)
+    SWAPCARD_CONNECT_TIMEOUT    Connect timeout in seconds (default 10)
+    SWAPCARD_MAX_CONNECTIONS    Pool size (default 20)
+    SWAPCARD_MAX_RETRIES        Retries after a 429 / 503 response (default 3)
+
+Every request first takes a token from `tools.rate_limiter.swapcard_limiter`,
+and 429 / `Retry-After` responses pause that shared bucket before retrying.
+Requests, response bytes, retries and throttles are reported to
+`tools.sync_telemetry` for the sync run in progress.
+
+Usage:
+    from tools.swapcard_client import post_graphql, apost_graphql
+
+    result = post_graphql(query, {"eventId": event_id})          # sync
+    result = await apost_graphql(query, {"eventId": event_id})   # asyncio
+"""
+
+import os
+import asyncio
+import importlib.util
+import threading
+import weakref
+from contextlib import contextmanager
+
+import httpx
+
+from tools.rate_limiter import swapcard_limiter, parse_retry_after
+from tools import sync_telemetry
+
+# ─── Constants ────────────────────────────────────────────────────────────────
+
+GRAPHQL_URL = "https://developer.swapcard.com/event-admin/graphql"
+ANALYTICS_URL = "https://developer.swapcard.com/event-admin/export/analytics"
+
+MAX_RETRIES = int(os.environ.get("SWAPCARD_MAX_RETRIES", 3))
+RETRY_STATUSES = (429, 503)
+
+HTTP_TIMEOUT = httpx.Timeout(
+    float(os.environ.get("SWAPCARD_HTTP_TIMEOUT", 60)),
+    connect=float(os.environ.get("SWAPCARD_CONNECT_TIMEOUT", 10)),
+)
+
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.environ.get("SWAPCARD_MAX_CONNECTIONS", 20)),
+    max_keepalive_connections=int(os.environ.get("SWAPCARD_MAX_CONNECTIONS", 20)),
+    keepalive_expiry=30,
+)
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 is opt-in and silently falls back to HTTP/1.1 when `h2` is missing."""
+    if os.environ.get("SWAPCARD_HTTP2") != "1":
+        return False
+    if importlib.util.find_spec("h2") is not None:
+        return True
+    print("[Swapcard] SWAPCARD_HTTP2=1 but the 'h2' package is not installed; using HTTP/1.1")
+    return False
+
+
+class SwapcardAPIError(RuntimeError):
+    """Raised when a Swapcard request fails and the caller asked for exceptions."""
+
+    def __init__(self, message: str, status_code: int | None = None, body: str | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+# ─── Client Pools ─────────────────────────────────────────────────────────────
+
+_sync_client: httpx.Client | None = None
+_sync_lock = threading.Lock()
+
+# AsyncClient instances are bound to the loop that created them, so scripts that
+# call asyncio.run() more than once each get their own pool.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _headers() -> dict:
+    return {
+        "Authorization": str(os.environ.get("SWAPCARD_API_KEY") or ""),
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+    }
+
+
+def get_client() -> httpx.Client:
+    """Returns the process-wide pooled sync client (thread-safe)."""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        with _sync_lock:
+            if _sync_client is None or _sync_client.is_closed:
+                _sync_client = httpx.Client(
+                    http2=_http2_enabled(),
+                    timeout=HTTP_TIMEOUT,
+                    limits=HTTP_LIMITS,
+                )
+    return _sync_client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the pooled async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=_http2_enabled(),
+            timeout=HTTP_TIMEOUT,
+            limits=HTTP_LIMITS,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def close():
+    """Closes the sync pool (async pools close with their loop)."""
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+
+
+async def aclose():
+    """Closes the async pool bound to the running loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+# ─── Throttling ───────────────────────────────────────────────────────────────
+
+def _retry_delay(resp: httpx.Response, attempt: int) -> float | None:
+    """Returns how long to back off for a throttled response, or None if not throttled."""
+    if resp.status_code not in RETRY_STATUSES:
+        return None
+    delay = parse_retry_after(resp.headers.get("retry-after"))
+    return delay if delay is not None else float(2 ** attempt)
+
+
+def _send(method: str, url: str, **kwargs) -> httpx.Response:
+    """Rate-limited request with Retry-After handling (sync)."""
+    client = get_client()
+    for attempt in range(MAX_RETRIES + 1):
+        swapcard_limiter.acquire()
+        resp = client.request(method, url, headers=_headers(), **kwargs)
+        swapcard_limiter.record_headers(resp.headers)
+        delay = _retry_delay(resp, attempt)
+        sync_telemetry.record_request("swapcard", nbytes=len(resp.content), retry=attempt > 0,
+                                      throttled=delay is not None, error=resp.status_code >= 400)
+        if delay is None or attempt == MAX_RETRIES:
+            return resp
+        swapcard_limiter.throttle(delay)
+    return resp
+
+
+async def _asend(method: str, url: str, **kwargs) -> httpx.Response:
+    """Rate-limited request with Retry-After handling (asyncio)."""
+    client = get_async_client()
+    for attempt in range(MAX_RETRIES + 1):
+        await swapcard_limiter.aacquire()
+        resp = await client.request(method, url, headers=_headers(), **kwargs)
+        swapcard_limiter.record_headers(resp.headers)
+        delay = _retry_delay(resp, attempt)
+        sync_telemetry.record_request("swapcard", nbytes=len(resp.content), retry=attempt > 0,
+                                      throttled=delay is not None, error=resp.status_code >= 400)
+        if delay is None or attempt == MAX_RETRIES:
+            return resp
+        swapcard_limiter.throttle(delay)
+    return resp
+
+
+# ─── GraphQL ──────────────────────────────────────────────────────────────────
+
+def _handle_failure(exc: Exception, raise_errors: bool):
+    if isinstance(exc, httpx.HTTPStatusError):
+        body = exc.response.text
+        print(f"[Swapcard] HTTP {exc.response.status_code}: {body[:500]}")
+        if raise_errors:
+            raise SwapcardAPIError(f"Swapcard HTTP {exc.response.status_code}: {body}",
+                                   status_code=exc.response.status_code, body=body) from exc
+    else:
+        print(f"[Swapcard] Request error: {exc}")
+        if raise_errors:
+            raise SwapcardAPIError(f"Swapcard request failed: {exc}") from exc
+    return None
+
+
+def post_graphql(query: str, variables: dict | None = None, raise_errors: bool = False) -> dict | None:
+    """
+    POSTs a GraphQL document over the shared pool.
+
+    Returns the decoded JSON body (which may itself contain `errors`), or None on
+    transport/HTTP failure unless `raise_errors` is True.
+    """
+    payload = {"query": query, "variables": variables or {}}
+    try:
+        resp = _send("POST", GRAPHQL_URL, json=payload)
+        resp.raise_for_status()
+        return resp.json()
+    except (httpx.HTTPError, ValueError) as e:
+        return _handle_failure(e, raise_errors)
+
+
+async def apost_graphql(query: str, variables: dict | None = None, raise_errors: bool = False) -> dict | None:
+    """Async counterpart of `post_graphql`."""
+    payload = {"query": query, "variables": variables or {}}
+    try:
+        resp = await _asend("POST", GRAPHQL_URL, json=payload)
+        resp.raise_for_status()
+        return resp.json()
+    except (httpx.HTTPError, ValueError) as e:
+        return _handle_failure(e, raise_errors)
+
+
+# ─── Analytics Export ─────────────────────────────────────────────────────────
+
+@contextmanager
+def stream_analytics(payload: dict, timeout: float = 300):
+    """
+    Opens the NDJSON analytics export as a streaming response.
+
+    Takes a limiter token (and retries on 429) before the stream starts; yields
+    the open `httpx.Response` so callers can iterate `resp.iter_lines()`.
+    Raises `SwapcardAPIError` on a non-2xx status.
+    """
+    client = get_client()
+    for attempt in range(MAX_RETRIES + 1):
+        swapcard_limiter.acquire()
+        with client.stream("POST", ANALYTICS_URL, json=payload, headers=_headers(),
+                           timeout=httpx.Timeout(timeout, connect=HTTP_TIMEOUT.connect)) as resp:
+            swapcard_limiter.record_headers(resp.headers)
+            delay = _retry_delay(resp, attempt)
+            if delay is not None and attempt < MAX_RETRIES:
+                sync_telemetry.record_request("swapcard", retry=attempt > 0, throttled=True)
+                swapcard_limiter.throttle(delay)
+                continue
+            if resp.status_code >= 400:
+                body = resp.read().decode("utf-8", errors="replace")
+                sync_telemetry.record_request("swapcard", nbytes=len(body), retry=attempt > 0, error=True)
+                raise SwapcardAPIError(f"Analytics API HTTP {resp.status_code}: {body}",
+                                       status_code=resp.status_code, body=body)
+            try:
+                yield resp
+            finally:
+                sync_telemetry.record_request("swapcard", nbytes=resp.num_bytes_downloaded, retry=attempt > 0)
+            return
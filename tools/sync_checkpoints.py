@@ -0,0 +1,131 @@
+"""
+tools/sync_checkpoints.py
+
+Resumable sync checkpoints.
+
+When a sync dies partway through (Vercel timeout, crash, restart) the next run
+used to start from the beginning, so a large account that always times out
+never finished. Each sync kind now keeps a journal of the units it completed,
+written as each event finishes a phase:
+
+    data/checkpoints/<sync>.jsonl
+        {"run_id": "...", "started_at": "..."}            ← header
+        {"phase": "fetch", "id": "<event id>", "fp": "..."} ← one line per unit
+
+Appending one line per unit keeps the cost of persisting progress constant,
+however many events the run covers. A run that completes calls `complete()`,
+which deletes the journal. If the journal is still there when the next run
+starts (and is younger than SYNC_CHECKPOINT_MAX_AGE minutes), that run resumes:
+`is_done()` reports the units already finished, so they are skipped. The
+fingerprint stored with each unit means an event that changed since is redone.
+
+Usage:
+    from tools.sync_checkpoints import SyncCheckpoint
+
+    cp = SyncCheckpoint("subpages")
+    if not cp.is_done("fetch", eid, fp):
+        ...fetch and save...
+        cp.mark("fetch", eid, fp)
+    ...
+    cp.complete()
+"""
+
+import os
+import json
+import uuid
+import threading
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+# Same storage root as tools/get_subpages.py (Vercel only allows writes in /tmp)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+CHECKPOINT_DIR = DATA_DIR / "checkpoints"
+
+SYNC_CHECKPOINTS = os.environ.get("SYNC_CHECKPOINTS", "1") == "1"
+CHECKPOINT_MAX_AGE_MIN = int(os.environ.get("SYNC_CHECKPOINT_MAX_AGE", 360))
+
+
+class SyncCheckpoint:
+    """Append-only journal of completed (phase, event) units for one sync kind."""
+
+    def __init__(self, name: str, directory: Path = CHECKPOINT_DIR, enabled: bool = SYNC_CHECKPOINTS):
+        self.name = name
+        self.enabled = enabled
+        self.path = Path(directory) / f"{name}.jsonl"
+        self._lock = threading.Lock()
+        self._done: dict[str, dict[str, str]] = {}
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.resumed = False
+        if enabled:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                started = datetime.fromisoformat(header["started_at"])
+                if datetime.now(timezone.utc) - started > timedelta(minutes=CHECKPOINT_MAX_AGE_MIN):
+                    print(f"[Checkpoint] Discarding stale {self.name} checkpoint from {header['started_at']}")
+                    self._reset()
+                    return
+                for line in f:
+                    try:
+                        unit = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash mid-write
+                    self._done.setdefault(unit["phase"], {})[unit["id"]] = unit.get("fp") or ""
+            self.run_id, self.started_at, self.resumed = header["run_id"], header["started_at"], True
+            done = sum(len(units) for units in self._done.values())
+            print(f"[Checkpoint] Resuming {self.name} run {self.run_id} from {self.started_at} "
+                  f"({done} units already done)")
+        except FileNotFoundError:
+            self._reset()
+        except Exception as e:
+            print(f"[Checkpoint] Could not read {self.path}: {e}; starting over")
+            self._reset()
+
+    def _reset(self):
+        self._done = {}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"run_id": self.run_id, "started_at": self.started_at}) + "\n")
+        except Exception as e:
+            print(f"[Checkpoint] Could not create {self.path}: {e}")
+
+    def is_done(self, phase: str, unit_id: str, fingerprint: str | None = None) -> bool:
+        if not self.enabled:
+            return False
+        with self._lock:
+            done = self._done.get(phase, {})
+            return unit_id in done and (fingerprint is None or done[unit_id] == (fingerprint or ""))
+
+    def mark(self, phase: str, unit_id: str, fingerprint: str | None = None):
+        """Records one completed unit; persisted immediately so a crash right after keeps it."""
+        if not self.enabled:
+            return
+        line = json.dumps({"phase": phase, "id": unit_id, "fp": fingerprint or ""}) + "\n"
+        with self._lock:
+            self._done.setdefault(phase, {})[unit_id] = fingerprint or ""
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                    f.flush()
+            except Exception as e:
+                print(f"[Checkpoint] Could not persist {phase}/{unit_id}: {e}")
+
+    def done_count(self, phase: str) -> int:
+        with self._lock:
+            return len(self._done.get(phase, {}))
+
+    def complete(self):
+        """The run finished: drop the journal so the next run starts fresh."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._done = {}
+            try:
+                self.path.unlink(missing_ok=True)
+            except Exception as e:
+                print(f"[Checkpoint] Could not remove {self.path}: {e}")
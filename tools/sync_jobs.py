@@ -0,0 +1,278 @@
+"""
+tools/sync_jobs.py
+
+Local job table coordinating the web app and the sync worker processes.
+
+With SYNC_MODE=workers the web process no longer syncs itself: endpoints and
+timers enqueue jobs here, and `sync_worker.py` processes claim and run them.
+JSON normalization then runs on other cores instead of competing with request
+handlers for the web process's GIL. The table lives in SQLite (WAL mode),
+which every process on the host can open, so there is no extra service to run.
+
+    jobs(id, kind, partition, params, status, trigger, worker, attempts,
+         enqueued_at, started_at, heartbeat_at, finished_at, result, error)
+
+    kind       "events" | "subpages" | "scheduled" | "records"
+    partition  a community id, an event id for "records" (webhook refreshes),
+               or "*" for account-wide jobs
+    status     queued → running → done | failed
+
+Rules:
+  * Enqueueing a (kind, partition) that is already queued returns the queued job
+    instead of adding a duplicate.
+  * A worker only claims a job when no other job of the same (kind, partition)
+    is running, so one community is never synced twice at once.
+  * Running jobs heartbeat. A job whose heartbeat is older than SYNC_JOB_TTL
+    seconds (its worker died) is requeued, up to SYNC_JOB_MAX_ATTEMPTS attempts,
+    unless a newer job for the same (kind, partition) is already queued.
+
+Configuration (environment variables):
+    SYNC_JOBS_DB            SQLite file (default data/sync_jobs.db)
+    SYNC_JOB_TTL            Seconds without a heartbeat before a job is requeued (default 300)
+    SYNC_JOB_MAX_ATTEMPTS   Attempts before a job is marked failed (default 3)
+    SYNC_JOB_HISTORY        Finished jobs kept in the table (default 500)
+
+Usage:
+    from tools.sync_jobs import get_queue
+
+    job_id = get_queue().enqueue("subpages", partition=community_id, trigger="manual")
+    job = get_queue().claim("host:123", owns=lambda partition: True)
+    get_queue().finish(job["id"], result)
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+# Same storage root as tools/get_subpages.py (Vercel only allows writes in /tmp)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+JOBS_DB = Path(os.environ.get("SYNC_JOBS_DB") or DATA_DIR / "sync_jobs.db")
+
+JOB_TTL = int(os.environ.get("SYNC_JOB_TTL", 300))
+JOB_MAX_ATTEMPTS = int(os.environ.get("SYNC_JOB_MAX_ATTEMPTS", 3))
+JOB_HISTORY = int(os.environ.get("SYNC_JOB_HISTORY", 500))
+
+JOB_KINDS = ("events", "subpages", "scheduled", "records")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind         TEXT NOT NULL,
+    partition    TEXT NOT NULL DEFAULT '*',
+    params       TEXT NOT NULL DEFAULT '{}',
+    status       TEXT NOT NULL DEFAULT 'queued',
+    trigger      TEXT,
+    worker       TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    enqueued_at  TEXT NOT NULL,
+    started_at   TEXT,
+    heartbeat_at TEXT,
+    finished_at  TEXT,
+    result       TEXT,
+    error        TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_key_idx ON jobs (kind, partition, status);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _row(row: sqlite3.Row | None) -> dict | None:
+    if row is None:
+        return None
+    job = dict(row)
+    job["params"] = json.loads(job["params"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class SyncJobQueue:
+    """SQLite-backed job table; every call opens its own connection, so it is safe across threads and processes."""
+
+    def __init__(self, path: Path = JOBS_DB):
+        self.path = Path(path)
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout = 30000")
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode = WAL")
+                    conn.executescript(_SCHEMA)
+                    self._ready = True
+        return conn
+
+    def enqueue(self, kind: str, partition: str = "*", params: dict | None = None, trigger: str = "api",
+                merge=None) -> int:
+        """
+        Queues a job (or returns the id of the identical job already queued, whose
+        params are updated with `params`, or combined by `merge(old, new)`).
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown sync job kind '{kind}'")
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute(
+                "SELECT id, params FROM jobs WHERE kind = ? AND partition = ? AND status = 'queued' LIMIT 1",
+                (kind, partition)).fetchone()
+            if existing:
+                # A forced refresh request upgrades the queued job rather than being dropped
+                current = json.loads(existing["params"] or "{}")
+                merged = merge(current, params or {}) if merge else {**current, **(params or {})}
+                conn.execute("UPDATE jobs SET params = ? WHERE id = ?", (json.dumps(merged), existing["id"]))
+                conn.execute("COMMIT")
+                return existing["id"]
+            cur = conn.execute(
+                "INSERT INTO jobs (kind, partition, params, trigger, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, partition, json.dumps(params or {}), trigger, _now()))
+            conn.execute("COMMIT")
+            return cur.lastrowid
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, worker: str, owns=None, kinds=None) -> dict | None:
+        """
+        Atomically marks the oldest claimable queued job as running for `worker`.
+
+        `owns(partition)` restricts the worker to its shard of partitions; a job
+        is skipped while another job with the same (kind, partition) is running.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            running = {(r["kind"], r["partition"]) for r in
+                       conn.execute("SELECT kind, partition FROM jobs WHERE status = 'running'")}
+            for row in conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id").fetchall():
+                if kinds and row["kind"] not in kinds:
+                    continue
+                if owns is not None and not owns(row["partition"]):
+                    continue
+                if (row["kind"], row["partition"]) in running:
+                    continue
+                now = _now()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, started_at = ?, "
+                    "heartbeat_at = ? WHERE id = ?", (worker, now, now, row["id"]))
+                conn.execute("COMMIT")
+                return self.get(row["id"])
+            conn.execute("COMMIT")
+            return None
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id: int) -> bool:
+        conn = self._connect()
+        try:
+            cur = conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                               (_now(), job_id))
+            return cur.rowcount > 0
+        finally:
+            conn.close()
+
+    def finish(self, job_id: int, result=None):
+        self._close(job_id, "done", result=result)
+
+    def fail(self, job_id: int, error: str):
+        self._close(job_id, "failed", error=error)
+
+    def _close(self, job_id: int, status: str, result=None, error: str | None = None):
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+                         (status, _now(), json.dumps(result, default=str) if result is not None else None,
+                          error, job_id))
+        finally:
+            conn.close()
+
+    def requeue_stale(self, ttl: int = JOB_TTL) -> int:
+        """Requeues running jobs whose worker stopped heartbeating; returns how many were recovered."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=ttl)).isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = conn.execute("SELECT id, kind, partition, attempts, worker FROM jobs "
+                                 "WHERE status = 'running' AND heartbeat_at < ?", (cutoff,)).fetchall()
+            for job in stale:
+                queued = conn.execute("SELECT id FROM jobs WHERE kind = ? AND partition = ? AND status = 'queued' "
+                                      "LIMIT 1", (job["kind"], job["partition"])).fetchone()
+                if queued or job["attempts"] >= JOB_MAX_ATTEMPTS:
+                    reason = f"superseded by job {queued['id']}" if queued else "stopped responding"
+                    conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                                 (_now(), f"worker {job['worker']} {reason}", job["id"]))
+                else:
+                    conn.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ?", (job["id"],))
+            # Keep the table small: drop the oldest finished jobs past the history limit
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND id NOT IN "
+                "(SELECT id FROM jobs WHERE status IN ('done', 'failed') ORDER BY id DESC LIMIT ?)", (JOB_HISTORY,))
+            conn.execute("COMMIT")
+            return len(stale)
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get(self, job_id: int) -> dict | None:
+        conn = self._connect()
+        try:
+            return _row(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        finally:
+            conn.close()
+
+    def list_jobs(self, limit: int = 50, status: str | None = None, kind: str | None = None) -> list[dict]:
+        query, args = "SELECT * FROM jobs WHERE 1 = 1", []
+        if status:
+            query, args = query + " AND status = ?", args + [status]
+        if kind:
+            query, args = query + " AND kind = ?", args + [kind]
+        conn = self._connect()
+        try:
+            return [_row(r) for r in conn.execute(query + " ORDER BY id DESC LIMIT ?", (*args, limit))]
+        finally:
+            conn.close()
+
+    def summary(self) -> dict:
+        """Job counts per kind and status, plus the workers currently running jobs."""
+        conn = self._connect()
+        try:
+            counts = {}
+            for r in conn.execute("SELECT kind, status, COUNT(*) AS n FROM jobs GROUP BY kind, status"):
+                counts.setdefault(r["kind"], {})[r["status"]] = r["n"]
+            workers = sorted({r["worker"] for r in
+                              conn.execute("SELECT worker FROM jobs WHERE status = 'running'") if r["worker"]})
+            return {"counts": counts, "active_workers": workers}
+        finally:
+            conn.close()
+
+
+_queue = None
+
+
+def get_queue() -> SyncJobQueue:
+    global _queue
+    if _queue is None:
+        _queue = SyncJobQueue()
+    return _queue
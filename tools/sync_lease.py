@@ -0,0 +1,331 @@
+"""
+tools/sync_lease.py
+
+Single-flight sync lease.
+
+The manual sync, the cron endpoint, each uvicorn worker's background loop and
+/api/subpages/sync can all fire at once. Running them in parallel multiplies
+Swapcard and Supabase load for the same data, so each sync kind ("events",
+"subpages") is guarded by a lease:
+
+  * Inside one process, a trigger that arrives while a run is in flight joins
+    that run (awaits the same task) instead of starting another.
+  * Across processes, the lease record names the holder and expires unless the
+    holder heartbeats. Releasing it records how the run ended (`finished_at`,
+    `outcome`). A trigger that finds a live lease held elsewhere waits for it:
+    if that run completed, the trigger returns without re-running; if it failed,
+    or its holder died and the lease expired, the trigger runs the sync itself.
+    `rerun=True` (force refresh) always runs once the lease is free, and a local
+    forced trigger that joins an unforced run starts its own run afterwards.
+  * `hold_lease` takes the same lease as a plain mutex for partial work (the
+    scheduler's refresh of a few events, one community's worker job): it never
+    joins, nothing joins it, and it releases with outcome "partial" so triggers
+    waiting for a full run still run their own.
+
+Backends (SYNC_LEASE_BACKEND):
+    "file"      data/sync_leases.json guarded by an OS file lock (default; covers
+                every worker on one host)
+    "supabase"  the `sync_leases` table (see tools/migrate_sync_leases_table.py),
+                for deployments whose instances do not share a disk
+
+Configuration (environment variables):
+    SYNC_LEASE_TTL          Seconds a lease lives without a heartbeat (default 120)
+    SYNC_LEASE_HEARTBEAT    Seconds between heartbeats (default 30)
+    SYNC_LEASE_WAIT         Max seconds to wait on a lease held elsewhere (default 1800)
+
+Usage:
+    from tools.sync_lease import single_flight
+
+    result = await single_flight("events", lambda: _run_events_sync(), trigger="cron")
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import threading
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from tools.blocking import run_blocking
+from tools import sync_telemetry
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: lease is then only exclusive per process
+    fcntl = None
+
+# Same storage root as tools/get_subpages.py (Vercel only allows writes in /tmp)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+LEASE_PATH = DATA_DIR / "sync_leases.json"
+
+SYNC_LEASE_BACKEND = os.environ.get("SYNC_LEASE_BACKEND", "file")
+LEASE_TTL = int(os.environ.get("SYNC_LEASE_TTL", 120))
+HEARTBEAT_INTERVAL = int(os.environ.get("SYNC_LEASE_HEARTBEAT", 30))
+LEASE_WAIT = int(os.environ.get("SYNC_LEASE_WAIT", 1800))
+
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _is_live(lease: dict | None) -> bool:
+    if not lease or not lease.get("expires_at"):
+        return False
+    return datetime.fromisoformat(lease["expires_at"]) > _now()
+
+
+def _new_lease(name: str, run_id: str, trigger: str) -> dict:
+    now = _now()
+    return {
+        "name": name,
+        "holder": HOLDER_ID,
+        "run_id": run_id,
+        "trigger": trigger,
+        "acquired_at": now.isoformat(),
+        "heartbeat_at": now.isoformat(),
+        "expires_at": (now + timedelta(seconds=LEASE_TTL)).isoformat(),
+        "finished_at": None,
+        "outcome": None,
+    }
+
+
+def _finished(outcome: str) -> dict:
+    """Fields that release a lease while recording how its run ended."""
+    now = _now().isoformat()
+    return {"finished_at": now, "outcome": outcome, "expires_at": now}
+
+
+# ─── Backends ─────────────────────────────────────────────────────────────────
+
+class FileLeaseBackend:
+    """Leases in one JSON file; read-modify-write happens under an exclusive flock."""
+
+    def __init__(self, path: Path = LEASE_PATH):
+        self.path = Path(path)
+        self._thread_lock = threading.Lock()
+
+    def _locked(self, mutate):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._thread_lock, open(self.path.with_suffix(".lock"), "a+") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        leases = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    leases = {}
+                result, changed = mutate(leases)
+                if changed:
+                    tmp = self.path.with_suffix(".json.tmp")
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        json.dump(leases, f, indent=2)
+                    os.replace(tmp, self.path)
+                return result
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def acquire(self, name, run_id, trigger):
+        def mutate(leases):
+            current = leases.get(name)
+            if _is_live(current) and current.get("run_id") != run_id:
+                return None, False
+            leases[name] = _new_lease(name, run_id, trigger)
+            return leases[name], True
+        return self._locked(mutate)
+
+    def heartbeat(self, name, run_id):
+        def mutate(leases):
+            current = leases.get(name)
+            if not current or current.get("run_id") != run_id:
+                return False, False
+            now = _now()
+            current["heartbeat_at"] = now.isoformat()
+            current["expires_at"] = (now + timedelta(seconds=LEASE_TTL)).isoformat()
+            return True, True
+        return self._locked(mutate)
+
+    def release(self, name, run_id, outcome="completed"):
+        def mutate(leases):
+            current = leases.get(name)
+            if (current or {}).get("run_id") != run_id:
+                return False, False
+            current.update(_finished(outcome))
+            return True, True
+        return self._locked(mutate)
+
+    def get(self, name=None):
+        return self._locked(lambda leases: (leases.get(name) if name else dict(leases), False))
+
+
+class SupabaseLeaseBackend:
+    """Leases in the `sync_leases` table; takeover is a conditional UPDATE so only one caller wins."""
+
+    TABLE = "sync_leases"
+
+    def __init__(self):
+        from tools.supabase_client import supabase
+        self.client = supabase
+
+    def acquire(self, name, run_id, trigger):
+        lease = _new_lease(name, run_id, trigger)
+        try:
+            res = self.client.table(self.TABLE).insert(lease).execute()
+            if res.data:
+                return lease
+        except Exception:
+            pass  # row exists; try to take it over if it has expired
+        res = (self.client.table(self.TABLE).update(lease)
+               .eq("name", name).lt("expires_at", _now().isoformat()).execute())
+        return lease if res.data else None
+
+    def heartbeat(self, name, run_id):
+        now = _now()
+        res = (self.client.table(self.TABLE)
+               .update({"heartbeat_at": now.isoformat(),
+                        "expires_at": (now + timedelta(seconds=LEASE_TTL)).isoformat()})
+               .eq("name", name).eq("run_id", run_id).execute())
+        return bool(res.data)
+
+    def release(self, name, run_id, outcome="completed"):
+        res = (self.client.table(self.TABLE).update(_finished(outcome))
+               .eq("name", name).eq("run_id", run_id).execute())
+        return bool(res.data)
+
+    def get(self, name=None):
+        query = self.client.table(self.TABLE).select("*")
+        if name:
+            rows = query.eq("name", name).execute().data or []
+            return rows[0] if rows else None
+        return {r["name"]: r for r in (query.execute().data or [])}
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = SupabaseLeaseBackend() if SYNC_LEASE_BACKEND == "supabase" else FileLeaseBackend()
+    return _backend
+
+
+# ─── Single Flight ────────────────────────────────────────────────────────────
+
+_inflight: dict[str, asyncio.Task] = {}
+_inflight_info: dict[str, dict] = {}
+
+
+async def _heartbeat(name: str, run_id: str):
+    backend = get_backend()
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        try:
+            if not await run_blocking(backend.heartbeat, name, run_id):
+                print(f"[SyncLease] Lost lease '{name}' (run {run_id}); another holder may start a run")
+        except Exception as e:
+            print(f"[SyncLease] Heartbeat for '{name}' failed: {e}")
+
+
+async def _acquire_and_run(name: str, run_id: str, factory, trigger: str, rerun: bool = False,
+                           completed: str = "completed") -> dict:
+    backend = get_backend()
+    deadline = time.monotonic() + LEASE_WAIT
+    waited_on = set()  # runs seen holding the lease while this trigger waited
+    while True:
+        if waited_on and not rerun:
+            current = await run_blocking(backend.get, name) or {}
+            if current.get("run_id") in waited_on and current.get("outcome") == "completed":
+                # Another worker just finished this sync; do not repeat it straight away
+                return {"status": "joined_remote", "run_id": current["run_id"], "result": None}
+        lease = await run_blocking(backend.acquire, name, run_id, trigger)
+        if lease is not None:
+            break
+        holder = await run_blocking(backend.get, name) or {}
+        if holder.get("run_id") and holder["run_id"] not in waited_on:
+            print(f"[SyncLease] '{name}' held by {holder.get('holder')} ({holder.get('trigger')}); "
+                  f"{trigger} trigger waits for it")
+            waited_on.add(holder["run_id"])
+        if time.monotonic() > deadline:
+            return {"status": "timeout", "run_id": None, "result": None}
+        await asyncio.sleep(min(5, HEARTBEAT_INTERVAL))
+
+    if waited_on:
+        print(f"[SyncLease] '{name}' was released without a completed run (or rerun requested); "
+              f"{trigger} trigger runs it")
+    if _inflight_info.get(name, {}).get("run_id") == run_id:
+        _inflight_info[name]["started_at"] = lease["acquired_at"]
+    heartbeat = asyncio.create_task(_heartbeat(name, run_id))
+    outcome = "failed"
+    try:
+        with sync_telemetry.track_run(name, run_id=run_id, trigger=trigger):
+            result = await factory()
+        outcome = completed
+        return {"status": "ran", "run_id": run_id, "result": result}
+    finally:
+        heartbeat.cancel()
+        try:
+            await run_blocking(backend.release, name, run_id, outcome)
+        except Exception as e:
+            print(f"[SyncLease] Could not release '{name}': {e}")
+
+
+async def single_flight(name: str, factory, trigger: str = "manual", rerun: bool = False) -> dict:
+    """
+    Runs `factory()` (a coroutine factory) under the `name` lease, or joins the run
+    already in flight. With `rerun` (e.g. a force refresh) a run that started
+    without it is not enough: the trigger runs `factory()` itself once it is free.
+
+    Returns {"status": "ran" | "joined" | "joined_remote" | "timeout", "run_id", "result"}.
+    """
+    task = _inflight.get(name)
+    if task is not None and not task.done():
+        info = _inflight_info.get(name, {})
+        print(f"[SyncLease] '{name}' already running (run {info.get('run_id')}, {info.get('trigger')}); "
+              f"{trigger} trigger joins it")
+        outcome = await asyncio.shield(task)
+        if info.get("rerun") or not rerun:
+            return {**outcome, "status": "joined"}
+        print(f"[SyncLease] '{name}' run {info.get('run_id')} was not forced; {trigger} trigger runs after it")
+        return await single_flight(name, factory, trigger, rerun)
+
+    # Registered before the first await so concurrent local triggers always join this task
+    run_id = uuid.uuid4().hex[:12]
+    task = asyncio.create_task(_acquire_and_run(name, run_id, factory, trigger, rerun))
+    _inflight[name] = task
+    _inflight_info[name] = {"run_id": run_id, "trigger": trigger, "rerun": rerun, "started_at": None}
+    try:
+        return await asyncio.shield(task)
+    finally:
+        if task.done() and _inflight.get(name) is task:
+            _inflight.pop(name, None)
+            _inflight_info.pop(name, None)
+
+
+async def hold_lease(name: str, factory, trigger: str = "manual") -> dict:
+    """
+    Runs `factory()` under the `name` lease as a mutex, waiting for any run that
+    holds it. Partial work cannot stand in for a full run, so this neither joins
+    nor registers a run in flight, and its release records outcome "partial".
+
+    Returns the single_flight result shape ("ran" or "timeout").
+    """
+    return await _acquire_and_run(name, uuid.uuid4().hex[:12], factory, trigger, rerun=True, completed="partial")
+
+
+async def lease_status() -> dict:
+    """Current lease records plus the runs in flight in this process."""
+    leases = await run_blocking(get_backend().get)
+    return {
+        "backend": SYNC_LEASE_BACKEND,
+        "holder_id": HOLDER_ID,
+        "leases": {name: {**lease, "live": _is_live(lease)} for name, lease in (leases or {}).items()},
+        "local_inflight": {name: info for name, info in _inflight_info.items()
+                           if name in _inflight and not _inflight[name].done()},
+    }
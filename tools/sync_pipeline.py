@@ -0,0 +1,151 @@
+"""
+tools/sync_pipeline.py
+
+Staged sync pipeline connected by bounded asyncio queues.
+
+A sync is split into stages (e.g. event pages → subpage fetch → normalization →
+Supabase writer → image downloader). Every stage runs its own pool of workers
+and pulls from a bounded queue, so stages overlap: the writer is already
+upserting the first page of events while later pages are still being fetched.
+When a downstream stage falls behind, `emit()` blocks on the full queue and
+the upstream stage stops pulling more work (backpressure), so nothing buffers
+unbounded data. End-to-end time therefore tends towards the slowest stage
+rather than the sum of all of them.
+
+A stage handler is `async def handler(item, emit)`; it calls `await emit(out)`
+zero or more times. An optional `flush(emit)` runs once after the stage's input
+is exhausted (used by batching stages to write their last partial batch).
+Blocking work inside a handler should go through
+`tools.blocking.run_blocking(..., pool="sync")` so the event loop stays responsive.
+Each stage is a telemetry phase (tools/sync_telemetry.py) of the run in
+progress; feeding the source is the "source" phase.
+
+Configuration (environment variables):
+    SYNC_PIPELINE_QUEUE_SIZE   Max items waiting between two stages (default 64)
+
+Usage:
+    from tools.sync_pipeline import Stage, run_pipeline
+
+    async def normalize(page, emit):
+        for ev in page:
+            await emit(to_row(ev))
+
+    stats = await run_pipeline(event_pages, [
+        Stage("normalize", normalize),
+        Stage("write", write_rows, workers=2, flush=flush_rows),
+    ])
+"""
+
+import os
+import time
+import asyncio
+
+from tools.blocking import iterate_blocking
+from tools import sync_telemetry
+
+PIPELINE_QUEUE_SIZE = int(os.environ.get("SYNC_PIPELINE_QUEUE_SIZE", 64))
+
+_END = object()
+
+
+class Stage:
+    """One pipeline stage: `workers` concurrent copies of `handler` reading a shared queue."""
+
+    def __init__(self, name: str, handler, workers: int = 1, flush=None, maxsize: int | None = None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.flush = flush
+        self.maxsize = maxsize if maxsize is not None else PIPELINE_QUEUE_SIZE
+        self.stats = {"items_in": 0, "items_out": 0, "errors": 0, "busy_sec": 0.0, "max_queue_depth": 0}
+
+
+async def _drain_source(source, queue: asyncio.Queue):
+    """Feeds the first queue from an async iterator or a (blocking) sync iterable."""
+    if hasattr(source, "__aiter__"):
+        async for item in source:
+            await queue.put(item)
+        return
+    # Each next() may block on network I/O, so it runs on the sync pool
+    async for item in iterate_blocking(source, pool="sync"):
+        await queue.put(item)
+
+
+async def _run_stage(stage: Stage, inbox: asyncio.Queue, outbox: asyncio.Queue | None):
+    async def emit(item):
+        stage.stats["items_out"] += 1
+        if outbox is not None:
+            await outbox.put(item)
+            stage.stats["max_queue_depth"] = max(stage.stats["max_queue_depth"], outbox.qsize())
+
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is _END:
+                await inbox.put(_END)  # let sibling workers see the end marker too
+                return
+            stage.stats["items_in"] += 1
+            started = time.monotonic()
+            try:
+                with sync_telemetry.phase(stage.name):
+                    await stage.handler(item, emit)
+            except Exception as e:
+                stage.stats["errors"] += 1
+                with sync_telemetry.phase(stage.name):
+                    sync_telemetry.record_error()
+                print(f"[Pipeline] {stage.name} failed on one item: {e}")
+            finally:
+                stage.stats["busy_sec"] += time.monotonic() - started
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(stage.workers)))
+        if stage.flush is not None:
+            try:
+                with sync_telemetry.phase(stage.name):
+                    await stage.flush(emit)
+            except Exception as e:
+                stage.stats["errors"] += 1
+                print(f"[Pipeline] {stage.name} flush failed: {e}")
+    finally:
+        if outbox is not None:
+            await outbox.put(_END)
+
+
+async def run_pipeline(source, stages: list[Stage], name: str = "sync") -> dict:
+    """
+    Runs `source` through `stages` and returns per-stage stats.
+
+    Item-level handler errors are counted and logged without stopping the run.
+    If the source itself fails, the stages still drain what was already queued
+    and the source error is re-raised afterwards.
+    """
+    started = time.monotonic()
+    queues = [asyncio.Queue(maxsize=stage.maxsize) for stage in stages]
+
+    async def feed():
+        try:
+            with sync_telemetry.phase("source"):
+                await _drain_source(source, queues[0])
+        finally:
+            await queues[0].put(_END)
+
+    tasks = [feed()] + [
+        _run_stage(stage, queues[i], queues[i + 1] if i + 1 < len(stages) else None)
+        for i, stage in enumerate(stages)
+    ]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    stats = {
+        "pipeline": name,
+        "wall_sec": round(time.monotonic() - started, 3),
+        "stages": {s.name: {**s.stats, "busy_sec": round(s.stats["busy_sec"], 3), "workers": s.workers}
+                   for s in stages},
+    }
+    summary = ", ".join(f"{n} {st['items_in']}→{st['items_out']} ({st['busy_sec']}s busy)"
+                        for n, st in stats["stages"].items())
+    print(f"[Pipeline] {name} finished in {stats['wall_sec']}s: {summary}")
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        raise errors[0]
+    return stats
@@ -0,0 +1,316 @@
+"""
+tools/sync_scheduler.py
+
+Tiered freshness scheduler.
+
+The background loop used to resync everything on one `sync_interval_minutes`
+timer, so a 5-minute interval refetched years of Past events while a 60-minute
+one left Active lead counters an hour stale. Instead, every (category, data
+type) pair now has its own freshness budget, the longest a piece of data may go
+unsynced:
+
+                 leads     subpages   analytics
+    Active       5 min     30 min     1 h
+    Future       6 h       1 h        24 h
+    Past         frozen    frozen     frozen
+
+"Frozen" data is not kept fresh, but data last synced before the event ended
+is due once more, so an event that moves from Active to Past gets one final
+refresh of its closing numbers. A full sync (/api/subpages/sync, manual or
+cron) still fetches Past events that have nothing on disk yet.
+
+Events are registered with `track()` as the events sync sees them. Each one is
+queued per data type at the time its budget runs out, and `pop_due()` hands out
+the work that is due, hottest first (Active before Future before Past, leads
+before subpages, then most overdue). The cold bulk therefore only costs work
+when its own budget expires.
+
+Last-sync times are kept in data/sync_freshness.json:
+    { "<data type>": { "<event id>": <unix time> } }
+
+Sync worker processes share that file: `save()` merges (newest time wins) and
+`reload()` picks up refreshes other processes recorded.
+
+Configuration (environment variables):
+    SYNC_FRESHNESS_BUDGETS   JSON overrides in minutes, null = frozen,
+                             e.g. '{"Active.leads": 2, "Future.subpages": null}'
+    SYNC_SCHEDULER_BATCH     Max events per data type handed out per tick (default 25)
+
+Usage:
+    from tools.sync_scheduler import FreshnessScheduler
+
+    scheduler = FreshnessScheduler()
+    scheduler.track(ev, "Active")
+    for work in scheduler.pop_due():
+        ...refresh work["data_type"] for work["event_id"]...
+        scheduler.mark_synced(work["data_type"], [work["event_id"]])
+    scheduler.save()
+"""
+
+import os
+import json
+import time
+import heapq
+import itertools
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tools.state_files import update_json_file
+
+# Same storage root as tools/get_subpages.py (Vercel only allows writes in /tmp)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+FRESHNESS_PATH = DATA_DIR / "sync_freshness.json"
+
+CATEGORIES = ("Active", "Future", "Past")
+DATA_TYPES = ("leads", "subpages", "analytics")
+
+# Seconds each data type may stay unsynced; None = frozen (never scheduled)
+DEFAULT_BUDGETS = {
+    "Active": {"leads": 5 * 60, "subpages": 30 * 60, "analytics": 60 * 60},
+    "Future": {"leads": 6 * 3600, "subpages": 3600, "analytics": 24 * 3600},
+    "Past": {"leads": None, "subpages": None, "analytics": None},
+}
+
+SCHEDULER_BATCH = int(os.environ.get("SYNC_SCHEDULER_BATCH", 25))
+
+
+def _load_budgets() -> dict:
+    budgets = {cat: dict(types) for cat, types in DEFAULT_BUDGETS.items()}
+    raw = os.environ.get("SYNC_FRESHNESS_BUDGETS")
+    if not raw:
+        return budgets
+    try:
+        for key, minutes in json.loads(raw).items():
+            category, data_type = key.split(".", 1)
+            if category not in budgets or data_type not in DATA_TYPES:
+                raise ValueError(f"unknown budget '{key}'")
+            budgets[category][data_type] = None if minutes is None else int(float(minutes) * 60)
+    except Exception as e:
+        print(f"[Scheduler] Ignoring invalid SYNC_FRESHNESS_BUDGETS: {e}")
+    return budgets
+
+
+FRESHNESS_BUDGETS = _load_budgets()
+
+
+def freshness_budget(category: str | None, data_type: str) -> int | None:
+    """Seconds `data_type` may stay unsynced for events in `category` (None = frozen)."""
+    return FRESHNESS_BUDGETS.get(category or "Past", FRESHNESS_BUDGETS["Past"]).get(data_type)
+
+
+def event_ended_at(ev: dict) -> float | None:
+    """Unix time a Swapcard event ends (its `endsAt`), or None if unknown."""
+    try:
+        dt = datetime.fromisoformat(ev["endsAt"].replace("Z", "+00:00"))
+        return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+    except Exception:
+        return None
+
+
+def is_stale(category: str | None, data_type: str, last_synced: float | None, now: float | None = None,
+             ended_at: float | None = None) -> bool:
+    """
+    True when data last synced at `last_synced` (unix time, None = never) is past
+    its budget, or was last synced before the event ended at `ended_at` (the
+    final refresh even frozen data gets).
+    """
+    if last_synced is None:
+        return True
+    now = now or time.time()
+    if ended_at is not None and last_synced < ended_at <= now:
+        return True
+    budget = freshness_budget(category, data_type)
+    return budget is not None and now - last_synced >= budget
+
+
+class FreshnessScheduler:
+    """Priority queue of (data type, event) refreshes ordered by when each falls out of budget."""
+
+    def __init__(self, path: Path = FRESHNESS_PATH, data_types=("leads", "subpages")):
+        self.path = Path(path)
+        self.data_types = tuple(data_types)
+        self._lock = threading.Lock()
+        self._events: dict[str, dict] = {}          # eid -> {"category", "community_id", "event", "ended_at"}
+        self._queued: dict[tuple, float] = {}       # (data_type, eid) -> due_at of its live heap entry
+        self._heap: list[tuple] = []
+        self._seq = itertools.count()
+        self._dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._synced: dict[str, dict[str, float]] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._synced = {}
+        except Exception as e:
+            print(f"[Scheduler] Could not read {self.path}: {e}")
+            self._synced = {}
+
+    # ── Queue maintenance (callers hold self._lock) ──────────────────────────
+
+    def _due_at(self, data_type: str, eid: str) -> float | None:
+        tracked = self._events[eid]
+        budget = freshness_budget(tracked["category"], data_type)
+        last = self._synced.get(data_type, {}).get(eid)
+        ended_at = tracked["ended_at"]
+        if last is not None and ended_at is not None and last < ended_at:
+            # Synced while the event still ran: one final refresh once it ends
+            return ended_at if budget is None else min(ended_at, last + budget)
+        if budget is None:
+            return None
+        return 0.0 if last is None else last + budget  # never synced: due immediately
+
+    def _schedule(self, data_type: str, eid: str):
+        due_at = self._due_at(data_type, eid)
+        if due_at is None:
+            self._queued.pop((data_type, eid), None)
+            return
+        if self._queued.get((data_type, eid)) == due_at:
+            return
+        # Older heap entries for the same key are skipped lazily in pop_due()
+        self._queued[(data_type, eid)] = due_at
+        heapq.heappush(self._heap, (due_at, next(self._seq), data_type, eid))
+
+    def _priority(self, work: dict) -> tuple:
+        return (CATEGORIES.index(work["category"]) if work["category"] in CATEGORIES else len(CATEGORIES),
+                self.data_types.index(work["data_type"]),
+                -work["overdue_sec"])
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def track(self, ev: dict, category: str):
+        """Registers (or re-categorizes) a Swapcard event and queues its data types."""
+        eid = ev["id"]
+        with self._lock:
+            known = self._events.get(eid)
+            self._events[eid] = {"category": category, "community_id": (ev.get("community") or {}).get("id"),
+                                 "event": ev, "ended_at": event_ended_at(ev)}
+            if known and known["category"] == category:
+                return
+            for data_type in self.data_types:
+                self._schedule(data_type, eid)
+
+    def retain(self, eids):
+        """Forgets events that are no longer synced (filtered out or deleted upstream)."""
+        keep = set(eids)
+        with self._lock:
+            for eid in [e for e in self._events if e not in keep]:
+                self._events.pop(eid)
+                for data_type in self.data_types:
+                    self._queued.pop((data_type, eid), None)
+
+    def pop_due(self, now: float | None = None, limit: int | None = SCHEDULER_BATCH) -> list[dict]:
+        """
+        Removes and returns the due work, hottest first.
+
+        At most `limit` events per data type are handed out; the rest stay queued
+        for the next tick. Returns [{"data_type", "event_id", "category",
+        "community_id", "event", "overdue_sec"}].
+        """
+        now = now or time.time()
+        with self._lock:
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due_at, _, data_type, eid = heapq.heappop(self._heap)
+                if self._queued.get((data_type, eid)) != due_at or eid not in self._events:
+                    continue  # superseded or untracked
+                self._queued.pop((data_type, eid))
+                due.append({"data_type": data_type, "event_id": eid, **self._events[eid],
+                            "overdue_sec": round(now - due_at) if due_at else None})
+            due.sort(key=lambda w: self._priority({**w, "overdue_sec": w["overdue_sec"] or float("inf")}))
+
+            taken, per_type = [], {}
+            for work in due:
+                if limit is not None and per_type.get(work["data_type"], 0) >= limit:
+                    # Not handed out this tick: requeue at its original due time
+                    self._schedule(work["data_type"], work["event_id"])
+                    continue
+                per_type[work["data_type"]] = per_type.get(work["data_type"], 0) + 1
+                taken.append(work)
+            return taken
+
+    def mark_synced(self, data_type: str, eids, at: float | None = None):
+        """Records a successful refresh and queues the next one at the end of the budget."""
+        at = at or time.time()
+        with self._lock:
+            marks = self._synced.setdefault(data_type, {})
+            for eid in eids:
+                marks[eid] = at
+                if eid in self._events and data_type in self.data_types:
+                    self._schedule(data_type, eid)
+            self._dirty = True
+
+    def requeue(self, data_type: str, eids):
+        """Puts work that failed back in the queue so the next tick retries it."""
+        with self._lock:
+            for eid in eids:
+                if eid in self._events:
+                    self._schedule(data_type, eid)
+
+    def seconds_until_due(self, now: float | None = None) -> float | None:
+        """Seconds until the next queued refresh is due (0 if some already are, None if nothing is queued)."""
+        now = now or time.time()
+        with self._lock:
+            while self._heap:
+                due_at, _, data_type, eid = self._heap[0]
+                if self._queued.get((data_type, eid)) == due_at and eid in self._events:
+                    return max(0.0, due_at - now)
+                heapq.heappop(self._heap)
+            return None
+
+    def status(self, now: float | None = None) -> dict:
+        """Budgets plus due / fresh / frozen counts per category and data type."""
+        now = now or time.time()
+        with self._lock:
+            tiers = {}
+            for eid, info in self._events.items():
+                for data_type in self.data_types:
+                    tier = tiers.setdefault(info["category"], {}).setdefault(
+                        data_type, {"due": 0, "fresh": 0, "frozen": 0})
+                    due_at = self._due_at(data_type, eid)
+                    tier["frozen" if due_at is None else "due" if due_at <= now else "fresh"] += 1
+            queued = [d for d in self._queued.values()]
+        return {
+            "budgets_sec": FRESHNESS_BUDGETS,
+            "tracked_events": len(self._events),
+            "queued": len(queued),
+            "next_due_in_sec": round(max(0.0, min(queued) - now)) if queued else None,
+            "tiers": tiers,
+        }
+
+    def _adopt(self, marks: dict):
+        """Takes over newer last-sync times from `marks` and reschedules those events (lock held)."""
+        for data_type, synced in marks.items():
+            ours = self._synced.setdefault(data_type, {})
+            for eid, at in synced.items():
+                if at > ours.get(eid, 0):
+                    ours[eid] = at
+                    if eid in self._events and data_type in self.data_types:
+                        self._schedule(data_type, eid)
+
+    def reload(self):
+        """Merges in refreshes recorded by other processes since this one loaded or saved."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                marks = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        with self._lock:
+            self._adopt(marks)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+
+            def apply(marks):
+                for data_type, synced in self._synced.items():
+                    theirs = marks.setdefault(data_type, {})
+                    for eid, at in synced.items():
+                        if at > theirs.get(eid, 0):
+                            theirs[eid] = at
+
+            try:
+                self._adopt(update_json_file(self.path, apply))
+                self._dirty = False
+            except Exception as e:
+                print(f"[Scheduler] Could not save {self.path}: {e}")
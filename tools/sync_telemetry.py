@@ -0,0 +1,386 @@
+"""
+tools/sync_telemetry.py
+
+Structured sync telemetry.
+
+Each sync run (events, subpages, scheduled refreshes, standalone_sync) records,
+per phase and per event:
+
+    wall_sec    first start → last end of the phase
+    busy_sec    summed handler time (> wall_sec when a phase runs several workers)
+    requests    HTTP requests issued (Swapcard and Supabase)
+    bytes       response bytes received
+    rows        rows written to Supabase
+    retries     requests repeated after a failure or a 429 / 503
+    throttles   429 / Retry-After responses
+    errors      failed requests / handler errors
+
+The current run, phase and event live in context variables, so the HTTP
+clients and `upsert_chunked` attribute their counters without any plumbing.
+`tools.blocking.run_blocking` and the sync thread pools copy the context into
+their worker threads (`in_context`). Calls made outside a run only feed the
+process-wide totals.
+
+Finished runs are kept in a ring of the last SYNC_TELEMETRY_HISTORY runs
+(data/sync_telemetry.json, so history survives restarts and includes runs of
+sync_worker.py processes) and served by /api/sync/status and, in Prometheus
+text format, by /metrics.
+
+Configuration (environment variables):
+    SYNC_TELEMETRY_HISTORY   Finished runs kept (default 20)
+    SYNC_TELEMETRY_EVENTS    Per-event breakdowns kept per run, slowest first (default 50)
+
+Usage:
+    from tools import sync_telemetry
+
+    with sync_telemetry.track_run("subpages", trigger="cron"):
+        with sync_telemetry.phase("fetch"), sync_telemetry.event(eid):
+            ...
+    sync_telemetry.record_request("swapcard", nbytes=len(resp.content))
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+import functools
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from tools.state_files import update_json_file
+
+# Same storage root as tools/get_subpages.py (Vercel only allows writes in /tmp)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+TELEMETRY_PATH = DATA_DIR / "sync_telemetry.json"
+
+TELEMETRY_HISTORY = int(os.environ.get("SYNC_TELEMETRY_HISTORY", 20))
+TELEMETRY_EVENTS = int(os.environ.get("SYNC_TELEMETRY_EVENTS", 50))
+
+COUNTERS = ("requests", "bytes", "rows", "retries", "throttles", "errors")
+
+_current_run: contextvars.ContextVar["SyncRun | None"] = contextvars.ContextVar("sync_run", default=None)
+_current_phase: contextvars.ContextVar[str | None] = contextvars.ContextVar("sync_phase", default=None)
+_current_event: contextvars.ContextVar[str | None] = contextvars.ContextVar("sync_event", default=None)
+
+_lock = threading.Lock()
+_running: dict[str, "SyncRun"] = {}
+_history: deque = deque(maxlen=TELEMETRY_HISTORY)
+_history_mtime = None  # mtime of the history file last read into _history
+# Process-wide cumulative counters (Prometheus counters)
+_totals = {
+    "runs": {},       # (sync, status) -> n
+    "services": {},   # service -> {requests, bytes, retries, throttles, errors}
+    "syncs": {},      # sync -> {rows, errors} summed over finished runs
+}
+
+
+def _new_counters() -> dict:
+    return {**{c: 0 for c in COUNTERS}, "wall_sec": 0.0, "busy_sec": 0.0}
+
+
+class SyncRun:
+    """Counters of one sync run, broken down by phase and by event."""
+
+    def __init__(self, name: str, run_id: str | None = None, trigger: str | None = None):
+        self.name = name
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.trigger = trigger
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self.totals = {c: 0 for c in COUNTERS}
+        self.services: dict[str, dict] = {}
+        self.phases: dict[str, dict] = {}
+        self.events: dict[str, dict] = {}
+        self._phase_span: dict[str, list] = {}  # phase -> [first start, last end]
+        self.status = "running"
+        self.error = None
+        self.wall_sec = None
+        self.finished_at = None
+
+    def add(self, counters: dict, service: str | None = None, phase: str | None = None, event: str | None = None):
+        with self._lock:
+            for key, value in counters.items():
+                self.totals[key] += value
+                if service:
+                    svc = self.services.setdefault(service, {c: 0 for c in COUNTERS})
+                    svc[key] += value
+                if phase:
+                    self.phases.setdefault(phase, _new_counters())[key] += value
+                if event:
+                    ev = self.events.setdefault(event, {})
+                    ev.setdefault(phase or "-", _new_counters())[key] += value
+
+    def add_time(self, phase: str, started: float, ended: float):
+        with self._lock:
+            span = self._phase_span.setdefault(phase, [started, ended])
+            span[0], span[1] = min(span[0], started), max(span[1], ended)
+            counters = self.phases.setdefault(phase, _new_counters())
+            counters["busy_sec"] += ended - started
+            counters["wall_sec"] = span[1] - span[0]
+
+    def add_event_time(self, phase: str | None, event: str, seconds: float):
+        with self._lock:
+            counters = self.events.setdefault(event, {}).setdefault(phase or "-", _new_counters())
+            counters["busy_sec"] += seconds
+            counters["wall_sec"] += seconds
+
+    def snapshot(self, max_events: int | None = TELEMETRY_EVENTS) -> dict:
+        with self._lock:
+            def rounded(counters):
+                return {k: round(v, 3) if isinstance(v, float) else v for k, v in counters.items()}
+
+            def event_busy(item):
+                return sum(c["busy_sec"] for c in item[1].values())
+
+            events = sorted(self.events.items(), key=event_busy, reverse=True)
+            return {
+                "sync": self.name,
+                "run_id": self.run_id,
+                "trigger": self.trigger,
+                "status": self.status,
+                "error": self.error,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "wall_sec": round(self.wall_sec if self.wall_sec is not None
+                                  else time.monotonic() - self._started, 3),
+                "totals": dict(self.totals),
+                "services": {s: dict(c) for s, c in self.services.items()},
+                "phases": {p: rounded(c) for p, c in self.phases.items()},
+                "events_tracked": len(events),
+                "events": {eid: {p: rounded(c) for p, c in phases.items()}
+                           for eid, phases in (events[:max_events] if max_events is not None else events)},
+            }
+
+
+# ─── Context ──────────────────────────────────────────────────────────────────
+
+def in_context(fn):
+    """
+    Wraps `fn` to run in a copy of the caller's context (current run / phase /
+    event). Call it once per submission: a copied context cannot be entered by
+    two threads at once.
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+@contextmanager
+def track_run(name: str, run_id: str | None = None, trigger: str | None = None):
+    """Records one sync run; nested runs (a scheduled tick calling the subpages sync) share the outer one."""
+    outer = _current_run.get()
+    if outer is not None:
+        yield outer
+        return
+    run = SyncRun(name, run_id, trigger)
+    token = _current_run.set(run)
+    with _lock:
+        _running[run.run_id] = run
+    try:
+        yield run
+        run.status = "ok"
+    except BaseException as e:
+        run.status = "failed"
+        run.error = str(e) or type(e).__name__
+        raise
+    finally:
+        _current_run.reset(token)
+        run.wall_sec = time.monotonic() - run._started
+        run.finished_at = datetime.now(timezone.utc).isoformat()
+        _finish(run)
+
+
+@contextmanager
+def phase(name: str):
+    """Attributes counters and time inside the block to phase `name` of the current run."""
+    token = _current_phase.set(name)
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        _current_phase.reset(token)
+        run = _current_run.get()
+        if run is not None:
+            run.add_time(name, started, time.monotonic())
+
+
+@contextmanager
+def event(event_id: str | None):
+    """Attributes counters and time inside the block to one event's breakdown."""
+    token = _current_event.set(event_id)
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        _current_event.reset(token)
+        run = _current_run.get()
+        if run is not None and event_id:
+            run.add_event_time(_current_phase.get(), event_id, time.monotonic() - started)
+
+
+# ─── Recording ────────────────────────────────────────────────────────────────
+
+def record_request(service: str, nbytes: int = 0, retry: bool = False, throttled: bool = False,
+                   error: bool = False):
+    """One HTTP request issued to `service` ("swapcard", "supabase")."""
+    counters = {"requests": 1, "bytes": nbytes or 0, "retries": int(retry), "throttles": int(throttled),
+                "errors": int(error)}
+    with _lock:
+        svc = _totals["services"].setdefault(service, {c: 0 for c in COUNTERS if c != "rows"})
+        for key in svc:
+            svc[key] += counters[key]
+    run = _current_run.get()
+    if run is not None:
+        run.add(counters, service=service, phase=_current_phase.get(), event=_current_event.get())
+
+
+def record_rows(count: int):
+    """Rows written by the current phase."""
+    run = _current_run.get()
+    if run is not None and count:
+        run.add({"rows": count}, phase=_current_phase.get(), event=_current_event.get())
+
+
+def record_error():
+    """A handler error inside the current phase."""
+    run = _current_run.get()
+    if run is not None:
+        run.add({"errors": 1}, phase=_current_phase.get(), event=_current_event.get())
+
+
+# ─── History ──────────────────────────────────────────────────────────────────
+
+def _load_history():
+    """Re-reads the history file when another process (a sync worker) has written it (lock held)."""
+    global _history_mtime
+    try:
+        mtime = TELEMETRY_PATH.stat().st_mtime_ns
+    except OSError:
+        return
+    if mtime == _history_mtime:
+        return
+    _history_mtime = mtime
+    try:
+        with open(TELEMETRY_PATH, "r", encoding="utf-8") as f:
+            history = json.load(f)[-TELEMETRY_HISTORY:]
+        _history.clear()
+        _history.extend(history)
+    except json.JSONDecodeError:
+        pass
+    except Exception as e:
+        print(f"[Telemetry] Could not read {TELEMETRY_PATH}: {e}")
+
+
+def _finish(run: SyncRun):
+    global _history_mtime
+    snapshot = run.snapshot()
+    with _lock:
+        _running.pop(run.run_id, None)
+        key = (run.name, run.status)
+        _totals["runs"][key] = _totals["runs"].get(key, 0) + 1
+        done = _totals["syncs"].setdefault(run.name, {"rows": 0, "errors": 0})
+        for counter in done:
+            done[counter] += snapshot["totals"][counter]
+    slow = sorted(snapshot["phases"].items(), key=lambda p: p[1]["wall_sec"], reverse=True)
+    print(f"[Telemetry] {run.name} run {run.run_id} {run.status} in {snapshot['wall_sec']}s: "
+          f"{snapshot['totals']['requests']} requests, {snapshot['totals']['bytes']} bytes, "
+          f"{snapshot['totals']['rows']} rows, {snapshot['totals']['retries']} retries, "
+          f"{snapshot['totals']['throttles']} throttles"
+          + (f"; slowest phase {slow[0][0]} ({slow[0][1]['wall_sec']}s)" if slow else ""))
+
+    def append(history):
+        history.append(snapshot)
+        del history[:-TELEMETRY_HISTORY]
+
+    try:
+        # Appended under a file lock so runs finishing in other processes are kept too
+        history = update_json_file(TELEMETRY_PATH, append, default=list)
+        with _lock:
+            _history.clear()
+            _history.extend(history)
+            _history_mtime = TELEMETRY_PATH.stat().st_mtime_ns
+    except Exception as e:
+        print(f"[Telemetry] Could not save {TELEMETRY_PATH}: {e}")
+        with _lock:
+            _history.append(snapshot)
+
+
+def status(limit: int | None = None, sync: str | None = None) -> dict:
+    """Runs in flight plus the most recent finished runs (newest first)."""
+    with _lock:
+        _load_history()
+        history = [r for r in reversed(_history) if sync is None or r["sync"] == sync]
+        running = list(_running.values())
+    return {
+        "running": [r.snapshot() for r in running if sync is None or r.name == sync],
+        "history": history[:limit] if limit else history,
+        "services": {s: dict(c) for s, c in _totals["services"].items()},
+    }
+
+
+# ─── Prometheus ───────────────────────────────────────────────────────────────
+
+def _labels(**labels) -> str:
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def prometheus_text(extra_gauges: dict | None = None, extra_counters: dict | None = None) -> str:
+    """
+    Renders the metrics in the Prometheus text exposition format.
+
+    Counters (`*_total`) are cumulative for this process; `*_last_*` gauges
+    describe the latest finished run of each sync kind. `extra_gauges` and
+    `extra_counters` map metric name → value for callers to append (e.g. rate
+    limiter state and its running totals); counter names get the `_total` suffix.
+    """
+    with _lock:
+        _load_history()
+        latest = {}
+        for run in _history:
+            latest[run["sync"]] = run
+        running = {r.name for r in _running.values()}
+        runs = dict(_totals["runs"])
+        services = {s: dict(c) for s, c in _totals["services"].items()}
+        syncs = {s: dict(c) for s, c in _totals["syncs"].items()}
+
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+
+    metric("eventhub_sync_runs_total", "counter", "Finished sync runs in this process.",
+           [({"sync": sync, "status": st}, n) for (sync, st), n in sorted(runs.items())])
+    metric("eventhub_sync_rows_total", "counter", "Rows written to Supabase by finished sync runs.",
+           [({"sync": sync}, c["rows"]) for sync, c in sorted(syncs.items())])
+    metric("eventhub_sync_errors_total", "counter", "Failed requests and handler errors in finished sync runs.",
+           [({"sync": sync}, c["errors"]) for sync, c in sorted(syncs.items())])
+    metric("eventhub_sync_running", "gauge", "Whether a sync of this kind is running in this process.",
+           [({"sync": sync}, int(sync in running)) for sync in sorted(set(latest) | running)])
+    for counter in ("requests", "bytes", "retries", "throttles", "errors"):
+        metric(f"eventhub_http_{counter}_total", "counter", f"HTTP {counter} per upstream service.",
+               [({"service": s}, c[counter]) for s, c in sorted(services.items())])
+
+    metric("eventhub_sync_last_wall_seconds", "gauge", "Wall time of the latest finished run.",
+           [({"sync": s}, r["wall_sec"]) for s, r in sorted(latest.items())])
+    metric("eventhub_sync_last_success", "gauge", "1 if the latest finished run succeeded.",
+           [({"sync": s}, int(r["status"] == "ok")) for s, r in sorted(latest.items())])
+    for counter in ("wall_sec", "busy_sec") + COUNTERS:
+        name = f"eventhub_sync_last_phase_{counter.replace('_sec', '_seconds')}"
+        metric(name, "gauge", f"Per-phase {counter} of the latest finished run.",
+               [({"sync": s, "phase": p}, c.get(counter, 0))
+                for s, r in sorted(latest.items()) for p, c in sorted(r["phases"].items())])
+
+    for name, value in (extra_gauges or {}).items():
+        metric(name, "gauge", name.replace("_", " ") + ".", [({}, value)])
+    for name, value in (extra_counters or {}).items():
+        name = name if name.endswith("_total") else name + "_total"
+        metric(name, "counter", name.removesuffix("_total").replace("_", " ") + ".", [({}, value)])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,116 @@
+"""
+tools/sync_watermarks.py
+
+Per-event high-water marks for incremental syncs.
+
+Each sync phase ("events", "subpages", ...) records a fingerprint of the event
+it last processed successfully. The fingerprint starts with Swapcard's
+`updatedAt` and also includes the derived category, because an event moves
+Future → Active → Past without `updatedAt` changing. On the next run, events
+whose fingerprint is unchanged are skipped. Passing `force_refresh` to the
+sync runs a full reconcile pass instead.
+
+Marks are stored in data/sync_watermarks.json:
+    { "<phase>": { "<event_id>": "<fingerprint>" } }
+
+`save()` merges this store's changes into the file (tools/state_files.py), so
+sync worker processes marking different events do not overwrite each other.
+
+Usage:
+    from tools.sync_watermarks import WatermarkStore, event_fingerprint
+
+    marks = WatermarkStore()
+    fp = event_fingerprint(ev, category)
+    if marks.is_changed("events", ev["id"], fp):
+        ...upsert...
+        marks.mark("events", ev["id"], fp)
+    marks.save()
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+
+from tools.state_files import update_json_file
+
+# Same storage root as tools/get_subpages.py (Vercel only allows writes in /tmp)
+DATA_DIR = Path("/tmp/data") if os.environ.get("VERCEL") == "1" else Path(__file__).parent.parent / "data"
+WATERMARK_PATH = DATA_DIR / "sync_watermarks.json"
+
+SYNC_INCREMENTAL = os.environ.get("SYNC_INCREMENTAL", "1") == "1"
+
+
+def event_fingerprint(ev: dict, category: str | None = None, with_counts: bool = False) -> str:
+    """
+    Stable change marker for one event.
+
+    `with_counts` also folds in the exhibitor/session/speaker/registration totals,
+    which move when subpage data changes even if the event record itself does not.
+    """
+    parts = [str(ev.get("updatedAt") or ev.get("createdAt") or ""), str(category or "")]
+    if with_counts:
+        registrations = sum((g or {}).get("peopleCount") or 0 for g in ev.get("groups") or [])
+        parts += [str(ev.get("totalExhibitors") or 0), str(ev.get("totalPlannings") or 0),
+                  str(ev.get("totalSpeakers") or 0), str(registrations)]
+    return "|".join(parts)
+
+
+class WatermarkStore:
+    """Thread-safe JSON-backed map of phase → event_id → fingerprint."""
+
+    def __init__(self, path: Path = WATERMARK_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._marks: dict[str, dict[str, str]] = {}
+        self._changed: set[tuple[str, str]] = set()  # (phase, event_id) changed since the last save
+        self._dropped: set[str] = set()              # phases forgotten since the last save
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._marks = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._marks = {}
+        except Exception as e:
+            print(f"[Watermarks] Could not read {self.path}: {e}")
+
+    def is_changed(self, phase: str, event_id: str, fingerprint: str) -> bool:
+        with self._lock:
+            return self._marks.get(phase, {}).get(event_id) != fingerprint
+
+    def mark(self, phase: str, event_id: str, fingerprint: str):
+        with self._lock:
+            self._marks.setdefault(phase, {})[event_id] = fingerprint
+            self._changed.add((phase, event_id))
+
+    def forget(self, phase: str, event_id: str | None = None):
+        """Drops one event's mark (or a whole phase) so it is re-synced next run."""
+        with self._lock:
+            if event_id is None:
+                self._marks.pop(phase, None)
+                self._dropped.add(phase)
+            else:
+                self._marks.get(phase, {}).pop(event_id, None)
+                self._changed.add((phase, event_id))
+
+    def save(self):
+        with self._lock:
+            if not self._changed and not self._dropped:
+                return
+
+            def apply(marks):
+                for phase in self._dropped:
+                    marks.pop(phase, None)
+                for phase, event_id in self._changed:
+                    fingerprint = self._marks.get(phase, {}).get(event_id)
+                    if fingerprint is None:
+                        marks.get(phase, {}).pop(event_id, None)
+                    else:
+                        marks.setdefault(phase, {})[event_id] = fingerprint
+
+            try:
+                # Also picks up the marks other processes saved since we loaded
+                self._marks = update_json_file(self.path, apply)
+                self._changed.clear()
+                self._dropped.clear()
+            except Exception as e:
+                print(f"[Watermarks] Could not save {self.path}: {e}")
@@ -0,0 +1,222 @@
+"""
+tools/webhooks.py
+
+Push-driven incremental updates: signature checks and burst coalescing for the
+change notifications POSTed to /api/webhooks/swapcard.
+
+Polling, even every 5 minutes, is too slow for live events and wasted work for
+idle ones. A notification names one changed record instead:
+
+    {"type": "exhibitor.updated", "eventId": "...", "id": "<record id>",
+     "communityId": "..."}                     (communityId is optional)
+
+    type   <entity>.<action>; entity is exhibitor | person | planning | sponsor |
+           event (plurals accepted), action is created | updated | deleted
+    id     the record id (defaults to eventId for event notifications)
+
+A request body may carry one notification, a list, or {"notifications": [...]}.
+
+Signatures:
+    X-Webhook-Signature: t=<unix time>,v1=<hex HMAC-SHA256 of "<t>.<raw body>">
+keyed with SWAPCARD_WEBHOOK_SECRET. Requests older than WEBHOOK_TOLERANCE
+seconds are rejected, so a captured request cannot be replayed later.
+
+Coalescing: notifications accumulate per entity, i.e. per (event, data type).
+An entity is handed out for refresh once no new notification arrived for
+WEBHOOK_QUIET_SECONDS, or WEBHOOK_MAX_DELAY seconds after its first one, so a
+burst of 200 edits to one event's exhibitors becomes one refresh of exactly the
+touched exhibitors. A record updated and then deleted inside the window is
+only deleted (and the other way round).
+
+Configuration (environment variables):
+    SWAPCARD_WEBHOOK_SECRET   Shared signing secret (webhooks are refused while unset)
+    WEBHOOK_TOLERANCE         Max signature age in seconds (default 300)
+    WEBHOOK_QUIET_SECONDS     Quiet period that closes a burst (default 5)
+    WEBHOOK_MAX_DELAY         Longest a notification waits for its burst to end (default 30)
+    WEBHOOK_WORKERS           Entity refreshes run in parallel (default 4)
+
+Usage:
+    from tools.webhooks import verify_signature, parse_notifications, WebhookCoalescer
+
+    verify_signature(raw_body, request.headers.get("X-Webhook-Signature"))
+    coalescer.add(parse_notifications(json.loads(raw_body)))
+    for entity in coalescer.pop_ready():
+        ...refetch entity["upserts"], delete entity["deletes"]...
+"""
+
+import os
+import hmac
+import time
+import hashlib
+import threading
+
+WEBHOOK_SECRET = os.environ.get("SWAPCARD_WEBHOOK_SECRET")
+WEBHOOK_TOLERANCE = int(os.environ.get("WEBHOOK_TOLERANCE", 300))
+WEBHOOK_QUIET_SECONDS = float(os.environ.get("WEBHOOK_QUIET_SECONDS", 5))
+WEBHOOK_MAX_DELAY = float(os.environ.get("WEBHOOK_MAX_DELAY", 30))
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 4))
+
+# Notification entity → subpage data type ("events" is the swapcard_events row itself)
+ENTITY_TYPES = {
+    "exhibitor": "exhibitors", "exhibitors": "exhibitors",
+    "person": "people", "people": "people",
+    "planning": "plannings", "plannings": "plannings", "session": "plannings", "sessions": "plannings",
+    "sponsor": "sponsors", "sponsors": "sponsors",
+    "event": "events", "events": "events",
+}
+ACTIONS = ("created", "updated", "deleted")
+
+
+class WebhookError(ValueError):
+    """Rejected webhook request; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# ─── Signatures ───────────────────────────────────────────────────────────────
+
+def sign(body: bytes, secret: str, timestamp: int | None = None) -> str:
+    """X-Webhook-Signature value for a raw body (used by replay_webhooks.py)."""
+    timestamp = int(timestamp or time.time())
+    digest = hmac.new(secret.encode("utf-8"), f"{timestamp}.".encode("utf-8") + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(body: bytes, header: str | None, secret: str | None = None, now: float | None = None):
+    """Raises WebhookError unless `header` is a fresh, valid signature of `body`."""
+    secret = secret or WEBHOOK_SECRET
+    if not secret:
+        raise WebhookError("Webhook secret is not configured", status_code=503)
+    parts = dict(p.split("=", 1) for p in (header or "").split(",") if "=" in p)
+    try:
+        timestamp = int(parts.get("t", ""))
+    except ValueError:
+        raise WebhookError("Missing or malformed signature", status_code=401)
+    if abs((now or time.time()) - timestamp) > WEBHOOK_TOLERANCE:
+        raise WebhookError("Signature timestamp outside the tolerance window", status_code=401)
+    expected = sign(body, secret, timestamp).split("v1=", 1)[1]
+    if not hmac.compare_digest(expected, parts.get("v1", "")):
+        raise WebhookError("Invalid signature", status_code=401)
+
+
+# ─── Parsing ──────────────────────────────────────────────────────────────────
+
+def parse_notifications(payload) -> list[dict]:
+    """
+    Normalizes a request body into [{"data_type", "event_id", "record_id",
+    "community_id", "deleted"}]; raises WebhookError on malformed notifications.
+    """
+    if isinstance(payload, dict) and "notifications" in payload:
+        payload = payload["notifications"]
+    items = payload if isinstance(payload, list) else [payload]
+    notifications = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise WebhookError("Each notification must be an object")
+        entity, _, action = str(item.get("type") or "").partition(".")
+        data_type = ENTITY_TYPES.get(entity.lower())
+        if data_type is None or action.lower() not in ACTIONS:
+            raise WebhookError(f"Unsupported notification type '{item.get('type')}'")
+        event_id = item.get("eventId")
+        record_id = item.get("id") or (event_id if data_type == "events" else None)
+        if not event_id or not record_id:
+            raise WebhookError(f"Notification '{item.get('type')}' needs eventId and id")
+        notifications.append({"data_type": data_type, "event_id": event_id, "record_id": record_id,
+                              "community_id": item.get("communityId"), "deleted": action.lower() == "deleted"})
+    return notifications
+
+
+# ─── Coalescing ───────────────────────────────────────────────────────────────
+
+class WebhookCoalescer:
+    """Thread-safe per-(event, data type) buffer of touched record ids."""
+
+    def __init__(self, quiet: float = WEBHOOK_QUIET_SECONDS, max_delay: float = WEBHOOK_MAX_DELAY):
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._entities: dict[tuple, dict] = {}
+        self.stats = {"received": 0, "coalesced": 0, "dispatched": 0}
+
+    def _buffer(self, n: dict, now: float):
+        key = (n["event_id"], n["data_type"])
+        entity = self._entities.get(key)
+        if entity is None:
+            entity = self._entities[key] = {
+                "event_id": n["event_id"], "data_type": n["data_type"], "community_id": None,
+                "upserts": set(), "deletes": set(), "notifications": 0, "first_at": now, "attempts": 0}
+        else:
+            self.stats["coalesced"] += 1
+        entity["community_id"] = n.get("community_id") or entity["community_id"]
+        entity["notifications"] += 1
+        entity["last_at"] = now
+        # The latest action on a record wins
+        if n["deleted"]:
+            entity["upserts"].discard(n["record_id"])
+            entity["deletes"].add(n["record_id"])
+        else:
+            entity["deletes"].discard(n["record_id"])
+            entity["upserts"].add(n["record_id"])
+        return entity
+
+    def add(self, notifications: list[dict], now: float | None = None) -> int:
+        """Buffers notifications; returns how many entities are now pending."""
+        now = now or time.monotonic()
+        with self._lock:
+            for n in notifications:
+                self._buffer(n, now)
+            self.stats["received"] += len(notifications)
+            return len(self._entities)
+
+    def _ready_at(self, entity: dict) -> float:
+        return min(entity["last_at"] + self.quiet, entity["first_at"] + self.max_delay)
+
+    def pop_ready(self, now: float | None = None, force: bool = False) -> list[dict]:
+        """Removes and returns the entities whose burst is over (all of them with `force`)."""
+        now = now or time.monotonic()
+        with self._lock:
+            ready = [key for key, e in self._entities.items() if force or self._ready_at(e) <= now]
+            entities = [self._entities.pop(key) for key in ready]
+            self.stats["dispatched"] += len(entities)
+        return [{**e, "upserts": sorted(e["upserts"]), "deletes": sorted(e["deletes"])} for e in entities]
+
+    def retry(self, entity: dict, now: float | None = None):
+        """Puts a failed entity back so its records are retried with the next burst."""
+        now = now or time.monotonic()
+        with self._lock:
+            pending = None
+            for deleted, ids in ((False, entity["upserts"]), (True, entity["deletes"])):
+                for rid in ids:
+                    pending = self._buffer({"data_type": entity["data_type"], "event_id": entity["event_id"],
+                                            "record_id": rid, "community_id": entity.get("community_id"),
+                                            "deleted": deleted}, now)
+            if pending is not None:
+                pending["attempts"] = max(pending["attempts"], entity.get("attempts", 0) + 1)
+
+    def seconds_until_ready(self, now: float | None = None) -> float | None:
+        now = now or time.monotonic()
+        with self._lock:
+            if not self._entities:
+                return None
+            return max(0.0, min(self._ready_at(e) for e in self._entities.values()) - now)
+
+    def status(self) -> dict:
+        with self._lock:
+            pending = [{"event_id": e["event_id"], "data_type": e["data_type"], "records": len(e["upserts"]),
+                        "deletes": len(e["deletes"]), "notifications": e["notifications"]}
+                       for e in self._entities.values()]
+            return {**self.stats, "pending": pending}
+
+
+def merge_touched(current: dict, new: dict) -> dict:
+    """Job-table merge for queued webhook refresh jobs: unions the touched ids per data type."""
+    touched = {dt: dict(ids) for dt, ids in (current.get("touched") or {}).items()}
+    for data_type, ids in (new.get("touched") or {}).items():
+        entry = touched.setdefault(data_type, {"upserts": [], "deletes": []})
+        deletes = set(ids.get("deletes") or [])
+        upserts = set(ids.get("upserts") or [])
+        entry["upserts"] = sorted((set(entry["upserts"]) - deletes) | upserts)
+        entry["deletes"] = sorted((set(entry["deletes"]) - upserts) | deletes)
+    return {**current, **new, "touched": touched}